@@ -1,11 +1,17 @@
 import streamlit as st
-import pandas as pd
-import os
+import importlib
 from streamlit_cookies_manager import EncryptedCookieManager
+from core import tracer, riscaldamento
+from core import agenti as directory_agenti
 
 # 1. CONFIGURAZIONE (Deve essere assolutamente il primo comando)
 st.set_page_config(page_title="Vivetti App", page_icon="LogoVivetti.png", layout="wide")
 
+# Ogni esecuzione dello script apre una nuova traccia delle query (pannello performance admin)
+tracer.inizia_rerun()
+# Al primo rerun del processo parte il riscaldamento delle cache in background (core/riscaldamento.py)
+riscaldamento.avvia()
+
 # 2. INIZIALIZZAZIONE GESTORE COOKIE
 cookies = EncryptedCookieManager(
     prefix="vivetti_app_",
@@ -80,6 +86,8 @@ with st.sidebar:
 
     st.markdown(f"### 👤 {user_data['username']}")
     st.caption(f"Ruolo: {user_data['ruolo'].upper()}")
+    if riscaldamento.in_corso():
+        st.caption("⏳ Avvio del server: preparazione dati in corso")
     
     # PULSANTE LOGOUT
     if st.button("Logout", use_container_width=True):
@@ -99,65 +107,43 @@ with st.sidebar:
         key="menu_nav"
     )
 
-# 6. CARICAMENTO DELLE PAGINE (VIEWS)
-if scelta == "📊 Nuovo Preventivo":
-    try:
-        from views.preventivi import show_preventivi
-        show_preventivi()
-    except Exception as e:
-        st.error(f"Errore nel caricamento della pagina Preventivi: {e}")
+    # Pannello performance (solo admin, con [perf] tracing = true): riempito dopo il rendering della pagina
+    slot_perf = st.container() if ruolo == "admin" and tracer.tracing_abilitato() else None
+    if ruolo == "admin" and slot_perf is None:
+        st.caption("⏱️ Tracing query disattivo ([perf] tracing = true per il pannello)")
 
-elif scelta == "📊 Archivio Preventivi":
-    try:
-        from views.archivio import show_archivio
-        show_archivio()
-    except Exception as e:
-        st.info("La pagina 'Archivio' è in fase di sviluppo o il file non è presente.")
-
-elif scelta == "📦 Archivio Ordini":
-    try:
-        from views.ordinato import show_ordinato
-        show_ordinato()
-    except Exception as e:
-        st.info("La pagina 'Ordinato' è in fase di sviluppo o il file non è presente.")
-
-elif scelta == "📊 Performance":
+# 6. CARICAMENTO DELLE PAGINE (VIEWS)
+# Registro: etichetta menu -> (modulo, funzione). Il modulo viene importato solo quando la pagina
+# viene aperta; i moduli in views/ non hanno effetti collaterali all'import. None = pagina WIP.
+REGISTRO_PAGINE = {
+    "📊 Nuovo Preventivo": ("views.preventivi", "show_preventivi"),
+    "📊 Archivio Preventivi": ("views.archivio", "show_archivio"),
+    "📦 Archivio Ordini": ("views.ordinato", "show_ordinato"),
+    "📊 Performance": ("views.dashboard", "show_dashboard"),
+    "🏬 Clienti": ("views.clienti", "show_clienti"),
+    "📦 Magazzino": None,
+    "🗓️ Eventi Aziendali": ("views.eventi", "show_eventi"),
+    "📈 Nota Spese": ("views.note_spese", "show_note_spese"),
+    "🗺️ Mappa": ("views.mappa", "show_mappa"),
+}
+
+def apri_pagina(scelta):
+    voce = REGISTRO_PAGINE.get(scelta)
+    if voce is None:
+        st.info(f"La pagina **{scelta}** è attualmente in fase di sviluppo (WIP).")
+        return
+    nome_modulo, nome_funzione = voce
     try:
-        from views.dashboard import show_dashboard
-        show_dashboard()
+        show_pagina = getattr(importlib.import_module(nome_modulo), nome_funzione)
+        with tracer.pagina(nome_funzione):
+            show_pagina()
     except Exception as e:
-        st.info("La pagina 'Performance' è in fase di sviluppo o il file non è presente.")
+        st.info(f"La pagina '{scelta}' è in fase di sviluppo o il file non è presente.")
         st.error(f"Errore tecnico: {e}")
-    
-elif scelta == "🏬 Clienti":
-    try:
-        from views.clienti import show_clienti
-        show_clienti()
-    except Exception as e:
-        st.info("La pagina 'Clienti' è in fase di sviluppo o il file non è presente.")
 
-elif scelta == "📦 Magazzino":
-    st.info("La pagina **Magazzino** è attualmente in fase di sviluppo (WIP).")
-
-elif scelta == "🗓️ Eventi Aziendali":
-    try:
-        from views.eventi import show_eventi
-        show_eventi()
-    except Exception as e:
-        st.info("La pagina 'Eventi' è in fase di sviluppo o il file non è presente.")
-        st.error(f"Errore reale: {e}")
+apri_pagina(scelta)
+# Errori delle letture fatte dalla pagina anche nei thread di in_parallelo (che non disegnano)
+directory_agenti.mostra_errore()
 
-elif scelta == "📈 Nota Spese":
-    try:
-        from views.note_spese import show_note_spese
-        show_note_spese()
-    except Exception as e:
-        st.info("La pagina 'Nota Spese' è in fase di sviluppo o il file non è presente.")
-        st.error(f"Errore reale: {e}")
-
-elif scelta == "🗺️ Mappa":
-    try:
-        from views.mappa import show_mappa
-        show_mappa()
-    except Exception as e:
-        st.info("La pagina 'Mappa' è in fase di sviluppo o il file non è presente.")
\ No newline at end of file
+if slot_perf is not None:
+    tracer.mostra_pannello(slot_perf)
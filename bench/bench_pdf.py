@@ -0,0 +1,183 @@
+"""Benchmark dei PDF generati dall'app: offerta (archivio), conferma d'ordine e riepilogo annuale (ordinato).
+
+Per ogni documento e numero di righe (10, 100, 1.000, 5.000) misura tempo di rendering, dimensione
+del PDF, numero di pagine e picco di memoria (tracemalloc). Le righe di test contengono descrizioni
+lunghe, note, righe NOTA_TESTO, codici lunghissimi senza spazi e testo fuori Latin-1.
+
+Controlli (exit code 1 se falliscono):
+  - BUDGET_MS: tempo massimo per documento a 1.000 righe;
+  - scalabilità lineare: il costo marginale per riga tra gli ultimi due livelli non deve superare
+    FATTORE_LINEARITA volte quello tra i primi due livelli da almeno MIN_RIGHE_LINEARITA righe
+    (cambi pagina e misura delle righe non devono diventare quadratici).
+
+Ogni tempo è la mediana di --ripetizioni render, dopo un render di riscaldamento non cronometrato.
+
+Uso:  python bench/bench_pdf.py [--righe 10,100,1000,5000] [--salva-pdf cartella]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Il logo viene cercato con un percorso relativo
+os.chdir(ROOT)
+
+RIGHE_DEFAULT = [10, 100, 1000, 5000]
+BUDGET_MS = {"offerta": 3000, "conferma": 3000, "riepilogo": 1500}
+FATTORE_LINEARITA = 2.0
+# Sotto questa soglia il costo delle righe è inferiore alla variabilità del costo fisso (logo, font):
+# la pendenza 10 -> 100 righe può risultare anche negativa e non serve da riferimento
+MIN_RIGHE_LINEARITA = 100
+
+TESTI = [
+    "Lavatrice 9 kg classe A, 1400 giri, motore inverter",
+    "Frigorifero combinato No Frost 60 cm inox, cassetto zero gradi, dispenser acqua, illuminazione LED, "
+    "ripiani in vetro temperato regolabili in altezza e porta reversibile con maniglia integrata",
+    "Forno multifunzione 70 l — pirolisi, guida ⇒ 'ricette' automatiche, display TFT",
+    "Climatizzatore dual split 9000+12000 BTU R32 Wi-Fi • classe A+++ / A++",
+    "Cappa aspirante 90 cm “slim” con filtri al carbone rigenerabili — 冷蔵庫 Ø ≥ 60 cm",
+    "Piano cottura induzione 4 zone",
+    "TV 55\" QLED 4K HDR10+, 120 Hz, Dolby Atmos, Smart TV con assistente vocale",
+]
+NOTE = ["Consegna al piano", "Ritiro usato RAEE incluso", "Montaggio a cura del cliente — chiamare prima ☎",
+        "Colore: bianco/nero da confermare entro 5 gg lavorativi dall'ordine, altrimenti bianco"]
+
+def righe_offerta(n, rng):
+    """Righe nel formato di sessione usato da genera_pdf_ordine (archivio)"""
+    righe = []
+    for i in range(n):
+        if i % 15 == 14:
+            righe.append({"tipo": "NOTA_TESTO", "DESCRIZIONE": f"Sezione {i // 15 + 1}: " + rng.choice(NOTE) * rng.randint(1, 3)})
+            continue
+        lordo = round(rng.uniform(20, 2500), 2)
+        s1, s2, s3 = rng.choice([0, 10, 20, 30]), rng.choice([0, 5]), rng.choice([0, 0, 2])
+        netto = lordo * (1 - s1 / 100) * (1 - s2 / 100) * (1 - s3 / 100)
+        righe.append({
+            "tipo": "ARTICOLO",
+            "CODICE": "CODICEARTICOLOLUNGHISSIMO-" + str(i) if i % 50 == 0 else f"ART{i:06d}",
+            "DESCRIZIONE": rng.choice(TESTI) * (3 if i % 20 == 0 else 1),
+            "NOTA": rng.choice(NOTE) if i % 4 == 0 else "",
+            "QTA": rng.randint(1, 10), "PREZZO_LISTINO": lordo, "PREZZO_LORDO": lordo, "PREZZO_NETTO": netto,
+            "S1": s1, "S2": s2, "S3": s3, "SCONTO_MERCE": i % 40 == 7,
+        })
+    return righe
+
+def righe_conferma(n, rng):
+    """Righe come lette da preventivi_righe, usate da genera_pdf_conferma (ordinato)"""
+    righe = []
+    for r in righe_offerta(n, rng):
+        if r["tipo"] == "NOTA_TESTO":
+            righe.append({"nota_riga": "NOTA_TESTO", "descrizione": r["DESCRIZIONE"]})
+            continue
+        righe.append({
+            "nota_riga": r["NOTA"], "descrizione": r["DESCRIZIONE"], "codice_articolo": r["CODICE"],
+            "quantita": r["QTA"], "prezzo_lordo_unitario": r["PREZZO_LORDO"], "prezzo_netto_unitario": r["PREZZO_NETTO"],
+            "sconto_1": r["S1"], "sconto_2": r["S2"], "sconto_3": r["S3"],
+        })
+    return righe
+
+def ordini_riepilogo(n, rng):
+    """n ordini dell'anno per genera_pdf_riepilogo_giornaliero (le righe stampate sono i giorni con ordini)"""
+    inizio = datetime(2025, 1, 1)
+    return pd.DataFrame({
+        "created_at": [(inizio + timedelta(minutes=rng.randint(0, 365 * 24 * 60 - 1))).isoformat() for _ in range(n)],
+        "totale_netto": [round(rng.uniform(50, 20000), 2) for _ in range(n)],
+    })
+
+def testata(righe, prezzo_netto="PREZZO_NETTO", qta="QTA"):
+    totale = sum(float(r.get(prezzo_netto) or 0) * r.get(qta, 0) for r in righe if qta in r)
+    return {"numero_preventivo": "PR-2026-000123", "riferimento": "Cantiere via Roma — lotto 3",
+            "data_consegna": "2026-11-30", "totale_netto": totale}
+
+def prepara_documenti(n, seed):
+    from views.archivio import genera_pdf_ordine
+    from views.ordinato import genera_pdf_conferma, genera_pdf_riepilogo_giornaliero
+
+    rng = random.Random(seed + n)
+    r_off, r_conf, df_ord = righe_offerta(n, rng), righe_conferma(n, rng), ordini_riepilogo(n, rng)
+    t_off = testata(r_off)
+    t_conf = testata(r_conf, "prezzo_netto_unitario", "quantita")
+    cliente = "ROSSI & FIGLI S.R.L. — Società Unipersonale"
+    return {
+        "offerta": lambda: genera_pdf_ordine(cliente, t_off, r_off),
+        "conferma": lambda: genera_pdf_conferma(cliente, t_conf, r_conf, priorita="URGENTE"),
+        # La funzione aggiunge colonne al DataFrame: ogni esecuzione parte da una copia
+        "riepilogo": lambda: genera_pdf_riepilogo_giornaliero(2025, df_ord.copy()),
+    }
+
+def conta_pagine(pdf_bytes):
+    return pdf_bytes.count(b"/Type /Page") - pdf_bytes.count(b"/Type /Pages")
+
+def misura(render, ripetizioni):
+    # Riscaldamento non cronometrato: import, font, logo e cache del primo render gonfierebbero la prima misura
+    # (e con una sola ripetizione sui documenti grandi falserebbero la verifica di linearità)
+    pdf_bytes = render()
+    tempi = []
+    for _ in range(ripetizioni):
+        t0 = time.perf_counter()
+        pdf_bytes = render()
+        tempi.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    render()
+    picco = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return statistics.median(tempi), pdf_bytes, picco
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--righe", default=",".join(map(str, RIGHE_DEFAULT)))
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--salva-pdf", help="cartella dove salvare i PDF generati per controllarli a vista")
+    args = parser.parse_args()
+    livelli = [int(x) for x in args.righe.split(",")]
+
+    risultati = {}
+    print(f"{'documento':<12}{'righe':>7}{'ms':>10}{'ms/riga':>10}{'KB':>10}{'pagine':>8}{'picco MB':>10}")
+    for n in livelli:
+        for nome, render in prepara_documenti(n, args.seed).items():
+            ms, pdf_bytes, picco = misura(render, args.ripetizioni)
+            risultati[(nome, n)] = ms
+            print(f"{nome:<12}{n:>7}{ms:>10.1f}{ms / n:>10.3f}{len(pdf_bytes) / 1024:>10.1f}"
+                  f"{conta_pagine(pdf_bytes):>8}{picco:>10.1f}")
+            if args.salva_pdf:
+                os.makedirs(args.salva_pdf, exist_ok=True)
+                with open(os.path.join(args.salva_pdf, f"{nome}_{n}.pdf"), "wb") as f:
+                    f.write(pdf_bytes)
+
+    errori = []
+    for nome, budget in BUDGET_MS.items():
+        ms = risultati.get((nome, 1000))
+        if ms is not None and ms > budget:
+            errori.append(f"{nome}: {ms:.0f} ms a 1.000 righe (budget {budget} ms)")
+        # Costo marginale per riga tra livelli successivi: il costo fisso (logo, font, intestazione)
+        # non conta, conta che le righe in più costino sempre uguale
+        misurati = sorted(n for (doc, n) in risultati if doc == nome and n >= MIN_RIGHE_LINEARITA)
+        pendenze = [
+            (b, (risultati[(nome, b)] - risultati[(nome, a)]) / (b - a))
+            for a, b in zip(misurati, misurati[1:])
+        ]
+        if len(pendenze) >= 2:
+            primo, ultimo = pendenze[0][1], pendenze[-1][1]
+            if ultimo > max(primo, 0.05) * FATTORE_LINEARITA:
+                errori.append(f"{nome}: {ultimo:.3f} ms per riga in più fino a {pendenze[-1][0]:,} righe "
+                              f"contro {primo:.3f} fino a {pendenze[0][0]:,} (non lineare)")
+
+    if errori:
+        print("\n❌ Budget superati:")
+        for e in errori:
+            print(f"  - {e}")
+        return 1
+    print("\n✅ Tutti i documenti entro budget e con crescita lineare.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
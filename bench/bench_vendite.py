@@ -0,0 +1,183 @@
+"""Benchmark della pipeline analitica di Dashboard e Analisi Clienti (core/vendite.py).
+
+Genera dati sintetici con bench/genera_fatturati.py e misura, per ogni fase (normalizzazione, filtri,
+ogni aggregazione dietro un grafico), il tempo (minimo su più ripetizioni) e il picco di memoria
+allocata (tracemalloc, in un passaggio separato per non falsare i tempi).
+I risultati vengono confrontati con bench/baseline_vendite.json: exit code 1 se una fase supera
+la baseline oltre la tolleranza.
+
+Uso:
+  python bench/bench_vendite.py                         # 1M righe, confronto con la baseline
+  python bench/bench_vendite.py --righe 5000000         # solo report se non c'è baseline per 5M
+  python bench/bench_vendite.py --aggiorna-baseline     # riscrive la baseline per questo numero di righe
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import vendite  # noqa: E402
+from genera_fatturati import genera_fatturati  # noqa: E402
+
+FILE_BASELINE = os.path.join(ROOT, "bench", "baseline_vendite.json")
+# Regressione = oltre TOLLERANZA volte la baseline e oltre il margine assoluto (rumore sulle fasi brevi)
+TOLLERANZA_TEMPO = 1.5
+MARGINE_TEMPO_MS = 5
+TOLLERANZA_MEMORIA = 1.25
+MARGINE_MEMORIA_MB = 2
+
+def prepara_fasi(df_raw):
+    """Lista ordinata di (nome fase, funzione senza argomenti) che riproduce il flusso delle pagine"""
+    stato = {}
+
+    # Dashboard (vista admin: tutti gli agenti, ultimi due anni, primi sette mesi)
+    def normalizza():
+        stato["base"] = vendite.normalizza_fatturati(df_raw)
+
+    def filtra():
+        base = stato["base"]
+        anni = sorted(base["AnnoRif"].dropna().unique().astype(int).tolist())[-2:]
+        stato["anni"] = anni
+        stato["final"] = vendite.filtra_fatturati(base, anni, ['01', '02', '03', '04', '05', '06', '07'])
+
+    def filtra_agente():
+        agente_top = stato["base"]["IdAgenteDoc"].value_counts().index[0]
+        vendite.filtra_fatturati(stato["base"], stato["anni"], None, agente_top)
+
+    def focus():
+        marchio = stato["final"]["Famiglia"].value_counts().index[0]
+        vendite.focus_marchio(stato["final"], marchio)
+
+    # Analisi Clienti: il cliente più grande, un DataFrame per anno come get_data_for_single_year
+    # (la selezione delle sue righe sostituisce la query e resta fuori dalle misure)
+    cliente_top = df_raw["IdAnagrafica"].value_counts().index[0]
+    righe_cliente = df_raw[df_raw["IdAnagrafica"] == cliente_top]
+
+    def cliente_normalizza():
+        per_anno = [
+            vendite.normalizza_fatturati_cliente(righe_cliente[righe_cliente["AnnoRif"] == anno].reset_index(drop=True), anno)
+            for anno in sorted(righe_cliente["AnnoRif"].unique())
+        ]
+        df_totale = pd.concat(per_anno)
+        stato["anni_cliente"] = sorted(righe_cliente["AnnoRif"].unique())
+        stato["cliente"] = df_totale[df_totale["MeseRif"].isin(range(1, 13))].copy()
+
+    def cliente_metriche():
+        for anno in stato["anni_cliente"]:
+            vendite.ordini_per_anno(stato["cliente"], anno)
+
+    return [
+        ("dashboard.normalizza", normalizza),
+        ("dashboard.filtra", filtra),
+        ("dashboard.filtra_agente", filtra_agente),
+        ("dashboard.totali_per_anno", lambda: vendite.totali_per_anno(stato["final"], stato["anni"])),
+        ("dashboard.andamento_mensile", lambda: vendite.andamento_mensile(stato["final"])),
+        ("dashboard.performance_agenti", lambda: vendite.performance_agenti(stato["final"])),
+        ("dashboard.famiglia", lambda: vendite.totali_per_colonna(stato["final"], "Famiglia")),
+        ("dashboard.merceologica", lambda: vendite.totali_per_colonna(stato["final"], "Merceologica")),
+        ("dashboard.focus_marchio", focus),
+        ("dashboard.top_clienti", lambda: vendite.top_clienti(stato["final"], 30)),
+        ("clienti.normalizza", cliente_normalizza),
+        ("clienti.metriche", cliente_metriche),
+        ("clienti.mensile", lambda: vendite.mensile_cliente(stato["cliente"])),
+        ("clienti.top_famiglie", lambda: vendite.top_famiglie_cliente(stato["cliente"], 15)),
+        ("clienti.merceologica", lambda: vendite.merceologica_cliente(stato["cliente"])),
+        ("clienti.mix", lambda: vendite.mix_merceologico(stato["cliente"])),
+    ]
+
+def misura(df_raw, ripetizioni):
+    """{fase: {"ms": minimo sulle ripetizioni, "picco_mb": picco di memoria allocata}}"""
+    risultati = {}
+    for _ in range(ripetizioni):
+        for nome, fase in prepara_fasi(df_raw):
+            t0 = time.perf_counter()
+            fase()
+            ms = (time.perf_counter() - t0) * 1000
+            r = risultati.setdefault(nome, {"ms": ms})
+            r["ms"] = min(r["ms"], ms)
+
+    tracemalloc.start()
+    for nome, fase in prepara_fasi(df_raw):
+        tracemalloc.reset_peak()
+        attuale = tracemalloc.get_traced_memory()[0]
+        fase()
+        risultati[nome]["picco_mb"] = (tracemalloc.get_traced_memory()[1] - attuale) / 1e6
+    tracemalloc.stop()
+    return risultati
+
+def carica_baseline():
+    if not os.path.exists(FILE_BASELINE):
+        return {}
+    with open(FILE_BASELINE, encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--righe", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    parser.add_argument("--aggiorna-baseline", action="store_true")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    df_raw = genera_fatturati(args.righe, seed=args.seed)
+    print(f"Generate {len(df_raw):,} righe in {time.perf_counter() - t0:.1f}s "
+          f"({df_raw.memory_usage(deep=True).sum() / 1e6:,.0f} MB)\n")
+
+    risultati = misura(df_raw, args.ripetizioni)
+
+    baseline = carica_baseline()
+    chiave = str(args.righe)
+    riferimento = baseline.get(chiave, {}).get("fasi", {})
+    if riferimento and baseline[chiave].get("pandas") != pd.__version__:
+        print(f"⚠️ Baseline misurata con pandas {baseline[chiave].get('pandas')}, in uso {pd.__version__}\n")
+
+    regressioni = []
+    print(f"{'fase':<32}{'ms':>10}{'base ms':>10}{'picco MB':>10}{'base MB':>10}")
+    for nome, r in risultati.items():
+        base = riferimento.get(nome)
+        riga = f"{nome:<32}{r['ms']:>10.1f}"
+        if base:
+            riga += f"{base['ms']:>10.1f}{r['picco_mb']:>10.1f}{base['picco_mb']:>10.1f}"
+            if r["ms"] > base["ms"] * TOLLERANZA_TEMPO and r["ms"] - base["ms"] > MARGINE_TEMPO_MS:
+                regressioni.append(f"{nome}: {r['ms']:.1f} ms (baseline {base['ms']:.1f} ms)")
+            if r["picco_mb"] > base["picco_mb"] * TOLLERANZA_MEMORIA and r["picco_mb"] - base["picco_mb"] > MARGINE_MEMORIA_MB:
+                regressioni.append(f"{nome}: picco {r['picco_mb']:.1f} MB (baseline {base['picco_mb']:.1f} MB)")
+        else:
+            riga += f"{'-':>10}{r['picco_mb']:>10.1f}{'-':>10}"
+        print(riga)
+    print(f"{'TOTALE':<32}{sum(r['ms'] for r in risultati.values()):>10.1f}")
+
+    if args.aggiorna_baseline:
+        baseline[chiave] = {
+            "pandas": pd.__version__, "python": platform.python_version(), "macchina": platform.machine(),
+            "seed": args.seed,
+            "fasi": {nome: {"ms": round(r["ms"], 2), "picco_mb": round(r["picco_mb"], 2)} for nome, r in risultati.items()},
+        }
+        with open(FILE_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline aggiornata per {args.righe:,} righe: {FILE_BASELINE}")
+        return 0
+
+    if not riferimento:
+        print(f"\nNessuna baseline per {args.righe:,} righe (usa --aggiorna-baseline).")
+        return 0
+    if regressioni:
+        print("\n❌ Regressioni rispetto alla baseline:")
+        for r in regressioni:
+            print(f"  - {r}")
+        return 1
+    print("\n✅ Nessuna regressione rispetto alla baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Generatore deterministico di dati con la forma di `fatturati`, per i benchmark della dashboard.
+
+Stesse colonne che legge load_all_data (più IdAnagrafica e IdTestata, usate da Analisi Clienti),
+con tipi come arrivano da PostgREST in un DataFrame e distribuzioni realistiche:
+  - pochi agenti e pochi clienti fanno gran parte del fatturato (pesi tipo Zipf);
+  - ogni cliente appartiene a un agente, ogni articolo a un marchio e a una categoria;
+  - una quota di righe RAEE (contributo smaltimento) e un po' di "sporco" (maiuscole/spazi, famiglie vuote).
+
+Uso:  python bench/genera_fatturati.py 1000000 fatturati.parquet   (o .csv)
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+ANNI = (2023, 2024, 2025, 2026)
+# L'anno in corso è parziale: solo i primi mesi
+MESI_ANNO_CORRENTE = 7
+QUOTA_RAEE = 0.04
+MARCHI = [
+    "SAMSUNG", "LG", "BOSCH", "WHIRLPOOL", "ELECTROLUX", "CANDY", "HOOVER", "BEKO", "SMEG", "MIELE",
+    "DE LONGHI", "PHILIPS", "SONY", "PANASONIC", "HISENSE", "HAIER", "INDESIT", "AEG", "SIEMENS", "DYSON",
+    "ROWENTA", "KENWOOD", "BRAUN", "XIAOMI", "TCL", "SHARP", "GRUNDIG", "HOTPOINT", "NEFF", "GORENJE",
+]
+CATEGORIE = [
+    "LAVATRICI", "ASCIUGATRICI", "FRIGORIFERI", "CONGELATORI", "LAVASTOVIGLIE", "FORNI", "PIANI COTTURA",
+    "CAPPE", "TV", "AUDIO", "CLIMATIZZATORI", "PICCOLI ELETTRODOMESTICI", "ASPIRAPOLVERE", "MICROONDE",
+    "CURA PERSONA", "ACCESSORI", "INCASSO", "CANTINETTE", "TELEFONIA", "INFORMATICA",
+]
+# Stagionalità mensile (gen..dic): picchi in primavera/estate (clima) e a fine anno
+STAGIONALITA = np.array([0.7, 0.75, 0.9, 1.0, 1.15, 1.35, 1.4, 0.6, 1.0, 1.05, 1.2, 1.3])
+
+def _pesi_zipf(n, s, rng):
+    pesi = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(pesi)
+    return pesi / pesi.sum()
+
+def genera_fatturati(n_righe, seed=42, n_agenti=25, n_clienti=8000, n_articoli=6000):
+    """DataFrame di n_righe righe di fatturato; a parità di argomenti il risultato è identico"""
+    rng = np.random.default_rng(seed)
+
+    # Agenti: id numerici, nomi come li scrive il gestionale (con qualche variazione di maiuscole/spazi)
+    id_agenti = np.arange(101, 101 + n_agenti)
+    nomi_agenti = np.array([f"AGENTE {i:02d}" for i in range(1, n_agenti + 1)], dtype=object)
+
+    # Clienti: ognuno assegnato a un agente (gli agenti "grandi" hanno più clienti)
+    agente_cliente = rng.choice(n_agenti, size=n_clienti, p=_pesi_zipf(n_agenti, 0.8, rng))
+    nomi_clienti = np.array([f"CLIENTE {i:05d} SRL" for i in range(n_clienti)], dtype=object)
+
+    # Articoli: marchio e categoria fissi, prezzo medio lognormale
+    marchio_articolo = rng.choice(len(MARCHI), size=n_articoli, p=_pesi_zipf(len(MARCHI), 1.1, rng))
+    categoria_articolo = rng.choice(len(CATEGORIE), size=n_articoli, p=_pesi_zipf(len(CATEGORIE), 0.9, rng))
+    prezzo_articolo = rng.lognormal(mean=5.0, sigma=1.0, size=n_articoli)
+    codici_articolo = np.array([f"ART{i:06d}" for i in range(n_articoli)], dtype=object)
+
+    # Periodi (anno, mese) pesati per stagionalità e crescita annua; l'anno in corso si ferma a MESI_ANNO_CORRENTE
+    periodi, pesi_periodi = [], []
+    for k, anno in enumerate(ANNI):
+        ultimo_mese = MESI_ANNO_CORRENTE if anno == ANNI[-1] else 12
+        for mese in range(1, ultimo_mese + 1):
+            periodi.append((anno, mese))
+            pesi_periodi.append(STAGIONALITA[mese - 1] * (1.06 ** k))
+    periodi = np.array(periodi)
+    pesi_periodi = np.array(pesi_periodi) / sum(pesi_periodi)
+
+    cliente = rng.choice(n_clienti, size=n_righe, p=_pesi_zipf(n_clienti, 1.05, rng))
+    articolo = rng.choice(n_articoli, size=n_righe, p=_pesi_zipf(n_articoli, 0.9, rng))
+    periodo = periodi[rng.choice(len(periodi), size=n_righe, p=pesi_periodi)]
+    agente = agente_cliente[cliente]
+    quantita = rng.integers(1, 6, size=n_righe)
+    importo = np.round(prezzo_articolo[articolo] * quantita * rng.uniform(0.7, 1.0, size=n_righe), 2)
+    # Resi / note di credito
+    importo[rng.random(n_righe) < 0.02] *= -1
+
+    codart = codici_articolo[articolo]
+    raee = rng.random(n_righe) < QUOTA_RAEE
+    codart[raee] = np.where(rng.random(raee.sum()) < 0.5, "RAEE", "raee-r2")
+    importo[raee] = np.round(rng.uniform(1, 20, size=raee.sum()), 2)
+
+    agente_doc = nomi_agenti[agente].copy()
+    sporco = rng.random(n_righe) < 0.05
+    agente_doc[sporco] = np.char.add(np.char.lower(agente_doc[sporco].astype(str)), " ").astype(object)
+
+    famiglia = np.array(MARCHI, dtype=object)[marchio_articolo[articolo]]
+    vuote = rng.random(n_righe) < 0.01
+    famiglia[vuote] = rng.choice(np.array([None, "", "0", "none"], dtype=object), size=vuote.sum())
+
+    importo_nullo = rng.random(n_righe) < 0.001
+    importi = importo.astype(float)
+    importi[importo_nullo] = np.nan
+
+    anni_righe = periodo[:, 0]
+    return pd.DataFrame({
+        "AnnoRif": anni_righe,
+        "MeseRif": periodo[:, 1],
+        "AgenteDoc": agente_doc,
+        "Cliente": nomi_clienti[cliente],
+        "ImportoNettoRiga": importi,
+        "Merceologica": np.array(CATEGORIE, dtype=object)[categoria_articolo[articolo]],
+        "CodArt": codart,
+        "IdAgenteDoc": id_agenti[agente],
+        "Famiglia": famiglia,
+        "IdAnagrafica": cliente + 10000,
+        # Un documento ogni ~4 righe per cliente/anno
+        "IdTestata": anni_righe * 10_000_000 + cliente * 100 + rng.integers(0, 100, size=n_righe) // 4,
+    })
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    destinazione = sys.argv[2] if len(sys.argv) > 2 else None
+    df = genera_fatturati(n)
+    if destinazione is None:
+        print(df.head(20).to_string())
+        print(f"\n{len(df):,} righe, {df.memory_usage(deep=True).sum() / 1e6:,.1f} MB")
+    elif destinazione.endswith(".parquet"):
+        df.to_parquet(destinazione, index=False)
+    else:
+        df.to_csv(destinazione, index=False)
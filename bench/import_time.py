@@ -0,0 +1,73 @@
+"""Budget sul tempo di import delle pagine (cold start dopo un deploy o un riavvio).
+
+Per ogni modulo in views/ lancia un interprete pulito con `python -X importtime`, con streamlit e
+pandas già importati (li carica comunque app.py), e controlla che:
+  - il tempo cumulativo di import del modulo resti sotto BUDGET_MS;
+  - nessuna libreria pesante (plotly, fpdf, folium, supabase...) venga importata all'import.
+
+Uso:  python bench/import_time.py    (exit code 1 se un budget viene superato)
+"""
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULI_PAGINE = [
+    "views.preventivi", "views.archivio", "views.ordinato", "views.dashboard",
+    "views.clienti", "views.eventi", "views.note_spese", "views.mappa",
+]
+BUDGET_MS = 150
+LIBRERIE_PESANTI = ["plotly", "fpdf", "folium", "streamlit_folium", "supabase", "st_supabase_connection", "PIL", "duckdb"]
+
+_RIGA_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+def misura_import(modulo):
+    """Restituisce (ms cumulativi del modulo, set dei moduli di primo livello importati)"""
+    codice = "import streamlit, pandas" + (f"; import {modulo}" if modulo else "")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codice],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import di {modulo} fallito:\n{proc.stderr[-2000:]}")
+
+    cumulativo_us = None
+    importati = set()
+    for riga in proc.stderr.splitlines():
+        m = _RIGA_IMPORTTIME.match(riga)
+        if not m:
+            continue
+        nome = m.group(4)
+        importati.add(nome.split(".")[0])
+        if nome == modulo:
+            cumulativo_us = int(m.group(2))
+    return (cumulativo_us or 0) / 1000, importati
+
+def main():
+    errori = []
+    # Quello che streamlit e pandas importano già da soli non è attribuibile alle pagine
+    _, importati_base = misura_import(None)
+    print(f"{'MODULO':<22} {'IMPORT (ms)':>12}  BUDGET {BUDGET_MS} ms")
+    for modulo in MODULI_PAGINE:
+        ms, importati = misura_import(modulo)
+        pesanti = sorted(set(LIBRERIE_PESANTI) & (importati - importati_base))
+        esito = "OK"
+        if ms > BUDGET_MS:
+            esito = "SUPERATO"
+            errori.append(f"{modulo}: {ms:.1f} ms > {BUDGET_MS} ms")
+        if pesanti:
+            esito = "PESANTI"
+            errori.append(f"{modulo}: importa all'avvio {', '.join(pesanti)}")
+        print(f"{modulo:<22} {ms:>12.1f}  {esito}")
+
+    if errori:
+        print("\nBudget di import non rispettato:")
+        for e in errori:
+            print(f"  - {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""Load test multi-sessione di app.py con streamlit.testing (AppTest) sul database locale SQLite.
+
+Prepara un database locale (core/db_locale.py) con agenti, rubrica, listino e fatturati sintetici
+(bench/genera_fatturati.py), poi fa girare in parallelo N utenti simulati, ognuno con la propria
+sessione AppTest nello stesso processo (come sessioni diverse sullo stesso server Streamlit,
+con cache e client condivisi):
+  - agenti: login, compongono un preventivo con righe manuali e note, lo salvano, aprono l'archivio;
+  - admin: login, aprono Performance (dashboard), Archivio Ordini e Nota Spese.
+Le ricerche st_searchbox sono componenti custom che AppTest non può pilotare: le righe articolo
+vengono inserite con "➕ Manuale".
+
+Riporta throughput (reruns/s), latenza dei reruns p50/p95/p99 per passo e la memoria del processo.
+
+Uso:
+  python bench/load_test.py --utenti 20 --admin 4 --iterazioni 3
+  python bench/load_test.py --righe-fatturati 500000 --ricrea-db
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+# Meno rumore dai warning di deprecazione di Streamlit durante il test
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+DB_DEFAULT = os.path.join(tempfile.gettempdir(), "vivetti_load_test.sqlite")
+PASSWORD = "load-test"
+
+# Runner dell'ultimo run AppTest per thread (ogni sessione simulata gira nel proprio thread)
+_runner_corrente = threading.local()
+
+# --- 1. DATI DI PROVA ---
+def _record(df):
+    """Righe del DataFrame come dict con tipi Python (come arriverebbero da JSON)"""
+    import pandas as pd
+    return df.astype(object).where(pd.notna(df), None).to_dict("records")
+
+def prepara_database(percorso, righe_fatturati, seed=42):
+    from core.db_locale import ClientLocale
+    from genera_fatturati import genera_fatturati
+
+    for suffisso in ("", "-wal", "-shm"):
+        if os.path.exists(percorso + suffisso):
+            os.remove(percorso + suffisso)
+    client = ClientLocale(percorso)
+
+    def inserisci(tabella, righe, blocco=5000):
+        for i in range(0, len(righe), blocco):
+            client.table(tabella).insert(righe[i:i + blocco]).execute()
+
+    df = genera_fatturati(righe_fatturati, seed=seed)
+    inserisci("fatturati", _record(df.drop(columns=["IdTestata"])))
+
+    agenti = df.groupby("IdAgenteDoc")["AgenteDoc"].first().str.upper().str.strip()
+    inserisci("agenti", [{"id_agente": str(i), "nome_agente": n} for i, n in agenti.items()])
+
+    clienti = df.groupby("IdAnagrafica").agg(ragione_sociale=("Cliente", "first"), id_agente=("IdAgenteDoc", "first")).reset_index()
+    inserisci("rubrica_clienti", [
+        {"id_cliente": int(r.IdAnagrafica), "ragione_sociale": r.ragione_sociale, "citta": "BOLOGNA",
+         "id_agente": str(r.id_agente), "lat": 44.49 + (r.IdAnagrafica % 100) / 1000, "lon": 11.34 + (r.IdAnagrafica % 70) / 1000}
+        for r in clienti.itertuples()
+    ])
+
+    articoli = df.groupby("CodArt").agg(Famiglia=("Famiglia", "first"), Merceologica=("Merceologica", "first"),
+                                        prezzo=("ImportoNettoRiga", "median")).reset_index()
+    inserisci("listino_import", [
+        {"CODICE": r.CodArt, "DESCRIZIONE": f"{r.Merceologica} {r.Famiglia or ''} {r.CodArt}".strip(),
+         "PREZZO": round(abs(r.prezzo or 0), 2), "SCONTO1": 10.0, "SCONTO2": 0.0, "SCONTO3": 0.0,
+         "PREZZOLISTINO": round(abs(r.prezzo or 0), 2)}
+        for r in articoli.itertuples()
+    ])
+
+    # Storico di preventivi/ordini e note spese, così le tabelle esistono con le loro colonne
+    ids_agenti = [str(i) for i in agenti.index]
+    for i in range(200):
+        testata = client.table("preventivi_testata").insert({
+            "id_cliente": int(clienti["IdAnagrafica"].iloc[i % len(clienti)]),
+            "ragione_sociale_cliente": clienti["ragione_sociale"].iloc[i % len(clienti)],
+            "id_agente": ids_agenti[i % len(ids_agenti)], "totale_netto": 1000.0 + i, "note_generali": "",
+            "data_consegna": "2026-12-01", "riferimento": f"Storico {i}", "numero_preventivo": f"PREV-STORICO-{i:04d}",
+            "stato": "Ordine" if i % 3 == 0 else "Preventivo", "inviato": i % 2 == 0,
+        }).execute().data[0]
+        client.table("preventivi_righe").insert([{
+            "id_preventivo": testata["id"], "codice_articolo": f"ART{k:06d}", "descrizione": f"Articolo storico {k}",
+            "quantita": 1 + k % 3, "prezzo_lordo_unitario": 100.0, "sconto_1": 10.0, "sconto_2": 0.0, "sconto_3": 0.0,
+            "is_sconto_merce": False, "prezzo_netto_unitario": 90.0, "nota_riga": "", "PREZZOLISTINO": 100.0,
+        } for k in range(8)]).execute()
+    inserisci("nota_spese", [{
+        "id_agente": ids_agenti[i % len(ids_agenti)], "data_scontrino": f"2026-{1 + i % 9:02d}-{1 + i % 28:02d}",
+        "mese": 1 + i % 9, "anno": 2026, "causale": ["CARBURANTE", "PRANZO", "HOTEL", "PEDAGGI"][i % 4],
+        "importo": 10.0 + i % 90, "note": "", "url_scontrino": None, "verificato": i % 5 == 0,
+    } for i in range(1000)])
+    return ids_agenti
+
+# --- 2. SESSIONI SIMULATE ---
+def installa_cookie_manager_finto():
+    """streamlit_cookies_manager richiede un browser: lo sostituiamo con un dizionario sempre pronto"""
+    modulo = types.ModuleType("streamlit_cookies_manager")
+
+    class EncryptedCookieManager(dict):
+        def __init__(self, prefix="", password=""):
+            super().__init__()
+
+        def ready(self):
+            return True
+
+        def save(self):
+            pass
+
+    modulo.EncryptedCookieManager = EncryptedCookieManager
+    sys.modules["streamlit_cookies_manager"] = modulo
+
+def installa_runtime_condiviso(segreti):
+    """Runtime e secrets unici per tutte le sessioni, come in un vero server.
+
+    AppTest è pensato per un test alla volta: a ogni run installa un Runtime finto e alla fine lo
+    azzera (Runtime._instance = None), e scambia st.secrets avanti e indietro. Con più AppTest in
+    parallelo una sessione che finisce toglierebbe il Runtime alle altre: installiamo un Runtime
+    condiviso e facciamo scrivere ad AppTest su una sottoclasse che nessuno legge.
+    """
+    from unittest.mock import MagicMock
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    try:
+        from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+        runtime.dataframe_source_mgr = DataframeSourceManager()
+    except ImportError:
+        pass
+    Runtime._instance = runtime
+
+    class _RuntimePerSingoloTest(Runtime):
+        _instance = None
+    app_test.Runtime = _RuntimePerSingoloTest
+
+    # Bytecode di app.py compilato una volta sola, come sul server (AppTest ricompila a ogni run,
+    # e ast.parse in parallelo su più thread non è affidabile in CPython 3.11)
+    script_cache = app_test.ScriptCache()
+    script_cache.get_bytecode(os.path.join(ROOT, "app.py"))
+    app_test.ScriptCache = lambda: script_cache
+    # Le versioni recenti creano la cache anche nel runner
+    local_script_runner.ScriptCache = lambda: script_cache
+
+    # Gli errori del ScriptRunner (es. compilazione di app.py) non diventano elementi dell'albero
+    # (at.exception/at.error): li annotiamo sul runner, che Sessione.esegui controlla dopo ogni run
+    class _RunnerConErrori(local_script_runner.LocalScriptRunner):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.errori = []
+            _runner_corrente.valore = self
+
+            def annota(sender, event, **dati):
+                if event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR:
+                    self.errori.append(f"Errore di compilazione: {dati.get('exception')}")
+            self.on_event.connect(annota, weak=False)
+    app_test.LocalScriptRunner = _RunnerConErrori
+
+    # Con at.secrets vuoto AppTest non tocca st.secrets
+    secrets = Secrets()
+    secrets._secrets = segreti
+    st.secrets = secrets
+
+class Sessione:
+    """Una sessione browser: un AppTest con i propri session_state, che registra la durata di ogni rerun"""
+
+    def __init__(self, misure, lock):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+        self._misure, self._lock = misure, lock
+
+    def esegui(self, passo, azione=None):
+        _runner_corrente.valore = None
+        t0 = time.perf_counter()
+        try:
+            (azione() if azione else self.at).run()
+        except (KeyError, StopIteration):
+            # AppTest non è pensato per girare in parallelo: ogni tanto l'albero degli elementi di una
+            # sessione perde un widget. Si ripete il passo una volta dopo un rerun e lo si conta a parte.
+            with self._lock:
+                self._misure.append(("(ripetuto)", 0.0, None))
+            self.at.run()
+            t0 = time.perf_counter()
+            (azione() if azione else self.at).run()
+        ms = (time.perf_counter() - t0) * 1000
+        runner = getattr(_runner_corrente, "valore", None)
+        errori = (runner.errori if runner is not None else []) + [str(e.value)[:200] for e in self.at.exception] \
+            + [str(e.value)[:200] for e in self.at.error]
+        with self._lock:
+            self._misure.append((passo, ms, errori[0] if errori else None))
+
+    def widget(self, tipo, etichetta):
+        return next(w for w in getattr(self.at, tipo) if w.label == etichetta)
+
+    def login(self, utente):
+        self.esegui("apertura")
+        self.widget("text_input", "Username").input(utente)
+        self.widget("text_input", "Password").input(PASSWORD)
+        self.esegui("login", lambda: self.widget("button", "Accedi").click())
+
+    def apri(self, pagina):
+        self.esegui(f"pagina {pagina}", lambda: self.at.radio(key="menu_nav").set_value(pagina))
+
+def utente_agente(sessione, utente, iterazioni, righe_per_preventivo):
+    sessione.login(utente)
+    for n in range(iterazioni):
+        sessione.apri("📊 Nuovo Preventivo")
+        for k in range(righe_per_preventivo):
+            if k % 5 == 4:
+                sessione.esegui("nuova nota", lambda: sessione.widget("button", "🗒️ Nota").click())
+                sessione.widget("text_area", "Testo della nota (apparirà in grassetto)").input(f"Nota {k}: consegna al piano")
+                sessione.esegui("aggiungi nota", lambda: sessione.widget("button", "💾 AGGIUNGI NOTA").click())
+                continue
+            sessione.esegui("riga manuale", lambda: sessione.widget("button", "➕ Manuale").click())
+            sessione.widget("text_input", "Codice").input(f"ART{k:06d}")
+            sessione.widget("text_input", "Descrizione").input(f"Articolo di prova {k} per {utente}")
+            sessione.widget("number_input", "Prezzo Unitario").set_value(100.0 + k)
+            sessione.widget("number_input", "Quantità").set_value(1 + k % 3)
+            sessione.esegui("aggiungi riga", lambda: sessione.widget("button", "🚀 AGGIUNGI AL PREVENTIVO").click())
+        sessione.esegui("nuovo cliente", lambda: sessione.widget("checkbox", "🆕 Nuovo cliente (non ancora in rubrica)").check())
+        sessione.esegui("ragione sociale", lambda: sessione.widget("text_input", "Ragione Sociale Nuovo Cliente").input(f"Cliente load test {utente} {n}"))
+        sessione.esegui("salva preventivo", lambda: sessione.widget("button", "💾 SALVA E CHIUDI").click())
+        sessione.widget("checkbox", "🆕 Nuovo cliente (non ancora in rubrica)").uncheck()
+        sessione.apri("📊 Archivio Preventivi")
+
+def utente_admin(sessione, utente, iterazioni, righe_per_preventivo):
+    sessione.login(utente)
+    for _ in range(iterazioni):
+        sessione.apri("📊 Performance")
+        sessione.apri("📦 Archivio Ordini")
+        sessione.apri("📈 Nota Spese")
+
+# --- 3. MEMORIA ---
+def rss_mb():
+    """Memoria residente del processo (server Streamlit + tutte le sessioni simulate)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class CampionatoreMemoria(threading.Thread):
+    def __init__(self, intervallo=0.25):
+        super().__init__(daemon=True)
+        self.intervallo, self.picco, self._fermo = intervallo, rss_mb(), threading.Event()
+
+    def run(self):
+        while not self._fermo.is_set():
+            self.picco = max(self.picco, rss_mb())
+            time.sleep(self.intervallo)
+
+    def ferma(self):
+        self._fermo.set()
+        self.join()
+        return self.picco
+
+def percentile(valori, p):
+    ordinati = sorted(valori)
+    if not ordinati:
+        return 0.0
+    k = (len(ordinati) - 1) * p / 100
+    basso = int(k)
+    alto = min(basso + 1, len(ordinati) - 1)
+    return ordinati[basso] + (ordinati[alto] - ordinati[basso]) * (k - basso)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--utenti", type=int, default=10, help="sessioni agente in parallelo")
+    parser.add_argument("--admin", type=int, default=2, help="sessioni admin in parallelo")
+    parser.add_argument("--iterazioni", type=int, default=2)
+    parser.add_argument("--righe-preventivo", type=int, default=5)
+    parser.add_argument("--righe-fatturati", type=int, default=100_000)
+    parser.add_argument("--db", default=DB_DEFAULT)
+    parser.add_argument("--ricrea-db", action="store_true")
+    parser.add_argument("--tracing", action="store_true", help="lascia attivo il tracer delle query")
+    args = parser.parse_args()
+
+    if args.ricrea_db or not os.path.exists(args.db):
+        t0 = time.perf_counter()
+        prepara_database(args.db, args.righe_fatturati)
+        print(f"Database locale pronto in {time.perf_counter() - t0:.1f}s: {args.db}")
+    from core.db_locale import ClientLocale
+    id_agenti = [r["id_agente"] for r in ClientLocale(args.db).table("agenti").select("id_agente").order("id").execute().data]
+
+    installa_cookie_manager_finto()
+    import streamlit as st
+    # Ogni test parte a cache vuota (anche quella persistita su disco dalla dashboard)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    utenti = [(f"agente{i}", id_agenti[i % len(id_agenti)], "agente", utente_agente) for i in range(args.utenti)]
+    utenti += [(f"admin{i}", "0", "admin", utente_admin) for i in range(args.admin)]
+    segreti = {
+        "passwords": {u: PASSWORD for u, _, _, _ in utenti},
+        "agenti": {u: id_ag for u, id_ag, _, _ in utenti},
+        "ruoli": {u: ruolo for u, _, ruolo, _ in utenti},
+        "connections": {"supabase": {"url": f"sqlite:///{os.path.abspath(args.db)}", "key": "-"}},
+        # Senza riscaldamento né caricamento progressivo: "pagina 📊 Performance" misura la pagina completa,
+        # non la schermata di attesa che si aggiorna da sola mentre i dati arrivano in background
+        "perf": {"tracing": args.tracing, "riscaldamento": False, "caricamento_progressivo": False},
+    }
+
+    installa_runtime_condiviso(segreti)
+    misure, lock, falliti = [], threading.Lock(), []
+
+    def esegui_utente(utente, scenario):
+        try:
+            scenario(Sessione(misure, lock), utente, args.iterazioni, args.righe_preventivo)
+        except Exception as e:
+            falliti.append(f"{utente}: {type(e).__name__}: {e}")
+
+    rss_iniziale = rss_mb()
+    campionatore = CampionatoreMemoria()
+    campionatore.start()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=esegui_utente, args=(u, scenario)) for u, _, _, scenario in utenti]
+    for i, t in enumerate(threads):
+        t.start()
+        time.sleep(0.05)  # rampa: le sessioni non partono tutte nello stesso istante
+    for t in threads:
+        t.join()
+    durata = time.perf_counter() - t0
+    picco = campionatore.ferma()
+    ripetuti = sum(1 for passo, _, _ in misure if passo == "(ripetuto)")
+    misure = [m for m in misure if m[0] != "(ripetuto)"]
+
+    print(f"\n{len(utenti)} sessioni ({args.utenti} agenti, {args.admin} admin), {len(misure)} reruns in {durata:.1f}s "
+          f"-> {len(misure) / durata:.1f} reruns/s")
+    print(f"Memoria processo: {rss_iniziale:,.0f} MB all'avvio, picco {picco:,.0f} MB, fine {rss_mb():,.0f} MB")
+    if ripetuti:
+        print(f"Passi ripetuti per instabilità di AppTest in parallelo: {ripetuti}")
+    print()
+
+    passi = {}
+    for passo, ms, _ in misure:
+        passi.setdefault(passo, []).append(ms)
+    passi["TUTTI"] = [ms for _, ms, _ in misure]
+    print(f"{'passo':<32}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for passo, valori in passi.items():
+        print(f"{passo:<32}{len(valori):>6}{percentile(valori, 50):>10.0f}{percentile(valori, 95):>10.0f}"
+              f"{percentile(valori, 99):>10.0f}{max(valori):>10.0f}")
+
+    errori = [(passo, err) for passo, _, err in misure if err]
+    if errori or falliti:
+        print(f"\n⚠️ {len(errori)} reruns con errori, {len(falliti)} sessioni interrotte")
+        for passo, err in errori[:5]:
+            print(f"  - {passo}: {err}")
+        for f in falliti[:5]:
+            print(f"  - {f}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
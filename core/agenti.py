@@ -0,0 +1,68 @@
+import streamlit as st
+from core import anagrafiche
+
+# Chiave di session_state con l'ultimo errore di lettura della tabella 'agenti', mostrato da mostra_errore()
+_CHIAVE_ERRORE = "_errore_directory_agenti"
+
+# --- DIRECTORY AGENTI (TABELLA 'agenti' + SECRETS) ---
+def get_directory_agenti():
+    """Unisce la tabella 'agenti' e st.secrets["agenti"] in lookup O(1) id -> nome e nome -> id.
+
+    Se la tabella non è leggibile restano i soli secrets e l'errore viene annotato per la sessione:
+    qui non si disegna nulla, la funzione gira anche nei thread di in_parallelo e del riscaldamento.
+    """
+    try:
+        versione = anagrafiche.versione("agenti")
+    except Exception as e:
+        _annota_errore(f"Errore caricamento mappa agenti: {e}")
+        versione = -1
+    return _costruisci_directory(versione)
+
+def _annota_errore(messaggio):
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    # Fuori da una sessione (riscaldamento) non c'è nessuno a cui mostrarlo
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        st.session_state[_CHIAVE_ERRORE] = messaggio
+
+def mostra_errore():
+    """Mostra nella sidebar l'errore annotato durante il rerun (da chiamare nel thread dello script)"""
+    messaggio = st.session_state.pop(_CHIAVE_ERRORE, None)
+    if messaggio:
+        st.sidebar.error(messaggio)
+
+# La directory viene ricostruita solo quando la replica di 'agenti' cambia versione
+@st.cache_data(max_entries=4, show_spinner=False)
+def _costruisci_directory(versione):
+    id_to_nome = {}
+    ids_tabella = []
+    if versione >= 0:
+        for row in anagrafiche.righe("agenti"):
+            id_ag = str(row['id_agente']).strip()
+            id_to_nome[id_ag] = str(row['nome_agente']).upper()
+            ids_tabella.append(id_ag)
+
+    # Gli utenti presenti solo nei secrets (autisti, amministrazione...) completano la mappa
+    for username, id_secret in st.secrets.get("agenti", {}).items():
+        id_ag = str(id_secret).strip()
+        if id_ag not in id_to_nome:
+            id_to_nome[id_ag] = str(username).upper()
+
+    nome_to_id = {nome: id_ag for id_ag, nome in id_to_nome.items()}
+    return {"id_to_nome": id_to_nome, "nome_to_id": nome_to_id, "ids_tabella": ids_tabella}
+
+def invalida_directory_agenti():
+    """Forza il controllo della tabella 'agenti' al prossimo accesso"""
+    anagrafiche.invalida("agenti")
+
+def mappa_agenti(solo_tabella=False):
+    """Dizionario id_agente -> nome; con solo_tabella=True esclude gli utenti presenti solo nei secrets"""
+    directory = get_directory_agenti()
+    if solo_tabella:
+        return {id_ag: directory["id_to_nome"][id_ag] for id_ag in directory["ids_tabella"]}
+    return directory["id_to_nome"]
+
+def nome_agente(id_agente, default=None):
+    return get_directory_agenti()["id_to_nome"].get(str(id_agente).strip(), default)
+
+def id_agente_da_nome(nome, default=None):
+    return get_directory_agenti()["nome_to_id"].get(str(nome).upper().strip(), default)
@@ -0,0 +1,270 @@
+"""Replica locale (per processo) delle anagrafiche: rubrica_clienti, agenti, listino_import.
+
+Le tabelle vengono scaricate per intero (paginate) al primo accesso e tenute in un database SQLite
+in memoria; ogni INTERVALLO_DELTA secondi si scaricano solo le righe nuove/modificate. Le viste leggono
+da qui invece di interrogare Supabase a ogni ricerca o render. Dopo il primo caricamento gli aggiornamenti
+girano in background: le letture non li attendono e vedono la copia precedente fino alla sostituzione.
+"""
+import json
+import sqlite3
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from core.cache_condivisa import VoloUnico
+from core.db import get_supabase_client, leggi_paginato
+
+# Tabella -> colonne candidate come chiave (la prima esistente viene usata per ordinare e per il delta)
+TABELLE_REPLICA = {
+    "rubrica_clienti": ("id", "id_cliente"),
+    "agenti": ("id", "id_agente"),
+    "listino_import": ("id", "CODICE"),
+}
+# Colonna di ultima modifica (vedi sql/anagrafiche_updated_at.sql): se presente il delta include le righe modificate
+COLONNA_MODIFICA = "updated_at"
+# Secondi tra due controlli delta
+INTERVALLO_DELTA = 60
+# Secondi dopo cui la tabella viene comunque riscaricata per intero
+INTERVALLO_COMPLETO = 3600
+
+
+def _q(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def _campo(colonna):
+    """Espressione SQLite che estrae una colonna dal JSON della riga"""
+    return "json_extract(dati, '$.\"" + str(colonna).replace("'", "''").replace('"', '\\"') + "\"')"
+
+def _minuscolo(valore):
+    return valore.lower() if isinstance(valore, str) else valore
+
+def _numero(valore):
+    return isinstance(valore, (int, float)) and not isinstance(valore, bool)
+
+
+class _StatoTabella:
+    def __init__(self):
+        self.chiave = None
+        self.caricata = False
+        self.versione = 0
+        self.righe = 0
+        self.max_chiave = None
+        self.max_modifica = None
+        self.ultimo_completo = 0.0
+        self.ultimo_controllo = 0.0
+        self.invalidata = False
+        self.lock_aggiornamento = threading.Lock()
+
+
+class _Replica:
+    def __init__(self):
+        self.con = sqlite3.connect(":memory:", check_same_thread=False)
+        self.con.create_function("minuscolo", 1, _minuscolo, deterministic=True)
+        self.lock_db = threading.Lock()
+        self.stati = {}
+        self.df_cache = {}
+        self.voli = VoloUnico()
+        for tabella in TABELLE_REPLICA:
+            self.con.execute(f"CREATE TABLE {_q(tabella)} (chiave TEXT PRIMARY KEY, dati TEXT NOT NULL)")
+            self.stati[tabella] = _StatoTabella()
+
+    # --- SINCRONIZZAZIONE ---
+    def assicura(self, tabella):
+        """Carica la tabella al primo accesso (bloccante); poi delta e ricariche complete girano in background
+        e nel frattempo si servono i dati presenti. Dopo invalida() il delta si attende, per rileggere le
+        proprie modifiche. Le sessioni che attendono insieme condividono un unico caricamento (ed errore)."""
+        stato = self.stati[tabella]
+        if not stato.caricata or stato.invalidata:
+            self.voli.esegui(("assicura", tabella), lambda _: self._aggiorna_subito(tabella, stato))
+        elif time.time() - stato.ultimo_controllo >= INTERVALLO_DELTA:
+            self.rinnova(tabella)
+        return stato
+
+    def _aggiorna_subito(self, tabella, stato):
+        with stato.lock_aggiornamento:
+            if not stato.caricata or stato.invalidata:
+                stato.invalidata = False
+                self._aggiorna(tabella, stato)
+
+    def rinnova(self, tabella, completo=False):
+        """Delta (o ricarica completa) in background; False se un aggiornamento è già in corso"""
+        stato = self.stati[tabella]
+        if not stato.lock_aggiornamento.acquire(blocking=False):
+            return False
+
+        def esegui():
+            try:
+                self._aggiorna(tabella, stato, completo)
+            finally:
+                stato.lock_aggiornamento.release()
+
+        threading.Thread(target=esegui, name=f"rinnovo-{tabella}", daemon=True).start()
+        return True
+
+    def _aggiorna(self, tabella, stato, completo=False):
+        # Da chiamare con lock_aggiornamento acquisito
+        if completo or not stato.caricata or time.time() - stato.ultimo_completo >= INTERVALLO_COMPLETO:
+            try:
+                self._carica_completo(tabella, stato)
+            except Exception:
+                if not stato.caricata:
+                    raise
+                # Ricarica fallita: si resta sulla copia attuale e si riprova al prossimo intervallo
+                stato.ultimo_controllo = time.time()
+            return
+        try:
+            self._applica_delta(tabella, stato)
+        except Exception:
+            # Rete/Supabase non disponibili: si resta sulla copia attuale e si riprova al prossimo intervallo
+            stato.ultimo_controllo = time.time()
+
+    def _trova_chiave(self, supabase, tabella):
+        for colonna in TABELLE_REPLICA[tabella]:
+            try:
+                supabase.table(tabella).select(colonna).limit(1).execute()
+                return colonna
+            except Exception:
+                continue
+        return None
+
+    def _carica_completo(self, tabella, stato):
+        supabase = get_supabase_client()
+        if stato.chiave is None:
+            stato.chiave = self._trova_chiave(supabase, tabella)
+
+        def crea_query():
+            query = supabase.table(tabella).select("*")
+            return query.order(stato.chiave) if stato.chiave else query
+
+        righe = leggi_paginato(crea_query)
+        with self.lock_db:
+            self.con.execute(f"DELETE FROM {_q(tabella)}")
+            self._scrivi(tabella, stato, righe, enumera=True)
+            stato.righe = len(righe)
+        stato.max_chiave = None
+        stato.max_modifica = None
+        self._aggiorna_massimi(stato, righe)
+        stato.caricata = True
+        stato.ultimo_completo = stato.ultimo_controllo = time.time()
+
+    def _applica_delta(self, tabella, stato):
+        supabase = get_supabase_client()
+        nuove = []
+        if stato.chiave and _numero(stato.max_chiave):
+            nuove += leggi_paginato(lambda: supabase.table(tabella).select("*").gt(stato.chiave, stato.max_chiave).order(stato.chiave))
+        if stato.max_modifica is not None:
+            nuove += leggi_paginato(lambda: supabase.table(tabella).select("*").gt(COLONNA_MODIFICA, stato.max_modifica).order(stato.chiave or COLONNA_MODIFICA))
+        if nuove and stato.chiave:
+            with self.lock_db:
+                self._scrivi(tabella, stato, nuove)
+                stato.righe = self.con.execute(f"SELECT COUNT(*) FROM {_q(tabella)}").fetchone()[0]
+            self._aggiorna_massimi(stato, nuove)
+
+        # Cancellazioni o inserimenti con chiave non crescente: il conteggio non torna -> ricarica completa
+        colonna_conteggio = stato.chiave or "*"
+        remoto = supabase.table(tabella).select(colonna_conteggio, count="exact").limit(1).execute().count
+        if remoto is not None and remoto != stato.righe:
+            self._carica_completo(tabella, stato)
+            return
+        stato.ultimo_controllo = time.time()
+
+    def _scrivi(self, tabella, stato, righe, enumera=False):
+        if not righe:
+            return
+        valori = []
+        for i, riga in enumerate(righe):
+            chiave = riga.get(stato.chiave) if stato.chiave else None
+            valori.append((str(i) if enumera and chiave is None else str(chiave), json.dumps(riga, default=str)))
+        self.con.executemany(f"INSERT OR REPLACE INTO {_q(tabella)} (chiave, dati) VALUES (?, ?)", valori)
+        stato.versione += 1
+
+    def _aggiorna_massimi(self, stato, righe):
+        for riga in righe:
+            chiave = riga.get(stato.chiave) if stato.chiave else None
+            if _numero(chiave) and (stato.max_chiave is None or chiave > stato.max_chiave):
+                stato.max_chiave = chiave
+            modifica = riga.get(COLONNA_MODIFICA)
+            if modifica is not None and (stato.max_modifica is None or str(modifica) > str(stato.max_modifica)):
+                stato.max_modifica = modifica
+
+    # --- LETTURA ---
+    def seleziona(self, tabella, uguali=None, non_nulli=(), testo=None, campi_testo=(), limite=None):
+        self.assicura(tabella)
+        condizioni, parametri = [], []
+        for colonna, valore in (uguali or {}).items():
+            condizioni.append(f"CAST({_campo(colonna)} AS TEXT) = ?")
+            parametri.append(str(valore).strip())
+        for colonna in non_nulli:
+            condizioni.append(f"{_campo(colonna)} IS NOT NULL")
+        if testo:
+            # Equivalente di ilike '%testo%' su una qualsiasi delle colonne indicate
+            condizioni.append("(" + " OR ".join(f"minuscolo({_campo(c)}) LIKE ?" for c in campi_testo) + ")")
+            parametri += [f"%{testo.lower()}%"] * len(campi_testo)
+        sql = f"SELECT dati FROM {_q(tabella)}"
+        if condizioni:
+            sql += " WHERE " + " AND ".join(condizioni)
+        sql += " ORDER BY rowid"
+        if limite:
+            sql += f" LIMIT {int(limite)}"
+        with self.lock_db:
+            risultato = self.con.execute(sql, parametri).fetchall()
+        return [json.loads(dati) for (dati,) in risultato]
+
+    def dataframe(self, tabella):
+        stato = self.assicura(tabella)
+        chiave_cache = (tabella, stato.versione)
+        df = self.df_cache.get(chiave_cache)
+        if df is None:
+            # Una sola costruzione per versione anche se più sessioni la chiedono insieme
+            df = self.voli.esegui(chiave_cache, lambda _: self._costruisci_dataframe(tabella, chiave_cache))
+        return df
+
+    def _costruisci_dataframe(self, tabella, chiave_cache):
+        df = self.df_cache.get(chiave_cache)
+        if df is None:
+            df = pd.DataFrame(self.seleziona(tabella))
+            self.df_cache = {**{k: v for k, v in self.df_cache.items() if k[0] != tabella}, chiave_cache: df}
+        return df
+
+
+@st.cache_resource(show_spinner=False)
+def _replica():
+    """Replica unica per processo, condivisa tra sessioni e pagine"""
+    return _Replica()
+
+# --- API PER LE VISTE ---
+def righe(tabella, uguali=None, non_nulli=(), limite=None):
+    """Righe della tabella (dict come restituiti da PostgREST), filtrate per uguaglianza e colonne non nulle"""
+    return _replica().seleziona(tabella, uguali=uguali, non_nulli=non_nulli, limite=limite)
+
+def cerca(tabella, testo, campi_testo, uguali=None, limite=20):
+    """Ricerca case-insensitive di 'testo' in una qualsiasi delle colonne campi_testo (come ilike '%testo%')"""
+    return _replica().seleziona(tabella, uguali=uguali, testo=testo, campi_testo=campi_testo, limite=limite)
+
+def trova(tabella, colonna, valore):
+    """Prima riga con colonna == valore, oppure None"""
+    risultato = righe(tabella, uguali={colonna: valore}, limite=1)
+    return risultato[0] if risultato else None
+
+def dataframe(tabella):
+    """Copia della tabella intera come DataFrame (ricostruito solo quando la replica cambia)"""
+    return _replica().dataframe(tabella).copy()
+
+def versione(tabella):
+    """Contatore che cambia a ogni aggiornamento della tabella: utile come chiave di cache"""
+    return _replica().assicura(tabella).versione
+
+def invalida(tabella=None):
+    """Forza il controllo delta al prossimo accesso, che lo attende (tutte le tabelle se tabella è None)"""
+    replica = _replica()
+    for nome in ([tabella] if tabella else TABELLE_REPLICA):
+        replica.stati[nome].invalidata = True
+
+def aggiornamento(tabella):
+    """(ultimo aggiornamento riuscito, aggiornamento in corso) della tabella; il primo è None se non è caricata"""
+    stato = _replica().stati[tabella]
+    return (stato.ultimo_controllo if stato.caricata else None), stato.lock_aggiornamento.locked()
+
+def rinnova(tabella):
+    """Ricarica completa della tabella in background (pulsante di aggiornamento manuale)"""
+    return _replica().rinnova(tabella, completo=True)
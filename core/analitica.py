@@ -0,0 +1,360 @@
+"""Motori analitici opzionali: aggregazioni di Dashboard e Analisi Clienti eseguite in SQL.
+
+motore_analitico in [perf]:
+  "duckdb" -> DuckDB su una copia locale di `fatturati` in Parquet, partizionata per anno
+              (servono i pacchetti duckdb e pyarrow);
+  "rpc"    -> funzione vendite_aggregati nel database (sql/vendite_aggregati.sql): dalla rete
+              arrivano solo le righe già raggruppate, con RAEE esclusi e Famiglia normalizzata;
+  altro    -> pipeline pandas di core/vendite.py (default).
+Le funzioni hanno gli stessi nomi e risultati delle aggregazioni di vendite.py ma ricevono un
+FiltroVendite al posto del DataFrame filtrato: i filtri diventano predicati SQL e dal motore escono
+solo le righe raggruppate che servono ai grafici.
+"""
+import importlib.util
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+import streamlit as st
+from core import vendite, cache_disco
+from core.cache_condivisa import ATTESA_DOPO_ERRORE
+from core.db import get_supabase_client, leggi_a_pagine
+
+# Colonne della copia locale: quelle della dashboard più cliente e documento (Analisi Clienti)
+COLONNE_STORE = vendite.COLONNE_FATTURATI + ",IdAnagrafica,IdTestata"
+COLONNE_TESTO = ["MeseRif", "AgenteDoc", "Cliente", "Merceologica", "CodArt", "IdAgenteDoc", "Famiglia",
+                 "IdAnagrafica", "IdTestata"]
+# Secondi dopo cui la copia locale viene riscaricata (come il ttl di load_all_data)
+INTERVALLO_SINCRONIZZAZIONE = 3600
+# Righe per file Parquet durante il download: in memoria resta al massimo un blocco
+RIGHE_PER_FILE = 100_000
+
+# Filtri delle pagine; None o tupla vuota = nessun filtro su quella colonna
+FiltroVendite = namedtuple("FiltroVendite", "anni mesi agente cliente marchio", defaults=((), (), None, None, None))
+
+
+# --- 1. CONFIGURAZIONE ([perf] nei secrets) ---
+def _config():
+    try:
+        return st.secrets.get("perf", {})
+    except Exception:
+        return {}
+
+def disponibile():
+    return all(importlib.util.find_spec(m) is not None for m in ("duckdb", "pyarrow"))
+
+def motore():
+    """"duckdb", "rpc" oppure "pandas" (anche se è scelto duckdb ma i pacchetti non sono installati)"""
+    scelto = str(_config().get("motore_analitico", "pandas")).lower()
+    if scelto == "rpc" or (scelto == "duckdb" and disponibile()):
+        return scelto
+    return "pandas"
+
+def attivo():
+    """True se le aggregazioni vanno eseguite in SQL (DuckDB o RPC) invece che con pandas"""
+    return motore() != "pandas"
+
+# --- 2. COPIA LOCALE IN PARQUET ---
+def _schema_arrow():
+    import pyarrow as pa
+    return pa.schema([(c, pa.string()) for c in COLONNE_TESTO] + [("ImportoNettoRiga", pa.float64())])
+
+def _normalizza(df):
+    """Stessa pulizia della dashboard (RAEE esclusi, Famiglia normalizzata) con tipi fissi per il Parquet"""
+    df = vendite.normalizza_fatturati(df)
+    df = df[df["AnnoRif"].notna()]
+    out = pd.DataFrame({
+        c: df[c].astype("string") if c in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+        for c in COLONNE_TESTO
+    })
+    out["ImportoNettoRiga"] = df["ImportoNettoRiga"].astype(float)
+    out["AnnoRif"] = df["AnnoRif"].astype("int64")
+    return out
+
+
+class _Store:
+    def __init__(self):
+        self.cartella = cache_disco.cartella_dati()
+        self.percorso = None
+        self.versione = 0
+        self.creato = 0.0
+        self.righe = 0
+        self.ultimo_errore = 0.0
+        self.lock_aggiornamento = threading.Lock()
+        self.lock_connessione = threading.Lock()
+        self.con = None
+        self._riprendi_da_disco()
+
+    def _copie(self):
+        if not os.path.isdir(self.cartella):
+            return []
+        return sorted(n for n in os.listdir(self.cartella) if n.startswith("fatturati_") and not n.endswith(".tmp"))
+
+    def _riprendi_da_disco(self):
+        """Dopo un riavvio si riusa l'ultima copia completa: se è scaduta la si serve mentre si prepara la nuova"""
+        copie = self._copie()
+        if not copie:
+            return
+        versione = int(copie[-1].split("_")[1])
+        self.percorso = os.path.join(self.cartella, copie[-1])
+        self.versione, self.creato = versione, versione / 1000
+
+    def assicura(self, avanzamento=None):
+        """Scarica la copia al primo accesso; dopo INTERVALLO_SINCRONIZZAZIONE la rinnova in background"""
+        if self.percorso is not None:
+            if time.time() - self.creato >= INTERVALLO_SINCRONIZZAZIONE and time.time() - self.ultimo_errore >= ATTESA_DOPO_ERRORE:
+                self.rinnova()
+            return self
+        with self.lock_aggiornamento:
+            if self.percorso is None:
+                self._sincronizza(avanzamento)
+        return self
+
+    def rinnova(self):
+        """Nuova copia in background: fino allo scambio le query continuano a leggere quella attuale"""
+        if not self.lock_aggiornamento.acquire(blocking=False):
+            return False
+
+        def esegui():
+            try:
+                self._sincronizza()
+            except Exception:
+                # Si resta sulla copia attuale e si riprova dopo ATTESA_DOPO_ERRORE
+                self.ultimo_errore = time.time()
+            finally:
+                self.lock_aggiornamento.release()
+
+        threading.Thread(target=esegui, name="rinnovo-copia-fatturati", daemon=True).start()
+        return True
+
+    def rinnovo_in_corso(self):
+        return self.lock_aggiornamento.locked()
+
+    def _colonne_remote(self, supabase):
+        # IdTestata (e IdAnagrafica) potrebbero non esserci: si ripiega sulle colonne della dashboard
+        for colonne in (COLONNE_STORE, vendite.COLONNE_FATTURATI + ",IdAnagrafica", vendite.COLONNE_FATTURATI):
+            try:
+                supabase.table("fatturati").select(colonne).limit(1).execute()
+                return colonne
+            except Exception:
+                continue
+        return vendite.COLONNE_FATTURATI
+
+    def _sincronizza(self, avanzamento=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        supabase = get_supabase_client()
+        colonne = self._colonne_remote(supabase)
+        versione = int(time.time() * 1000)
+        destinazione = os.path.join(self.cartella, f"fatturati_{versione}")
+        temporanea = destinazione + ".tmp"
+        shutil.rmtree(temporanea, ignore_errors=True)
+        os.makedirs(temporanea)
+
+        blocco, n_file, totale = [], 0, 0
+        def scrivi_blocco():
+            tabella = pa.Table.from_pandas(_normalizza(pd.DataFrame(blocco)), preserve_index=False)
+            pq.write_to_dataset(tabella, temporanea, partition_cols=["AnnoRif"],
+                                basename_template=f"parte-{n_file}-{{i}}.parquet")
+
+        for pagina in leggi_a_pagine(lambda: supabase.table("fatturati").select(colonne)):
+            blocco.extend(pagina)
+            totale += len(pagina)
+            if avanzamento:
+                avanzamento(totale)
+            if len(blocco) >= RIGHE_PER_FILE:
+                scrivi_blocco()
+                n_file, blocco = n_file + 1, []
+        if blocco:
+            scrivi_blocco()
+        if totale == 0:
+            # Tabella vuota: un file senza righe, così le query restituiscono risultati vuoti
+            os.makedirs(os.path.join(temporanea, "AnnoRif=0"))
+            pq.write_table(_schema_arrow().empty_table(), os.path.join(temporanea, "AnnoRif=0", "vuoto.parquet"))
+        os.rename(temporanea, destinazione)
+
+        precedente = self.percorso
+        self.percorso, self.versione, self.creato, self.righe = destinazione, versione, time.time(), totale
+        # La copia precedente resta per le query ancora in corso; le più vecchie si eliminano
+        for nome in self._copie():
+            percorso = os.path.join(self.cartella, nome)
+            if percorso not in (destinazione, precedente):
+                shutil.rmtree(percorso, ignore_errors=True)
+
+    def connessione(self):
+        import duckdb
+        with self.lock_connessione:
+            if self.con is None:
+                self.con = duckdb.connect(":memory:")
+                # DuckDB usa già tutti i core; [perf] duckdb_threads permette di limitarli
+                if _config().get("duckdb_threads"):
+                    self.con.execute(f"SET threads = {int(_config()['duckdb_threads'])}")
+            return self.con
+
+    def interroga(self, sql, parametri=()):
+        """Esegue sql sostituendo {fonte} con la lettura della copia Parquet corrente"""
+        percorso = self.assicura().percorso.replace("'", "''")
+        fonte = (f"read_parquet('{percorso}/*/*.parquet', hive_partitioning = true, "
+                 f"hive_types = {{'AnnoRif': BIGINT}})")
+        # Un cursore per query: la connessione è condivisa tra sessioni (thread diversi)
+        cursore = self.connessione().cursor()
+        try:
+            return cursore.execute(sql.replace("{fonte}", fonte), list(parametri)).df()
+        finally:
+            cursore.close()
+
+
+@st.cache_resource(show_spinner=False)
+def _store():
+    """Copia locale unica per processo, condivisa tra sessioni e pagine"""
+    return _Store()
+
+def versione_dati(avanzamento=None):
+    """Versione dei dati per le chiavi di cache dei grafici.
+
+    DuckDB: assicura la copia locale (avanzamento(righe_scaricate) durante il primo download) e ne
+    restituisce la versione, che cambia quando un rinnovo in background sostituisce la copia. RPC: i dati sono sempre quelli del database, la versione cambia ogni INTERVALLO_SINCRONIZZAZIONE.
+    """
+    if motore() == "rpc":
+        return int(time.time() // INTERVALLO_SINCRONIZZAZIONE)
+    return _store().assicura(avanzamento).versione
+
+def aggiornamento():
+    """(creato, rinnovo_in_corso) della copia locale; creato è None con il motore RPC (dati sempre attuali)"""
+    if motore() != "duckdb":
+        return None, False
+    store = _store()
+    return (store.creato if store.percorso else None), store.rinnovo_in_corso()
+
+def rinnova():
+    """Avvia il rinnovo della copia locale in background (solo motore DuckDB)"""
+    return motore() == "duckdb" and _store().rinnova()
+
+def statistiche():
+    """Righe scaricate e versione della copia locale (pannello performance)"""
+    store = _store()
+    return {"righe": store.righe, "versione": store.versione}
+
+# --- 3. QUERY ---
+def _q(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def _where(filtro):
+    condizioni, parametri = [], []
+    if filtro.anni:
+        condizioni.append(f"AnnoRif IN ({', '.join('?' * len(filtro.anni))})")
+        parametri += [int(a) for a in filtro.anni]
+    if filtro.mesi:
+        # Nella copia locale i mesi sono testi a due cifre come nella dashboard ("01"); Analisi Clienti usa interi
+        condizioni.append(f"MeseRif IN ({', '.join('?' * len(filtro.mesi))})")
+        parametri += [str(m).zfill(2) for m in filtro.mesi]
+    for colonna, valore in (("IdAgenteDoc", filtro.agente), ("IdAnagrafica", filtro.cliente), ("Famiglia", filtro.marchio)):
+        if valore is not None:
+            condizioni.append(f"{colonna} = ?")
+            parametri.append(str(valore).strip())
+    return (" WHERE " + " AND ".join(condizioni)) if condizioni else "", parametri
+
+def _rpc(filtro, gruppi=(), limite=None, con_ordini=False):
+    """Chiamata a vendite_aggregati: gruppi + ImportoNettoRiga, righe, ordini (solo con con_ordini)"""
+    parametri = {
+        "gruppi": list(gruppi),
+        "anni": [int(a) for a in filtro.anni] or None,
+        "mesi": [str(m).zfill(2) for m in filtro.mesi] or None,
+        "id_agente": None if filtro.agente is None else str(filtro.agente).strip(),
+        "id_cliente": None if filtro.cliente is None else str(filtro.cliente).strip(),
+        "marchio": filtro.marchio,
+        "limite": limite,
+        "con_ordini": con_ordini,
+    }
+    righe = get_supabase_client().rpc("vendite_aggregati", parametri).execute().data or []
+    df = pd.DataFrame(righe, columns=list(gruppi) + ["ImportoNettoRiga", "righe", "ordini"])
+    df["ImportoNettoRiga"] = pd.to_numeric(df["ImportoNettoRiga"], errors="coerce").fillna(0.0)
+    return df
+
+def aggregato(filtro, gruppi, limite=None):
+    """Somma di ImportoNettoRiga per le colonne gruppi (le più grandi per prime se c'è un limite)"""
+    if motore() == "rpc":
+        return _rpc(filtro, gruppi, limite).drop(columns=["righe", "ordini"])
+    colonne = ", ".join(_q(c) for c in gruppi)
+    where, parametri = _where(filtro)
+    sql = f"SELECT {colonne}, SUM(ImportoNettoRiga) AS ImportoNettoRiga FROM {{fonte}}{where} GROUP BY {colonne}"
+    if limite:
+        sql += f" ORDER BY ImportoNettoRiga DESC LIMIT {int(limite)}"
+    return _store().interroga(sql, parametri)
+
+def conta_righe(filtro):
+    if motore() == "rpc":
+        return int(_rpc(filtro)["righe"].fillna(0).sum())
+    where, parametri = _where(filtro)
+    return int(_store().interroga(f"SELECT COUNT(*) AS n FROM {{fonte}}{where}", parametri)["n"].iloc[0])
+
+# --- 4. AGGREGAZIONI DASHBOARD ---
+# L'aggregazione grossa la fa DuckDB; la funzione di vendite.py completa il risultato sulle poche righe
+# già raggruppate, così forma e ordinamento sono identici a quelli del motore pandas.
+def opzioni_filtri(filtro):
+    return vendite.opzioni_filtri(aggregato(filtro, ["AnnoRif", "MeseRif", "IdAgenteDoc", "AgenteDoc"]))
+
+def totali_per_anno(filtro, anni_sel):
+    return vendite.totali_per_anno(aggregato(filtro, ["AnnoRif"]), anni_sel)
+
+def andamento_mensile(filtro):
+    return vendite.andamento_mensile(aggregato(filtro, ["AnnoRif", "MeseRif"]))
+
+def performance_agenti(filtro):
+    return vendite.performance_agenti(aggregato(filtro, ["AgenteDoc", "AnnoRif"]))
+
+def totali_per_colonna(filtro, colonna):
+    if colonna not in COLONNE_TESTO:
+        raise ValueError(f"Colonna non disponibile nella copia locale: {colonna}")
+    return vendite.totali_per_colonna(aggregato(filtro, [colonna, "AnnoRif"]), colonna)
+
+def marchi(filtro):
+    return vendite.marchi(aggregato(filtro, ["Famiglia"]))
+
+def focus_marchio(filtro, marchio):
+    return vendite.focus_marchio(aggregato(filtro._replace(marchio=marchio), ["Famiglia", "Merceologica"]), marchio)
+
+def top_clienti(filtro, n=30):
+    return vendite.top_clienti(aggregato(filtro, ["Cliente"], limite=n), n)
+
+# --- 5. AGGREGAZIONI ANALISI CLIENTI ---
+def _come_cliente(df):
+    # Tipi di normalizza_fatturati_cliente: anno come testo, mese come intero
+    df["AnnoRif"] = df["AnnoRif"].astype(str)
+    if "MeseRif" in df.columns:
+        df["MeseRif"] = df["MeseRif"].astype(int)
+    return df
+
+def anni_disponibili(filtro):
+    if motore() == "rpc":
+        return sorted((int(a) for a in _rpc(filtro, ["AnnoRif"])["AnnoRif"]), reverse=True)
+    where, parametri = _where(filtro)
+    anni = _store().interroga(f"SELECT DISTINCT AnnoRif FROM {{fonte}}{where}", parametri)["AnnoRif"]
+    return sorted((int(a) for a in anni), reverse=True)
+
+def ordini_per_anno(filtro, anno):
+    """(fatturato, ordini univoci per IdTestata; righe se IdTestata non c'è) di un anno"""
+    if motore() == "rpc":
+        res = _rpc(filtro._replace(anni=(int(anno),)), con_ordini=True)
+        return float(res["ImportoNettoRiga"].sum()), int(pd.to_numeric(res["ordini"]).fillna(0).sum())
+    where, parametri = _where(filtro._replace(anni=(int(anno),)))
+    res = _store().interroga(
+        "SELECT COALESCE(SUM(ImportoNettoRiga), 0) AS totale, "
+        "CASE WHEN COUNT(IdTestata) > 0 THEN COUNT(DISTINCT IdTestata) ELSE COUNT(*) END AS ordini "
+        f"FROM {{fonte}}{where}", parametri)
+    return float(res["totale"].iloc[0]), int(res["ordini"].iloc[0])
+
+def mensile_cliente(filtro):
+    return vendite.mensile_cliente(_come_cliente(aggregato(filtro, ["AnnoRif", "MeseRif"])))
+
+def top_famiglie_cliente(filtro, n=15):
+    return vendite.top_famiglie_cliente(_come_cliente(aggregato(filtro, ["Famiglia", "AnnoRif"])), n)
+
+def merceologica_cliente(filtro):
+    return vendite.merceologica_cliente(_come_cliente(aggregato(filtro, ["Merceologica", "AnnoRif"])))
+
+def mix_merceologico(filtro):
+    return vendite.mix_merceologico(aggregato(filtro, ["Merceologica"]))
@@ -0,0 +1,184 @@
+"""Cache di processo con stale-while-revalidate, condivisa da tutte le sessioni.
+
+Una voce scaduta continua a essere servita mentre un thread in background ne prepara la versione
+successiva; quando è pronta la sostituisce con un'unica assegnazione, quindi una sessione vede la versione
+vecchia o quella nuova e mai uno stato intermedio. Attende il caricamento solo la prima lettura di una chiave,
+e le letture contemporanee della stessa chiave ne condividono uno solo (VoloUnico).
+"""
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+
+# Secondi prima di ritentare un rinnovo fallito (nel frattempo si servono i dati precedenti)
+ATTESA_DOPO_ERRORE = 60
+# Secondi tra due aggiornamenti dell'avanzamento per chi attende il caricamento di un'altra sessione
+INTERVALLO_AVANZAMENTO = 0.5
+
+
+class _Volo:
+    def __init__(self):
+        self.fatto = threading.Event()
+        self.risultato = None
+        self.errore = None
+        self.interrotto = False
+        self.progresso = None
+
+
+class VoloUnico:
+    """Single-flight: chiamate contemporanee con la stessa chiave attendono un'unica esecuzione e ne
+    condividono il risultato (o l'eccezione), invece di ripetere ognuna lo stesso caricamento."""
+    def __init__(self):
+        self.in_volo = {}
+        self.lock = threading.Lock()
+
+    def esegui(self, chiave, funzione, avanzamento=None):
+        """funzione(avanzamento) eseguita una sola volta per tutte le chiamate arrivate mentre è in corso.
+
+        L'avanzamento riportato da chi esegue arriva anche a chi attende (ogni INTERVALLO_AVANZAMENTO).
+        Se l'esecuzione viene interrotta senza risultato né errore (rerun o stop della sessione che la
+        stava eseguendo) chi attende riprova, e uno di loro diventa il nuovo esecutore.
+        """
+        while True:
+            with self.lock:
+                volo = self.in_volo.get(chiave)
+                proprietario = volo is None
+                if proprietario:
+                    volo = self.in_volo[chiave] = _Volo()
+            if proprietario:
+                break
+            while not volo.fatto.wait(INTERVALLO_AVANZAMENTO if avanzamento else None):
+                if volo.progresso is not None:
+                    avanzamento(volo.progresso)
+            if volo.errore is not None:
+                raise volo.errore
+            if not volo.interrotto:
+                return volo.risultato
+
+        def avanza(valore):
+            volo.progresso = valore
+            if avanzamento:
+                avanzamento(valore)
+
+        try:
+            volo.risultato = funzione(avanza)
+            return volo.risultato
+        except Exception as e:
+            volo.errore = e
+            raise
+        except BaseException:
+            # RerunException/StopException di Streamlit: riguardano solo la sessione che eseguiva
+            volo.interrotto = True
+            raise
+        finally:
+            with self.lock:
+                self.in_volo.pop(chiave, None)
+            volo.fatto.set()
+
+
+class CacheCondivisa:
+    def __init__(self, nome, carica, ttl, max_voci=None):
+        """carica(chiave, avanzamento) -> (valore, creato); nei rinnovi in background avanzamento è None.
+
+        creato è l'istante a cui risalgono i dati (per una copia letta da disco, quello del file).
+        Oltre max_voci si eliminano le chiavi lette meno di recente.
+        """
+        self.nome = nome
+        self.carica = carica
+        self.ttl = ttl
+        self.max_voci = max_voci
+        self.voci = OrderedDict()  # chiave -> (valore, creato)
+        self.in_rinnovo = set()
+        self.errori = {}  # chiave -> (messaggio, istante)
+        self.voli = VoloUnico()
+        self.lock = threading.Lock()
+
+    def voce(self, chiave):
+        """(valore, creato) se la chiave è in memoria, anche scaduta; None altrimenti. Non avvia rinnovi."""
+        with self.lock:
+            voce = self.voci.get(chiave)
+            if voce is not None:
+                self.voci.move_to_end(chiave)
+        return voce
+
+    def scrivi(self, chiave, valore, creato=None):
+        with self.lock:
+            self.voci[chiave] = (valore, time.time() if creato is None else creato)
+            self.voci.move_to_end(chiave)
+            while self.max_voci and len(self.voci) > self.max_voci:
+                self.voci.popitem(last=False)
+
+    def elimina(self, chiave):
+        with self.lock:
+            self.voci.pop(chiave, None)
+
+    def leggi_voce(self, chiave, avanzamento=None):
+        """(valore, creato): dalla memoria anche se scaduta (avviando il rinnovo), altrimenti caricata ora.
+
+        Le sessioni che chiedono insieme una chiave assente attendono un unico caricamento.
+        """
+        voce = self.voce(chiave)
+        if voce is None:
+            return self.voli.esegui(chiave, lambda avanza: self._carica_assente(chiave, avanza), avanzamento)
+        if time.time() - voce[1] >= self.ttl:
+            errore = self.errori.get(chiave)
+            if errore is None or time.time() - errore[1] >= ATTESA_DOPO_ERRORE:
+                self.rinnova(chiave)
+        return voce
+
+    def _carica_assente(self, chiave, avanzamento):
+        # Chi arriva subito dopo la fine del caricamento trova già la voce
+        voce = self.voce(chiave)
+        if voce is None:
+            voce = self.carica(chiave, avanzamento)
+            self.scrivi(chiave, *voce)
+        return voce
+
+    def leggi(self, chiave, avanzamento=None):
+        return self.leggi_voce(chiave, avanzamento)[0]
+
+    def rinnova(self, chiave):
+        """Avvia il rinnovo della chiave in background; False se ce n'è già uno in corso"""
+        with self.lock:
+            if chiave in self.in_rinnovo:
+                return False
+            self.in_rinnovo.add(chiave)
+        threading.Thread(target=self._rinnova, args=(chiave,), name=f"rinnovo-{self.nome}", daemon=True).start()
+        return True
+
+    def _rinnova(self, chiave):
+        try:
+            self.scrivi(chiave, *self.carica(chiave, None))
+            self.errori.pop(chiave, None)
+        except Exception as e:
+            self.errori[chiave] = (str(e)[:200], time.time())
+        finally:
+            with self.lock:
+                self.in_rinnovo.discard(chiave)
+
+    def rinnovo_in_corso(self, chiave):
+        return chiave in self.in_rinnovo
+
+# --- UI ---
+def descrivi_eta(creato):
+    """"3 min fa", "1,5 ore fa"... a partire dall'istante dei dati"""
+    secondi = max(time.time() - creato, 0)
+    if secondi < 60:
+        return "meno di un minuto fa"
+    if secondi < 3600:
+        return f"{int(secondi // 60)} min fa"
+    return f"{secondi / 3600:,.1f} ore fa".replace(".", ",")
+
+def mostra_stato(creato, in_rinnovo=False, rinnova=None, key=None):
+    """Età dei dati mostrati; con rinnova (solo admin) anche il pulsante di aggiornamento manuale"""
+    testo = f"🕒 Dati aggiornati {descrivi_eta(creato)}" if creato else "🕒 Dati in tempo reale"
+    if in_rinnovo:
+        testo += " · aggiornamento in corso in background"
+    if rinnova is None:
+        st.caption(testo)
+        return
+    col_testo, col_pulsante = st.columns([4, 1])
+    col_testo.caption(testo)
+    if col_pulsante.button("🔄 Aggiorna dati", key=key, disabled=in_rinnovo, use_container_width=True):
+        rinnova()
+        st.toast("Aggiornamento avviato: i dati attuali restano visibili finché quelli nuovi non sono pronti.")
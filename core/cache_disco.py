@@ -0,0 +1,84 @@
+"""Cache su disco dei DataFrame in file Arrow IPC, letti con memory map.
+
+Ogni file porta nei metadati dello schema un'intestazione (formato, nome, chiave, versione dei dati,
+data di creazione): file scritti da un'altra versione del codice o scaduti vengono ignorati e riscritti.
+Senza compressione (default) la lettura è zero-copy: le colonne restano mappate sul file invece di essere
+deserializzate e copiate come con pickle. compressione_cache = "lz4" o "zstd" in [perf] riduce lo spazio
+su disco al prezzo della decompressione in lettura.
+"""
+import json
+import os
+import re
+import threading
+import time
+import streamlit as st
+
+# Da incrementare se cambia il modo in cui i DataFrame vengono scritti
+VERSIONE_FORMATO = 1
+CHIAVE_METADATI = b"vivetti_cache"
+CARTELLA_DEFAULT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dati_locali")
+
+
+def _config():
+    try:
+        return st.secrets.get("perf", {})
+    except Exception:
+        return {}
+
+def cartella_dati(*parti):
+    """Cartella dei dati locali ([perf] cartella_dati), condivisa con la copia Parquet di core/analitica.py"""
+    return os.path.join(str(_config().get("cartella_dati", CARTELLA_DEFAULT)), *parti)
+
+def _percorso(nome, chiave):
+    return cartella_dati("cache", f"{nome}__{re.sub(r'[^A-Za-z0-9_.-]', '_', str(chiave))}.arrow")
+
+def scrivi(nome, chiave, df, versione_dati=None):
+    """Salva df con l'intestazione; False se il DataFrame non è convertibile in Arrow (colonne con tipi misti)"""
+    import pyarrow as pa
+
+    try:
+        tabella = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return False
+    intestazione = {"formato": VERSIONE_FORMATO, "nome": nome, "chiave": str(chiave),
+                    "versione_dati": versione_dati, "creato": time.time(), "righe": len(df)}
+    tabella = tabella.replace_schema_metadata({**(tabella.schema.metadata or {}),
+                                               CHIAVE_METADATI: json.dumps(intestazione).encode()})
+    percorso = _percorso(nome, chiave)
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    # Nome unico per processo e thread: due scritture contemporanee non si rubano il file temporaneo
+    temporaneo = f"{percorso}.{os.getpid()}.{threading.get_ident()}.tmp"
+    opzioni = pa.ipc.IpcWriteOptions(compression=_config().get("compressione_cache") or None)
+    with pa.OSFile(temporaneo, "wb") as uscita, pa.ipc.new_file(uscita, tabella.schema, options=opzioni) as scrittore:
+        scrittore.write_table(tabella)
+    # Sostituzione atomica: chi sta leggendo il file precedente continua a vedere la sua mappa
+    os.replace(temporaneo, percorso)
+    return True
+
+def leggi(nome, chiave, ttl=None, versione_dati=None):
+    """(DataFrame, creato) se c'è un file valido: stesso formato e versione dei dati, più giovane di ttl secondi.
+
+    None se il file manca, è scaduto, è di un'altra versione o non è leggibile.
+    """
+    import pyarrow as pa
+
+    percorso = _percorso(nome, chiave)
+    if not os.path.exists(percorso):
+        return None
+    try:
+        with pa.memory_map(percorso) as sorgente:
+            lettore = pa.ipc.open_file(sorgente)
+            intestazione = json.loads((lettore.schema.metadata or {}).get(CHIAVE_METADATI, b"{}"))
+            if (intestazione.get("formato") != VERSIONE_FORMATO or intestazione.get("versione_dati") != versione_dati
+                    or (ttl is not None and time.time() - intestazione.get("creato", 0) >= ttl)):
+                return None
+            df = lettore.read_all().to_pandas()
+    except (OSError, pa.ArrowInvalid, ValueError):
+        return None
+    return df, intestazione["creato"]
+
+def elimina(nome, chiave):
+    try:
+        os.remove(_percorso(nome, chiave))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,271 @@
+"""Dataset `fatturati` della dashboard, condiviso da tutte le sessioni del processo.
+
+Livelli: memoria (lo stesso DataFrame per tutte le sessioni, senza copie), disco (Arrow IPC, core/cache_disco.py),
+Supabase. La fetta di un agente si ricava dal dataset completo quando questo è già in memoria: dopo il
+riscaldamento all'avvio (core/riscaldamento.py) gli agenti non scaricano più la propria parte.
+Scaduto il TTL si continua a servire il dataset precedente mentre quello nuovo viene scaricato in
+background (core/cache_condivisa.py); solo il primo caricamento di una chiave è bloccante.
+Con caricamento_progressivo (default attivo in [perf]) il primo download gira in background un anno alla
+volta, dal più recente, e la dashboard lavora sui dati parziali man mano che arrivano (parziale()).
+I DataFrame restituiti non vanno modificati (normalizza_fatturati lavora su una copia).
+"""
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from core import vendite, cache_disco
+from core.cache_condivisa import CacheCondivisa, ATTESA_DOPO_ERRORE
+from core.db import get_supabase_client, leggi_a_pagine
+
+# Secondi di validità del dataset (in memoria e su disco)
+TTL = 3600
+CHIAVE_COMPLETO = "ADMIN_FULL"
+
+
+def _config():
+    try:
+        return st.secrets.get("perf", {})
+    except Exception:
+        return {}
+
+def progressivo():
+    """True se il primo download del dataset va fatto a blocchi con dati parziali consultabili"""
+    return bool(_config().get("caricamento_progressivo", True))
+
+def _chiave(agente_id):
+    return str(agente_id) if agente_id else CHIAVE_COMPLETO
+
+def _carica(chiave, avanzamento=None):
+    """Disco se il file è ancora valido, altrimenti Supabase (riscrivendo il file)"""
+    # La versione dei dati è l'elenco delle colonne: se cambia la query il file su disco non è più valido
+    da_disco = cache_disco.leggi("fatturati", chiave, ttl=TTL, versione_dati=vendite.COLONNE_FATTURATI)
+    if da_disco is not None:
+        return da_disco
+    creato = time.time()
+    df = scarica_fatturati(None if chiave == CHIAVE_COMPLETO else chiave, avanzamento)
+    cache_disco.scrivi("fatturati", chiave, df, versione_dati=vendite.COLONNE_FATTURATI)
+    return df, creato
+
+@st.cache_resource(show_spinner=False)
+def _cache():
+    return CacheCondivisa("fatturati", _carica, TTL)
+
+@st.cache_resource(show_spinner=False)
+def _fette():
+    # agente -> (creato del dataset completo, fetta): la fetta si ricalcola quando il completo viene rinnovato
+    return {}
+
+# --- DOWNLOAD ---
+def scarica_fatturati(agente_id=None, avanzamento=None):
+    """Scarica da Supabase le colonne della dashboard (solo le righe dell'agente, se indicato).
+
+    avanzamento(righe_scaricate) viene chiamata dopo ogni pagina.
+    """
+    supabase = get_supabase_client()
+
+    def crea_query():
+        # Query con selezione esplicita delle colonne necessarie, filtro agente lato database
+        query = supabase.table("fatturati").select(vendite.COLONNE_FATTURATI)
+        return query.eq("IdAgenteDoc", agente_id) if agente_id else query
+
+    righe = []
+    for pagina in leggi_a_pagine(crea_query):
+        righe.extend(pagina)
+        if avanzamento:
+            avanzamento(len(righe))
+    return pd.DataFrame(righe)
+
+def scarica_a_blocchi(agente_id=None):
+    """Generatore delle pagine di fatturati (come scarica_fatturati) un anno alla volta, dal più recente"""
+    supabase = get_supabase_client()
+
+    def base():
+        query = supabase.table("fatturati").select(vendite.COLONNE_FATTURATI)
+        return query.eq("IdAgenteDoc", agente_id) if agente_id else query
+
+    ultimo = base().order("AnnoRif", desc=True, nullsfirst=False).limit(1).execute().data
+    primo = base().order("AnnoRif", nullsfirst=False).limit(1).execute().data
+    if ultimo and ultimo[0].get("AnnoRif") is not None:
+        for anno in range(int(ultimo[0]["AnnoRif"]), int(primo[0]["AnnoRif"]) - 1, -1):
+            yield from leggi_a_pagine(lambda: base().eq("AnnoRif", anno))
+    # Righe senza anno: come nel download completo, la pulizia della dashboard decide cosa farne
+    yield from leggi_a_pagine(lambda: base().is_("AnnoRif", "null"))
+
+def _fetta_agente(df_completo, agente_id):
+    if df_completo.empty or "IdAgenteDoc" not in df_completo.columns:
+        return df_completo
+    fetta = df_completo[df_completo["IdAgenteDoc"].astype(str).str.strip() == str(agente_id).strip()]
+    return fetta.reset_index(drop=True)
+
+def _da_completo(agente_id):
+    """True se la fetta dell'agente va ricavata dal dataset completo (già in memoria)"""
+    return bool(agente_id) and _cache().voce(CHIAVE_COMPLETO) is not None
+
+# --- API ---
+def in_memoria(agente_id=None):
+    """True se fatturati(agente_id) risponde senza disco né rete (anche con dati in rinnovo)"""
+    return _cache().voce(_chiave(agente_id)) is not None or _da_completo(agente_id)
+
+def fatturati(agente_id=None, avanzamento=None):
+    """DataFrame grezzo di fatturati per l'agente (None = tutti), dal livello più vicino disponibile"""
+    return fatturati_voce(agente_id, avanzamento)[0]
+
+def fatturati_voce(agente_id=None, avanzamento=None):
+    """(DataFrame, creato) come fatturati(); creato è l'istante del caricamento da cui provengono i dati"""
+    cache = _cache()
+    if not _da_completo(agente_id):
+        return cache.leggi_voce(_chiave(agente_id), avanzamento)
+
+    completo, creato = cache.leggi_voce(CHIAVE_COMPLETO)
+    chiave = _chiave(agente_id)
+    # Un'eventuale copia scaricata solo per l'agente non serve più: si segue il dataset completo
+    cache.elimina(chiave)
+    fetta = _fette().get(chiave)
+    if fetta is None or fetta[0] != creato:
+        fetta = (creato, _fetta_agente(completo, agente_id))
+        _fette()[chiave] = fetta
+    return fetta[1], fetta[0]
+
+def aggiornamento(agente_id=None):
+    """(creato, rinnovo_in_corso) dei dati serviti all'agente; creato è None se non sono ancora in memoria"""
+    chiave = CHIAVE_COMPLETO if _da_completo(agente_id) else _chiave(agente_id)
+    voce = _cache().voce(chiave)
+    return (voce[1] if voce else None), _cache().rinnovo_in_corso(chiave)
+
+def rinnova(agente_id=None):
+    """Riscarica in background i dati dell'agente (o il dataset completo da cui sono ricavati)"""
+    chiave = CHIAVE_COMPLETO if _da_completo(agente_id) else _chiave(agente_id)
+    # Il file su disco è ancora valido: senza eliminarlo il rinnovo lo rileggerebbe
+    cache_disco.elimina("fatturati", chiave)
+    return _cache().rinnova(chiave)
+
+# --- CARICAMENTO PROGRESSIVO ---
+class _Progressivo:
+    """Download a blocchi in corso: le righe arrivate finora e il DataFrame parziale (già normalizzato
+    per la dashboard) costruito da queste"""
+    def __init__(self):
+        self.righe = []
+        self.anni = []
+        self.df = pd.DataFrame()
+        self.convertite = 0
+        self.errore = None
+        self.fine = None
+        self.lock = threading.Lock()
+
+    def aggiungi(self, pagina):
+        with self.lock:
+            self.righe.extend(pagina)
+            anno = pagina[0].get("AnnoRif")
+            if anno is not None and anno not in self.anni:
+                self.anni.append(anno)
+
+    def parziale(self):
+        # Si convertono e normalizzano solo le righe nuove rispetto all'ultima chiamata
+        with self.lock:
+            if len(self.righe) > self.convertite:
+                nuove = vendite.normalizza_fatturati(pd.DataFrame(self.righe[self.convertite:]))
+                self.df = nuove if self.df.empty else pd.concat([self.df, nuove], ignore_index=True)
+                self.convertite = len(self.righe)
+            return self.df, list(self.anni)
+
+
+class _Progressivi:
+    def __init__(self):
+        self.voci = {}  # chiave -> _Progressivo (in corso, o fallito da meno di ATTESA_DOPO_ERRORE)
+        self.lock = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def _progressivi():
+    return _Progressivi()
+
+def _da_disco(chiave):
+    """Porta in memoria il file su disco ancora valido; False se non c'è"""
+    da_disco = cache_disco.leggi("fatturati", chiave, ttl=TTL, versione_dati=vendite.COLONNE_FATTURATI)
+    if da_disco is not None:
+        _cache().scrivi(chiave, *da_disco)
+    return da_disco is not None
+
+def _registra(chiave):
+    """Nuovo _Progressivo per la chiave; None se ce n'è già uno in corso"""
+    registro = _progressivi()
+    with registro.lock:
+        corrente = registro.voci.get(chiave)
+        if corrente is not None and corrente.errore is None:
+            return None
+        stato = registro.voci[chiave] = _Progressivo()
+    return stato
+
+def _scarica(agente_id, stato, avanzamento=None):
+    chiave = _chiave(agente_id)
+    creato = time.time()
+    try:
+        for pagina in scarica_a_blocchi(agente_id):
+            stato.aggiungi(pagina)
+            if avanzamento:
+                avanzamento(len(stato.righe))
+        df = pd.DataFrame(stato.righe)
+        cache_disco.scrivi("fatturati", chiave, df, versione_dati=vendite.COLONNE_FATTURATI)
+        _cache().scrivi(chiave, df, creato)
+    except Exception as e:
+        # Il download fallito resta registrato: avvia_progressivo non lo ripete subito
+        stato.errore, stato.fine = str(e)[:200], time.time()
+        raise
+    registro = _progressivi()
+    with registro.lock:
+        registro.voci.pop(chiave, None)
+
+def carica_progressivo(agente_id=None, avanzamento=None):
+    """Scarica il dataset a blocchi (anni recenti prima) rendendo consultabili i dati parziali; al termine
+    lo salva su disco e in memoria come fatturati(). Bloccante: va eseguita in un thread in background.
+
+    False se il dataset era valido su disco o lo stesso download è già in corso in un altro thread.
+    """
+    if _da_disco(_chiave(agente_id)):
+        return False
+    stato = _registra(_chiave(agente_id))
+    if stato is None:
+        return False
+    _scarica(agente_id, stato, avanzamento)
+    return True
+
+def avvia_progressivo(agente_id=None):
+    """Avvia (se serve) il download progressivo in un thread.
+
+    True se ci sono dati parziali da mostrare (download in corso, anche quello del dataset completo da cui
+    si ricava la fetta dell'agente). False se il dataset è già disponibile (memoria o disco) o se l'ultimo
+    tentativo è fallito da poco: in questi casi fatturati() risponde, o mostra l'errore.
+    """
+    if in_memoria(agente_id):
+        return False
+    chiave = _chiave(agente_id)
+    registro = _progressivi()
+    for candidata in [chiave, CHIAVE_COMPLETO] if agente_id else [chiave]:
+        stato = registro.voci.get(candidata)
+        if stato is not None and stato.errore is None:
+            return True
+    fallito = registro.voci.get(chiave)
+    if fallito is not None and time.time() - fallito.fine < ATTESA_DOPO_ERRORE:
+        return False
+    if _da_disco(chiave):
+        return False
+    stato = _registra(chiave)
+    if stato is not None:
+        def esegui():
+            try:
+                _scarica(agente_id, stato)
+            except Exception:
+                pass  # errore registrato in stato
+        threading.Thread(target=esegui, name="fatturati-progressivo", daemon=True).start()
+    return True
+
+def parziale(agente_id=None):
+    """(DataFrame parziale già normalizzato, anni arrivati) del download in corso per l'agente; None se non ce n'è uno"""
+    registro = _progressivi()
+    chiave = _chiave(agente_id)
+    for candidata in [chiave, CHIAVE_COMPLETO] if agente_id else [chiave]:
+        stato = registro.voci.get(candidata)
+        if stato is not None and stato.errore is None:
+            df, anni = stato.parziale()
+            return (df if candidata == chiave else _fetta_agente(df, agente_id)), anni
+    return None
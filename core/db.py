@@ -0,0 +1,75 @@
+import threading
+import streamlit as st
+
+# --- CONNESSIONE CONDIVISA ---
+@st.cache_resource(show_spinner=False)
+def get_supabase_client():
+    """Client Supabase unico per tutto il processo (condiviso tra sessioni e pagine)"""
+    from core import tracer
+    from core.db_locale import ClientLocale, percorso_da_url
+
+    url = st.secrets["connections"]["supabase"]["url"]
+    percorso_locale = percorso_da_url(url)
+    if percorso_locale:
+        # url = "sqlite:///..." -> database locale (load test, sviluppo offline)
+        client = ClientLocale(percorso_locale)
+    else:
+        from supabase import create_client
+        key = st.secrets["connections"]["supabase"]["key"]
+        client = create_client(url, key)
+    # Con [perf] tracing = true (default false) ogni chiamata PostgREST/Storage viene registrata per il pannello admin
+    return tracer.ClientTracciato(client) if tracer.tracing_abilitato() else client
+
+# --- LETTURA PAGINATA ---
+def leggi_a_pagine(crea_query, chunk_size=1000):
+    """Generatore delle pagine (liste di righe) di una query letta a blocchi con range().
+
+    crea_query deve restituire ogni volta un nuovo builder: i builder di postgrest non sono riutilizzabili.
+    """
+    start = 0
+    while True:
+        data = crea_query().range(start, start + chunk_size - 1).execute().data or []
+        if data:
+            yield data
+        if len(data) < chunk_size: break
+        start += chunk_size
+
+def leggi_paginato(crea_query, chunk_size=1000):
+    """Scarica tutte le righe di una query a blocchi, senza il troncamento al limite di PostgREST"""
+    righe = []
+    for pagina in leggi_a_pagine(crea_query, chunk_size):
+        righe.extend(pagina)
+    return righe
+
+# --- QUERY INDIPENDENTI IN PARALLELO ---
+def in_parallelo(query):
+    """Esegue insieme le query indipendenti di una pagina: {nome: funzione senza argomenti} -> {nome: risultato}.
+
+    La pagina attende la query più lenta invece della somma di tutte. Ogni funzione gira in un thread con il
+    contesto della sessione (tracer, st.cache_data) ma non deve disegnare elementi. Se una fallisce,
+    l'eccezione viene rilanciata qui dopo aver atteso le altre.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    if len(query) <= 1:
+        return {nome: funzione() for nome, funzione in query.items()}
+    risultati, errori = {}, {}
+
+    def esegui(nome, funzione):
+        try:
+            risultati[nome] = funzione()
+        except Exception as e:
+            errori[nome] = e
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    threads = [threading.Thread(target=esegui, args=(nome, funzione), name=f"query-{nome}", daemon=True)
+               for nome, funzione in query.items()]
+    for thread in threads:
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errori:
+        raise next(iter(errori.values()))
+    return {nome: risultati[nome] for nome in query}
@@ -0,0 +1,489 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Sostituto locale di Supabase (PostgREST + Storage) su SQLite, per load test e sviluppo offline.
+# Si attiva con url = "sqlite:///percorso/db.sqlite" in [connections.supabase] (vedi core/db.py).
+# Copre il sottoinsieme di API usato dalle pagine: select/insert/update/delete, filtri eq/neq/gt/gte/
+# lt/lte/like/ilike/in_/is_/not_/or_, order/limit/range/single, count="exact" e upload/URL pubblico.
+# Le tabelle non hanno uno schema fisso: vengono create (e allargate) al primo insert, e ogni tabella
+# ha "id" autoincrementale e "created_at" come su Supabase.
+# Le funzioni RPC in sql/ hanno qui un'implementazione equivalente in SQLite (_FUNZIONI_RPC).
+
+_OPERATORI = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+# Tipi da ricostruire in lettura (SQLite non ha booleani né JSON)
+_TIPO_BOOL, _TIPO_JSON = "bool", "json"
+
+def _q(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def _adesso():
+    return datetime.now(timezone.utc).isoformat()
+
+def _errore(messaggio, codice="PGRST000"):
+    from postgrest import APIError
+    return APIError({"message": messaggio, "code": codice, "hint": None, "details": None})
+
+def _risposta(data, count=None):
+    from postgrest import APIResponse
+    if isinstance(data, dict):
+        # Risposta di single(): data è la riga, non una lista
+        from postgrest.base_request_builder import SingleAPIResponse
+        return SingleAPIResponse(data=data, count=count)
+    return APIResponse(data=data, count=count)
+
+# --- 1. DATABASE ---
+class _DatabaseLocale:
+    """Connessione SQLite per thread, con scritture e modifiche di schema serializzate"""
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self._locale = threading.local()
+        self.lock_scrittura = threading.RLock()
+        self._schema = {}  # tabella -> {colonna: tipo speciale o None}
+        with self.lock_scrittura:
+            con = self.connessione()
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS _colonne (tabella TEXT, colonna TEXT, tipo TEXT, PRIMARY KEY (tabella, colonna))")
+            con.commit()
+
+    def connessione(self):
+        con = getattr(self._locale, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.percorso, timeout=30, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA busy_timeout=30000")
+            self._locale.con = con
+        return con
+
+    def schema(self, tabella):
+        """Colonne della tabella ({} se non esiste)"""
+        if tabella not in self._schema:
+            con = self.connessione()
+            colonne = {r["name"]: None for r in con.execute(f"PRAGMA table_info({_q(tabella)})")}
+            for r in con.execute("SELECT colonna, tipo FROM _colonne WHERE tabella = ?", (tabella,)):
+                if r["colonna"] in colonne:
+                    colonne[r["colonna"]] = r["tipo"]
+            if not colonne:
+                return {}
+            self._schema[tabella] = colonne
+        return self._schema[tabella]
+
+    def assicura_colonne(self, tabella, righe):
+        """Crea la tabella o aggiunge le colonne mancanti, con affinità dedotta dal primo valore non nullo"""
+        with self.lock_scrittura:
+            self._schema.pop(tabella, None)
+            esistenti = self.schema(tabella)
+            con = self.connessione()
+            if not esistenti:
+                con.execute(f"CREATE TABLE IF NOT EXISTS {_q(tabella)} (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT)")
+                esistenti = {"id": None, "created_at": None}
+            nuove = {}
+            for riga in righe:
+                for col, val in riga.items():
+                    if col in esistenti or (col in nuove and nuove[col] is not None):
+                        continue
+                    nuove[col] = None if val is None else type(val)
+            for col, tipo in nuove.items():
+                affinita = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT", dict: "TEXT", list: "TEXT"}.get(tipo, "")
+                con.execute(f"ALTER TABLE {_q(tabella)} ADD COLUMN {_q(col)} {affinita}")
+                speciale = _TIPO_BOOL if tipo is bool else _TIPO_JSON if tipo in (dict, list) else None
+                if speciale:
+                    con.execute("INSERT OR REPLACE INTO _colonne VALUES (?, ?, ?)", (tabella, col, speciale))
+            con.commit()
+            self._schema.pop(tabella, None)
+            return self.schema(tabella)
+
+def _a_sql(valore):
+    if isinstance(valore, bool):
+        return int(valore)
+    if isinstance(valore, (dict, list)):
+        return json.dumps(valore)
+    return valore
+
+def _da_sql(riga, schema):
+    out = {}
+    for col in riga.keys():
+        val = riga[col]
+        tipo = schema.get(col)
+        if val is not None and tipo == _TIPO_BOOL:
+            val = bool(val)
+        elif val is not None and tipo == _TIPO_JSON:
+            val = json.loads(val)
+        out[col] = val
+    return out
+
+# --- 2. QUERY BUILDER ---
+class _QueryLocale:
+    """Builder con la stessa interfaccia fluente di postgrest (ogni metodo modifica e restituisce self)"""
+
+    def __init__(self, db, tabella):
+        self._db = db
+        self._tabella = tabella
+        self._operazione = "select"
+        self._colonne = ["*"]
+        self._count = None
+        self._valori = None
+        self._filtri = []
+        self._ordini = []
+        self._limite = None
+        self._offset = 0
+        self._singolo = None
+        self._nega = False
+        # Colonne citate da filtri e ordinamenti: SQLite tratterebbe un identificatore sconosciuto
+        # tra virgolette come stringa, quindi vanno verificate prima di eseguire
+        self._colonne_usate = set()
+
+    # Operazioni
+    def select(self, *colonne, count=None, head=None):
+        testo = ",".join(colonne) if colonne else "*"
+        self._colonne = [c.strip() for c in testo.split(",") if c.strip()] or ["*"]
+        self._count = count
+        return self
+
+    def insert(self, json, *, count=None, returning=None, upsert=False, default_to_null=True):
+        self._operazione, self._valori, self._count = "insert", json, count
+        return self
+
+    def update(self, json, *, count=None, returning=None):
+        self._operazione, self._valori, self._count = "update", json, count
+        return self
+
+    def delete(self, *, count=None, returning=None):
+        self._operazione, self._count = "delete", count
+        return self
+
+    # Filtri
+    @property
+    def not_(self):
+        self._nega = True
+        return self
+
+    def _filtro(self, sql, parametri=()):
+        if self._nega:
+            sql, self._nega = f"NOT ({sql})", False
+        self._filtri.append((sql, list(parametri)))
+        return self
+
+    def _condizione(self, colonna, operatore, valore):
+        self._colonne_usate.add(colonna)
+        col = _q(colonna)
+        if operatore in _OPERATORI:
+            return f"{col} {_OPERATORI[operatore]} ?", [_a_sql(valore)]
+        if operatore == "like":
+            return f"{col} GLOB ?", [str(valore).replace("*", "%").replace("%", "*").replace("_", "?")]
+        if operatore == "ilike":
+            return f"LOWER(CAST({col} AS TEXT)) LIKE LOWER(?)", [str(valore).replace("*", "%")]
+        if operatore == "is":
+            testo = str(valore).lower()
+            if testo == "null" or valore is None:
+                return f"{col} IS NULL", []
+            return f"{col} IS ?", [1 if testo == "true" else 0]
+        if operatore == "in":
+            valori = list(valore)
+            if not valori:
+                return "0", []
+            return f"{col} IN ({','.join('?' * len(valori))})", [_a_sql(v) for v in valori]
+        raise _errore(f"Operatore non supportato dal database locale: {operatore}")
+
+    def eq(self, colonna, valore): return self._filtro(*self._condizione(colonna, "eq", valore))
+    def neq(self, colonna, valore): return self._filtro(*self._condizione(colonna, "neq", valore))
+    def gt(self, colonna, valore): return self._filtro(*self._condizione(colonna, "gt", valore))
+    def gte(self, colonna, valore): return self._filtro(*self._condizione(colonna, "gte", valore))
+    def lt(self, colonna, valore): return self._filtro(*self._condizione(colonna, "lt", valore))
+    def lte(self, colonna, valore): return self._filtro(*self._condizione(colonna, "lte", valore))
+    def like(self, colonna, pattern): return self._filtro(*self._condizione(colonna, "like", pattern))
+    def ilike(self, colonna, pattern): return self._filtro(*self._condizione(colonna, "ilike", pattern))
+    def in_(self, colonna, valori): return self._filtro(*self._condizione(colonna, "in", valori))
+    def is_(self, colonna, valore): return self._filtro(*self._condizione(colonna, "is", valore))
+
+    def or_(self, filtri, reference_table=None):
+        """Sintassi PostgREST: "col.op.valore,col.op.valore" (senza gruppi annidati)"""
+        parti, parametri = [], []
+        for pezzo in re.split(r",(?![^()]*\))", filtri):
+            colonna, operatore, valore = pezzo.strip().split(".", 2)
+            negato = operatore == "not"
+            if negato:
+                operatore, valore = valore.split(".", 1)
+            if operatore == "in":
+                valore = [v.strip().strip('"') for v in valore.strip("()").split(",") if v.strip()]
+            sql, par = self._condizione(colonna, operatore, valore)
+            parti.append(f"NOT ({sql})" if negato else sql)
+            parametri.extend(par)
+        return self._filtro("(" + " OR ".join(parti) + ")", parametri)
+
+    # Modificatori
+    def order(self, colonna, *, desc=False, nullsfirst=None, foreign_table=None):
+        self._colonne_usate.add(colonna)
+        nulls = "" if nullsfirst is None else (" NULLS FIRST" if nullsfirst else " NULLS LAST")
+        self._ordini.append(f"{_q(colonna)} {'DESC' if desc else 'ASC'}{nulls}")
+        return self
+
+    def limit(self, quante, foreign_table=None):
+        self._limite = int(quante)
+        return self
+
+    def range(self, inizio, fine, foreign_table=None):
+        self._offset, self._limite = int(inizio), int(fine) - int(inizio) + 1
+        return self
+
+    def single(self):
+        self._singolo = "single"
+        return self
+
+    def maybe_single(self):
+        self._singolo = "maybe"
+        return self
+
+    # Esecuzione
+    def _where(self):
+        if not self._filtri:
+            return "", []
+        return " WHERE " + " AND ".join(f"({sql})" for sql, _ in self._filtri), [p for _, par in self._filtri for p in par]
+
+    def execute(self):
+        schema = self._db.schema(self._tabella)
+        if not schema and self._operazione != "insert":
+            raise _errore(f'relation "public.{self._tabella}" does not exist', "42P01")
+        citate = set(self._colonne_usate)
+        if self._operazione == "select":
+            citate |= {c for c in self._colonne if c not in ("*", "count")}
+        if self._operazione != "insert":
+            sconosciute = sorted(citate - set(schema))
+            if sconosciute:
+                raise _errore(f"column {self._tabella}.{sconosciute[0]} does not exist", "42703")
+        try:
+            if self._operazione == "insert":
+                data = self._esegui_insert()
+            elif self._operazione == "update":
+                data = self._esegui_update(schema)
+            elif self._operazione == "delete":
+                data = self._esegui_delete(schema)
+            else:
+                return self._esegui_select(schema)
+        except sqlite3.OperationalError as e:
+            raise _errore(str(e), "42703" if "no such column" in str(e) else "PGRST000")
+        return _risposta(data, len(data) if self._count else None)
+
+    def _esegui_select(self, schema):
+        con = self._db.connessione()
+        where, parametri = self._where()
+        tabella = _q(self._tabella)
+        totale = None
+        if self._count or self._colonne == ["count"]:
+            totale = con.execute(f"SELECT COUNT(*) FROM {tabella}{where}", parametri).fetchone()[0]
+        if self._colonne == ["count"]:
+            return _risposta([{"count": totale}], totale if self._count else None)
+
+        colonne = "*" if "*" in self._colonne else ", ".join(_q(c) for c in self._colonne)
+        sql = f"SELECT {colonne} FROM {tabella}{where}"
+        if self._ordini:
+            sql += " ORDER BY " + ", ".join(self._ordini)
+        if self._limite is not None or self._offset:
+            sql += f" LIMIT {self._limite if self._limite is not None else -1} OFFSET {self._offset}"
+        try:
+            data = [_da_sql(r, schema) for r in con.execute(sql, parametri)]
+        except sqlite3.OperationalError as e:
+            raise _errore(str(e), "42703" if "no such column" in str(e) else "PGRST000")
+
+        if self._singolo:
+            if len(data) > 1 or (len(data) == 0 and self._singolo == "single"):
+                raise _errore(f"JSON object requested, multiple (or no) rows returned ({len(data)})", "PGRST116")
+            if not data:
+                return None
+            return _risposta(data[0], totale)
+        return _risposta(data, totale)
+
+    def _esegui_insert(self):
+        righe = self._valori if isinstance(self._valori, list) else [self._valori]
+        if not righe:
+            return []
+        schema = self._db.assicura_colonne(self._tabella, righe)
+        colonne = sorted({c for r in righe for c in r} | {"created_at"})
+        sql = f"INSERT INTO {_q(self._tabella)} ({', '.join(_q(c) for c in colonne)}) VALUES ({', '.join('?' * len(colonne))})"
+        adesso = _adesso()
+        ids = []
+        with self._db.lock_scrittura:
+            con = self._db.connessione()
+            for r in righe:
+                valori = [_a_sql(r.get(c, adesso if c == "created_at" else None)) for c in colonne]
+                ids.append(con.execute(sql, valori).lastrowid)
+            con.commit()
+        return self._rileggi(ids, schema)
+
+    def _ids_filtrati(self, con):
+        where, parametri = self._where()
+        return [r[0] for r in con.execute(f"SELECT id FROM {_q(self._tabella)}{where}", parametri)]
+
+    def _rileggi(self, ids, schema):
+        if not ids:
+            return []
+        con = self._db.connessione()
+        righe = con.execute(f"SELECT * FROM {_q(self._tabella)} WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id", ids)
+        return [_da_sql(r, schema) for r in righe]
+
+    def _esegui_update(self, schema):
+        schema = self._db.assicura_colonne(self._tabella, [self._valori])
+        assegnazioni = ", ".join(f"{_q(c)} = ?" for c in self._valori)
+        with self._db.lock_scrittura:
+            con = self._db.connessione()
+            ids = self._ids_filtrati(con)
+            if ids:
+                con.execute(f"UPDATE {_q(self._tabella)} SET {assegnazioni} WHERE id IN ({','.join('?' * len(ids))})",
+                            [_a_sql(v) for v in self._valori.values()] + ids)
+                con.commit()
+        return self._rileggi(ids, schema)
+
+    def _esegui_delete(self, schema):
+        with self._db.lock_scrittura:
+            con = self._db.connessione()
+            ids = self._ids_filtrati(con)
+            righe = self._rileggi(ids, schema)
+            if ids:
+                con.execute(f"DELETE FROM {_q(self._tabella)} WHERE id IN ({','.join('?' * len(ids))})", ids)
+                con.commit()
+        return righe
+
+# --- 3. STORAGE ---
+class _BucketLocale:
+    def __init__(self, cartella, bucket):
+        self._cartella = os.path.join(cartella, bucket)
+        self._bucket = bucket
+
+    def _percorso(self, path):
+        percorso = os.path.normpath(os.path.join(self._cartella, path))
+        if not percorso.startswith(os.path.normpath(self._cartella) + os.sep):
+            raise _errore(f"Percorso non valido: {path}")
+        return percorso
+
+    def upload(self, path, file, file_options=None):
+        percorso = self._percorso(path)
+        if os.path.exists(percorso) and str((file_options or {}).get("upsert", "false")).lower() != "true":
+            raise _errore("409 Duplicate: The resource already exists", "409")
+        os.makedirs(os.path.dirname(percorso), exist_ok=True)
+        dati = file if isinstance(file, (bytes, bytearray)) else open(file, "rb").read()
+        with open(percorso, "wb") as f:
+            f.write(dati)
+        return {"path": path, "Key": f"{self._bucket}/{path}"}
+
+    def download(self, path):
+        with open(self._percorso(path), "rb") as f:
+            return f.read()
+
+    def remove(self, paths):
+        rimossi = []
+        for path in paths:
+            percorso = self._percorso(path)
+            if os.path.exists(percorso):
+                os.remove(percorso)
+                rimossi.append({"name": path})
+        return rimossi
+
+    def list(self, path=None, options=None):
+        cartella = self._percorso(path) if path else self._cartella
+        return [{"name": n} for n in sorted(os.listdir(cartella))] if os.path.isdir(cartella) else []
+
+    def get_public_url(self, path, options=None):
+        return "file://" + self._percorso(path)
+
+class _StorageLocale:
+    def __init__(self, cartella):
+        self._cartella = cartella
+
+    def from_(self, bucket):
+        return _BucketLocale(self._cartella, bucket)
+
+# --- 4. FUNZIONI RPC ---
+# Colonne ammesse per il raggruppamento e loro espressione normalizzata (come la vista fatturati_normalizzati)
+_COLONNE_VENDITE = {
+    "AnnoRif": 'CAST("AnnoRif" AS INTEGER)',
+    "MeseRif": """substr('0' || CAST("MeseRif" AS TEXT), -2)""",
+    "AgenteDoc": 'upper(trim(CAST("AgenteDoc" AS TEXT)))',
+    "IdAgenteDoc": 'CAST("IdAgenteDoc" AS TEXT)',
+    "Cliente": 'CAST("Cliente" AS TEXT)',
+    "IdAnagrafica": 'CAST("IdAnagrafica" AS TEXT)',
+    "Famiglia": """CASE WHEN upper(trim(coalesce(CAST("Famiglia" AS TEXT), ''))) IN ('', '0', 'NAN', 'NONE')
+                   THEN 'NON SPECIFICATO' ELSE upper(trim(CAST("Famiglia" AS TEXT))) END""",
+    "Merceologica": 'CAST("Merceologica" AS TEXT)',
+}
+
+def _vendite_aggregati(db, params):
+    """Equivalente di public.vendite_aggregati (sql/vendite_aggregati.sql)"""
+    schema = db.schema("fatturati")
+    if not schema:
+        raise _errore('relation "public.fatturati" does not exist', "42P01")
+    gruppi = list(params.get("gruppi") or [])
+    if any(g not in _COLONNE_VENDITE for g in gruppi):
+        raise _errore(f"Colonna di raggruppamento non ammessa in {gruppi}", "P0001")
+
+    colonne = {c: _COLONNE_VENDITE[c] if c in schema else "NULL" for c in _COLONNE_VENDITE}
+    colonne["IdTestata"] = 'CAST("IdTestata" AS TEXT)' if "IdTestata" in schema else "NULL"
+    colonne["ImportoNettoRiga"] = 'coalesce(CAST("ImportoNettoRiga" AS REAL), 0)'
+    raee = """upper(coalesce(CAST("CodArt" AS TEXT), '')) NOT LIKE '%RAEE%'""" if "CodArt" in schema else "1"
+    normalizzate = (f"SELECT {', '.join(f'{espr} AS {_q(c)}' for c, espr in colonne.items())} "
+                    f"FROM fatturati WHERE {raee}")
+
+    condizioni, parametri = [], []
+    for chiave, colonna in (("anni", "AnnoRif"), ("mesi", "MeseRif")):
+        valori = params.get(chiave)
+        if valori is not None:
+            condizioni.append(f"{_q(colonna)} IN ({','.join('?' * len(valori))})" if valori else "0")
+            parametri += list(valori)
+    for chiave, colonna in (("id_agente", "IdAgenteDoc"), ("id_cliente", "IdAnagrafica"), ("marchio", "Famiglia")):
+        if params.get(chiave) is not None:
+            condizioni.append(f"{_q(colonna)} = ?")
+            parametri.append(params[chiave])
+    ordini = ('CASE WHEN COUNT("IdTestata") > 0 THEN COUNT(DISTINCT "IdTestata") ELSE COUNT(*) END'
+              if params.get("con_ordini") else "NULL")
+    selezione = "".join(f"{_q(g)}, " for g in gruppi)
+    sql = (f'SELECT {selezione}SUM("ImportoNettoRiga") AS "ImportoNettoRiga", COUNT(*) AS righe, {ordini} AS ordini '
+           f"FROM ({normalizzate})")
+    if condizioni:
+        sql += " WHERE " + " AND ".join(condizioni)
+    if gruppi:
+        sql += " GROUP BY " + ", ".join(_q(g) for g in gruppi)
+    if params.get("limite") is not None:
+        sql += f' ORDER BY "ImportoNettoRiga" DESC LIMIT {int(params["limite"])}'
+    return [dict(r) for r in db.connessione().execute(sql, parametri)]
+
+_FUNZIONI_RPC = {"vendite_aggregati": _vendite_aggregati}
+
+class _ChiamataRpc:
+    """Builder minimo restituito da rpc(): come in postgrest, la funzione gira solo con execute()"""
+
+    def __init__(self, db, fn, params):
+        self._db, self._fn, self._params = db, fn, params or {}
+
+    def execute(self):
+        try:
+            return _risposta(_FUNZIONI_RPC[self._fn](self._db, self._params))
+        except sqlite3.OperationalError as e:
+            raise _errore(str(e))
+
+# --- 5. CLIENT ---
+class ClientLocale:
+    """Client con la stessa interfaccia usata dalle pagine (table/from_/rpc/storage), su un file SQLite"""
+
+    def __init__(self, percorso_db, cartella_storage=None):
+        self._db = _DatabaseLocale(percorso_db)
+        self.storage = _StorageLocale(cartella_storage or os.path.splitext(percorso_db)[0] + "_storage")
+
+    def table(self, nome):
+        return _QueryLocale(self._db, nome)
+
+    def from_(self, nome):
+        return self.table(nome)
+
+    def rpc(self, fn, params=None, count=None, head=False, get=False):
+        if fn not in _FUNZIONI_RPC:
+            raise _errore(f"Could not find the function public.{fn} in the schema cache", "PGRST202")
+        return _ChiamataRpc(self._db, fn, params)
+
+def percorso_da_url(url):
+    """'sqlite:///dati/vivetti.sqlite' -> 'dati/vivetti.sqlite'; None se l'URL non è SQLite"""
+    if not str(url).startswith("sqlite:///"):
+        return None
+    return str(url)[len("sqlite:///"):]
@@ -0,0 +1,100 @@
+"""Cache LRU (per processo) delle figure Plotly e degli aggregati che le alimentano.
+
+La chiave è (nome grafico, versione del dataset, filtri normalizzati): tornando su una combinazione
+di filtri già vista si saltano sia l'aggregazione pandas sia la costruzione della figura.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+import streamlit as st
+
+# Numero massimo di voci (figure + aggregati) tenute in memoria
+MAX_VOCI = 300
+# Voci per le dashboard su dati parziali: cambiano a ogni blocco scaricato, quindi stanno in una cache
+# piccola a parte e non scalzano dalla principale le figure delle altre sessioni
+MAX_VOCI_PARZIALI = 40
+
+# Versione di un dataset ancora in download (sezione_parziale): ambito + righe arrivate finora
+VersioneParziale = namedtuple("VersioneParziale", ["ambito", "righe"])
+
+
+class _CacheLRU:
+    def __init__(self, massimo):
+        self.massimo = massimo
+        self.voci = OrderedDict()
+        self.lock = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+
+    def leggi(self, chiave):
+        with self.lock:
+            if chiave not in self.voci:
+                self.miss += 1
+                return None
+            self.voci.move_to_end(chiave)
+            self.hit += 1
+            return self.voci[chiave]
+
+    def scrivi(self, chiave, valore):
+        with self.lock:
+            self.voci[chiave] = valore
+            self.voci.move_to_end(chiave)
+            while len(self.voci) > self.massimo:
+                self.voci.popitem(last=False)
+
+
+@st.cache_resource(show_spinner=False)
+def _cache():
+    return _CacheLRU(MAX_VOCI)
+
+@st.cache_resource(show_spinner=False)
+def _cache_parziali():
+    return _CacheLRU(MAX_VOCI_PARZIALI)
+
+def _cache_per(versione):
+    return _cache_parziali() if isinstance(versione, VersioneParziale) else _cache()
+
+# --- CHIAVI ---
+def chiave_filtri(anni=(), mesi=(), agente="Tutti", marchio=None):
+    """Tupla dei filtri indipendente dall'ordine di selezione nei multiselect"""
+    return (
+        tuple(sorted(int(a) for a in anni or [])),
+        tuple(sorted(str(m) for m in mesi or [])),
+        str(agente),
+        marchio,
+    )
+
+def firma_dataset(ambito, creato):
+    """Versione del dataset: ambito (utente/cliente) + istante del caricamento (creato della cache condivisa).
+
+    L'ambito evita che due utenti con dati diversi condividano le stesse voci di cache; ogni nuovo caricamento
+    (anche una correzione che lascia invariati righe e totali) ha un creato diverso e quindi voci nuove.
+    """
+    return (ambito, creato)
+
+# --- LETTURA/SCRITTURA ---
+def valore(nome, versione, filtri, calcola):
+    """Risultato di calcola() (aggregati, metriche) memorizzato per (nome, versione, filtri)"""
+    chiave = ("valore", nome, versione, filtri)
+    cache = _cache_per(versione)
+    trovato = cache.leggi(chiave)
+    if trovato is None:
+        trovato = (calcola(),)
+        cache.scrivi(chiave, trovato)
+    return trovato[0]
+
+def figura(nome, versione, filtri, costruisci):
+    """Figura Plotly per (nome, versione, filtri); in cache viene salvato il JSON serializzato"""
+    import plotly.io as pio
+
+    chiave = ("figura", nome, versione, filtri)
+    cache = _cache_per(versione)
+    spec = cache.leggi(chiave)
+    if spec is not None:
+        return pio.from_json(spec)
+    fig = costruisci()
+    cache.scrivi(chiave, pio.to_json(fig, validate=False))
+    return fig
+
+def statistiche():
+    cache = _cache()
+    return {"voci": len(cache.voci), "hit": cache.hit, "miss": cache.miss}
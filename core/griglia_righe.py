@@ -0,0 +1,192 @@
+"""Editor a griglia delle righe di preventivo/ordine (st.data_editor dentro un fragment).
+
+Le righe restano in session_state come lista di dict (formato di views/preventivi.py e views/archivio.py);
+la griglia è solo una vista: le modifiche vengono riportate nei dict, ricalcolando netti e totali in blocco.
+Il totale del documento è mostrato dalla pagina, fuori dal fragment.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+from core.prezzi import calcola_netti
+
+TIPO_NOTA = "NOTA_TESTO"
+# Chiave del dict riga con il netto scritto a mano: finché c'è, lordo/sconti/omaggio non lo ricalcolano
+# (non viene salvata a DB, salva/aggiorna mappano i campi uno per uno)
+NETTO_MANUALE = "NETTO_MANUALE"
+
+# Colonne della griglia modificabili dall'utente (le altre sono calcolate o di sola lettura)
+COLONNE_MODIFICABILI = ["DESCRIZIONE", "QTA", "PREZZO_LORDO", "S1", "S2", "S3", "PREZZO_NETTO", "SCONTO_MERCE", "NOTA"]
+COLONNE_PREZZO = ["PREZZO_LORDO", "S1", "S2", "S3", "SCONTO_MERCE"]
+ORDINE_COLONNE = ["SEL", "TIPO", "CODICE", "DESCRIZIONE", "QTA", "PREZZO_LORDO", "S1", "S2", "S3",
+                  "PREZZO_NETTO", "SCONTO_MERCE", "TOTALE", "NOTA"]
+
+# Campi impostabili in blocco sulle righe selezionate
+CAMPI_BLOCCO = {"S1": "Sconto 1 %", "S2": "Sconto 2 %", "S3": "Sconto 3 %", "QTA": "Quantità", "PREZZO_NETTO": "Netto unitario"}
+
+# --- GRIGLIA <-> RIGHE ---
+def righe_a_griglia(righe, selezione=()):
+    """Lista di dict -> DataFrame della griglia (indice = posizione della riga nella lista)"""
+    df = pd.DataFrame.from_records(righe, columns=[c for c in ORDINE_COLONNE if c not in ("SEL", "TIPO", "TOTALE")])
+    df["DESCRIZIONE"] = df["DESCRIZIONE"].fillna("").astype(str)
+    df["CODICE"] = df["CODICE"].fillna("").astype(str)
+    df["NOTA"] = df["NOTA"].fillna("").astype(str)
+    is_nota = pd.Series([r.get("tipo") == TIPO_NOTA for r in righe], index=df.index, dtype=bool)
+    df["TIPO"] = np.where(is_nota, "🗒️ Nota", "Articolo")
+    for col in ["PREZZO_LORDO", "S1", "S2", "S3", "PREZZO_NETTO"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).where(~is_nota)
+    df["QTA"] = pd.to_numeric(df["QTA"], errors="coerce").fillna(1).astype("Int64").where(~is_nota)
+    df["SCONTO_MERCE"] = df["SCONTO_MERCE"].fillna(False).astype(bool)
+    df["TOTALE"] = np.where(df["SCONTO_MERCE"], 0.0, df["PREZZO_NETTO"] * df["QTA"].astype(float)).astype(float)
+    df["TOTALE"] = df["TOTALE"].where(~is_nota)
+    df["SEL"] = [i in selezione for i in range(len(df))]
+    return df[ORDINE_COLONNE]
+
+def totale_righe(righe):
+    """Totale netto del documento (omaggi a zero, note escluse)"""
+    if not righe:
+        return 0.0
+    return float(righe_a_griglia(righe)["TOTALE"].sum())
+
+def _diversi(a, b):
+    # Confronto tra oggetti con None al posto di NaN/NA: 2 == 2.0 e None/None non sono modifiche
+    a_obj = a.astype(object).where(a.notna(), None)
+    b_obj = b.astype(object).where(b.notna(), None)
+    return ~((a_obj == b_obj) | (a.isna() & b.isna()))
+
+def applica_griglia(righe, df_prima, df_dopo):
+    """Riporta nei dict le modifiche fatte nella griglia; None se nessun campo è cambiato.
+
+    Se cambiano lordo, sconti o omaggio il netto viene ricalcolato in blocco con calcola_netti,
+    salvo sulle righe con netto scritto a mano (prezzo netto fisso, in NETTO_MANUALE): lì resta fisso
+    e torna al suo valore quando l'omaggio viene tolto. Svuotare la cella del netto lo rimette calcolato.
+    """
+    cambiati = pd.DataFrame({c: _diversi(df_prima[c], df_dopo[c]) for c in COLONNE_MODIFICABILI})
+    righe_cambiate = cambiati.any(axis=1)
+    if not righe_cambiate.any():
+        return None
+
+    df = df_dopo.copy()
+    is_nota = df["TIPO"] != "Articolo"
+    netto_svuotato = pd.to_numeric(df["PREZZO_NETTO"], errors="coerce").isna() & ~is_nota
+    # Una cella numerica svuotata nella griglia arriva come NaN/NA: vale 0 come in calcola_netti
+    for col in ["PREZZO_LORDO", "S1", "S2", "S3", "PREZZO_NETTO"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    # Netto fisso: scritto ora nella griglia oppure in una modifica precedente
+    netto_scritto = cambiati["PREZZO_NETTO"] & ~netto_svuotato & ~is_nota
+    netto_fisso = pd.Series([righe[i].get(NETTO_MANUALE) for i in df.index], index=df.index, dtype="float64")
+    netto_fisso = netto_fisso.where(~netto_scritto, df["PREZZO_NETTO"]).where(~netto_svuotato & ~is_nota)
+    manuale = netto_fisso.notna()
+    ricalcola = (cambiati[COLONNE_PREZZO].any(axis=1) | netto_svuotato) & ~manuale & ~is_nota
+    netti = calcola_netti(df["PREZZO_LORDO"], df["S1"], df["S2"], df["S3"])
+    df.loc[ricalcola, "PREZZO_NETTO"] = netti[ricalcola.to_numpy()]
+    df.loc[manuale, "PREZZO_NETTO"] = netto_fisso[manuale]
+    df.loc[df["SCONTO_MERCE"] & ~is_nota, "PREZZO_NETTO"] = 0.0
+    df["QTA"] = pd.to_numeric(df["QTA"], errors="coerce").fillna(1).clip(lower=1)
+
+    nuove = list(righe)
+    for pos in df.index[righe_cambiate | ricalcola]:
+        riga = dict(righe[pos])
+        r = df.loc[pos]
+        riga["DESCRIZIONE"] = r["DESCRIZIONE"] or ""
+        if not is_nota[pos]:
+            riga.update({
+                "QTA": int(r["QTA"]), "PREZZO_LORDO": float(r["PREZZO_LORDO"]),
+                "S1": float(r["S1"]), "S2": float(r["S2"]), "S3": float(r["S3"]),
+                "PREZZO_NETTO": float(r["PREZZO_NETTO"]), "SCONTO_MERCE": bool(r["SCONTO_MERCE"]),
+                "NOTA": r["NOTA"] or "",
+            })
+        if manuale[pos]:
+            riga[NETTO_MANUALE] = float(netto_fisso[pos])
+        else:
+            riga.pop(NETTO_MANUALE, None)
+        nuove[pos] = riga
+    return nuove
+
+# --- OPERAZIONI IN BLOCCO ---
+def elimina_righe(righe, posizioni):
+    posizioni = set(posizioni)
+    return [r for i, r in enumerate(righe) if i not in posizioni]
+
+def imposta_in_blocco(righe, posizioni, campo, valore):
+    """Imposta campo=valore su tutte le righe articolo selezionate, ricalcolando i netti in un colpo solo"""
+    df = righe_a_griglia(righe)
+    df_dopo = df.copy()
+    articoli = [p for p in posizioni if df.at[p, "TIPO"] == "Articolo"]
+    if campo == "QTA":
+        valore = max(int(valore), 1)
+    df_dopo.loc[articoli, campo] = valore
+    return applica_griglia(righe, df, df_dopo) or righe
+
+def azzera_selezione(chiave_stato):
+    """Da chiamare quando in session_state viene caricato un altro documento"""
+    st.session_state.pop(f"{chiave_stato}_griglia_sel", None)
+
+# --- EDITOR (FRAGMENT) ---
+CONFIG_COLONNE = {
+    "SEL": st.column_config.CheckboxColumn("✔", width="small"),
+    "TIPO": st.column_config.TextColumn("Tipo", width="small"),
+    "CODICE": st.column_config.TextColumn("Codice"),
+    "DESCRIZIONE": st.column_config.TextColumn("Descrizione", width="large"),
+    "QTA": st.column_config.NumberColumn("Q.tà", min_value=1, step=1),
+    "PREZZO_LORDO": st.column_config.NumberColumn("Lordo €", min_value=0.0, format="%.2f"),
+    "S1": st.column_config.NumberColumn("S1 %", min_value=0.0, max_value=100.0, format="%g"),
+    "S2": st.column_config.NumberColumn("S2 %", min_value=0.0, max_value=100.0, format="%g"),
+    "S3": st.column_config.NumberColumn("S3 %", min_value=0.0, max_value=100.0, format="%g"),
+    "PREZZO_NETTO": st.column_config.NumberColumn("Netto €", min_value=0.0, format="%.2f",
+                                                  help="Scritto a mano resta fisso; svuotalo per tornare al calcolo da lordo e sconti"),
+    "SCONTO_MERCE": st.column_config.CheckboxColumn("Omaggio"),
+    "TOTALE": st.column_config.NumberColumn("Totale €", format="%.2f"),
+    "NOTA": st.column_config.TextColumn("Nota riga"),
+}
+
+@st.fragment
+def editor_righe(chiave_stato):
+    """Griglia modificabile delle righe in st.session_state[chiave_stato].
+
+    Modifiche e operazioni in blocco rieseguono solo questo fragment, tranne quando cambia il totale:
+    allora si riesegue la pagina, che mostra totale e salvataggio fuori dal fragment. La chiave
+    dell'editor cambia dopo ogni modifica applicata, così la griglia riparte dai valori ricalcolati.
+    """
+    righe = st.session_state[chiave_stato]
+    chiave_ver = f"{chiave_stato}_griglia_ver"
+    chiave_sel = f"{chiave_stato}_griglia_sel"
+    versione = st.session_state.setdefault(chiave_ver, 0)
+    selezione = {i for i in st.session_state.get(chiave_sel, set()) if i < len(righe)}
+
+    def aggiorna(nuove, nuova_selezione=frozenset()):
+        st.session_state[chiave_stato] = nuove
+        st.session_state[chiave_sel] = set(nuova_selezione)
+        st.session_state[chiave_ver] = versione + 1
+        if round(totale_righe(nuove), 2) != round(totale_righe(righe), 2):
+            st.rerun()
+        try:
+            st.rerun(scope="fragment")
+        except st.errors.StreamlitAPIException:
+            # Modifica arrivata durante un rerun completo (es. click fuori dal fragment): rerun di tutta la pagina
+            st.rerun()
+
+    df = righe_a_griglia(righe, selezione)
+    df_mod = st.data_editor(
+        df, key=f"{chiave_stato}_griglia_{versione}", hide_index=True, use_container_width=True,
+        column_config=CONFIG_COLONNE, disabled=["TIPO", "CODICE", "TOTALE"], num_rows="fixed",
+        height=min(38 + 35 * len(df), 600),
+    )
+    selezione = {int(i) for i in df_mod.index[df_mod["SEL"].fillna(False).astype(bool)]}
+    st.session_state[chiave_sel] = selezione
+
+    nuove = applica_griglia(righe, df, df_mod)
+    if nuove is not None:
+        aggiorna(nuove, selezione)
+
+    # Operazioni in blocco sulle righe spuntate
+    c_del, c_omg, c_campo, c_val, c_app = st.columns([1, 1, 1, 1, 1], vertical_alignment="bottom")
+    n_sel = len(selezione)
+    if c_del.button(f"🗑️ Elimina ({n_sel})", disabled=not n_sel, use_container_width=True, key=f"{chiave_stato}_blk_del"):
+        aggiorna(elimina_righe(righe, selezione))
+    if c_omg.button("🎁 Omaggio sì/no", disabled=not n_sel, use_container_width=True, key=f"{chiave_stato}_blk_omg"):
+        tutti_omaggio = all(righe[i].get("SCONTO_MERCE") for i in selezione)
+        aggiorna(imposta_in_blocco(righe, selezione, "SCONTO_MERCE", not tutti_omaggio), selezione)
+    campo = c_campo.selectbox("Campo", list(CAMPI_BLOCCO), format_func=CAMPI_BLOCCO.get, key=f"{chiave_stato}_blk_campo")
+    valore = c_val.number_input("Valore", min_value=0.0, value=1.0 if campo == "QTA" else 0.0, key=f"{chiave_stato}_blk_val_{campo}")
+    if c_app.button("Applica alle selezionate", disabled=not n_sel, use_container_width=True, key=f"{chiave_stato}_blk_app"):
+        aggiorna(imposta_in_blocco(righe, selezione, campo, valore), selezione)
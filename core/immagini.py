@@ -0,0 +1,90 @@
+import io
+import re
+import hashlib
+from core.db import get_supabase_client
+
+# Dimensioni (lato lungo, px) e qualità JPEG delle immagini caricate sullo storage
+LATO_MAX_ORIGINALE = 1600
+QUALITA_ORIGINALE = 80
+LATO_MAX_MINIATURA = 320
+QUALITA_MINIATURA = 70
+
+SUFFISSO_MINIATURA = "_thumb"
+# Nomi generati da carica_allegato: <prefisso>_<hash 16 hex>.jpg
+_PATTERN_NOME_HASH = re.compile(r"_[0-9a-f]{16}\.jpg$")
+
+# --- 1. COMPRESSIONE ---
+def ridimensiona_jpeg(dati, lato_max, qualita):
+    """Ruota secondo EXIF, riduce al lato massimo indicato e ricodifica in JPEG"""
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(dati))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        sfondo = Image.new("RGB", img.size, (255, 255, 255))
+        sfondo.paste(img, mask=img.split()[-1])
+        img = sfondo
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((lato_max, lato_max))
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=qualita, optimize=True, progressive=True)
+    return out.getvalue()
+
+# --- 2. STORAGE ---
+def url_pubblico(bucket, path):
+    url_data = get_supabase_client().storage.from_(bucket).get_public_url(path)
+    if isinstance(url_data, str): return url_data
+    if hasattr(url_data, "public_url"): return url_data.public_url
+    if isinstance(url_data, dict) and "publicUrl" in url_data: return url_data["publicUrl"]
+    return str(url_data)
+
+def _upload_se_assente(bucket, path, dati, content_type):
+    """Carica il file; se esiste già (stesso hash = stesso contenuto) non lo ricarica"""
+    try:
+        get_supabase_client().storage.from_(bucket).upload(
+            path=path,
+            file=dati,
+            file_options={"content-type": content_type}
+        )
+    except Exception as e:
+        testo = str(e).lower()
+        if "exists" not in testo and "duplicate" not in testo and "409" not in testo:
+            raise
+
+def carica_allegato(bucket, file, prefisso):
+    """Comprime l'immagine, genera la miniatura e carica entrambe con nome basato sul contenuto.
+
+    I PDF (o le immagini non leggibili) vengono caricati così come sono. Restituisce l'URL pubblico
+    dell'originale; la miniatura si ricava con url_miniatura().
+    """
+    grezzo = file.getvalue()
+    digest = hashlib.sha256(grezzo).hexdigest()[:16]
+
+    if file.type and file.type.startswith("image/"):
+        try:
+            originale = ridimensiona_jpeg(grezzo, LATO_MAX_ORIGINALE, QUALITA_ORIGINALE)
+            miniatura = ridimensiona_jpeg(grezzo, LATO_MAX_MINIATURA, QUALITA_MINIATURA)
+        except Exception:
+            originale = None
+        if originale is not None:
+            path = f"{prefisso}_{digest}.jpg"
+            _upload_se_assente(bucket, path, originale, "image/jpeg")
+            _upload_se_assente(bucket, path.replace(".jpg", f"{SUFFISSO_MINIATURA}.jpg"), miniatura, "image/jpeg")
+            return url_pubblico(bucket, path)
+
+    estensione = file.name.rsplit(".", 1)[-1].lower() if "." in file.name else "bin"
+    path = f"{prefisso}_{digest}.{estensione}"
+    _upload_se_assente(bucket, path, grezzo, file.type)
+    return url_pubblico(bucket, path)
+
+def url_miniatura(url):
+    """URL della miniatura per i file caricati da carica_allegato; None per i file precedenti o non immagine"""
+    if not url:
+        return None
+    base = url.split("?", 1)[0]
+    if not _PATTERN_NOME_HASH.search(base):
+        return None
+    return base[:-len(".jpg")] + f"{SUFFISSO_MINIATURA}.jpg"
@@ -0,0 +1,117 @@
+"""Import in blocco di righe preventivo da CSV/Excel (coppie codice articolo + quantità).
+
+I codici vengono risolti tutti insieme con una lookup sul listino netto in cache (core/prezzi.py),
+già calcolato per il profilo sconti del cliente (o con gli sconti SCONTO1/2/3 di listino).
+"""
+import csv
+import io
+import pandas as pd
+from core import prezzi
+
+# Intestazioni riconosciute (minuscole, senza spazi ai lati); senza intestazione: 1a colonna codice, 2a quantità
+NOMI_CODICE = {"codice", "cod", "cod.", "codice articolo", "cod. articolo", "articolo", "code", "sku", "codart"}
+NOMI_QTA = {"quantita", "quantità", "qta", "q.tà", "qty", "quantity", "pezzi", "pz"}
+# Separatori CSV provati, in ordine di preferenza a parità di presenza
+SEPARATORI = (";", ",", "\t")
+
+
+class ErroreImport(Exception):
+    """File non leggibile o senza una colonna codici riconoscibile"""
+
+
+def leggi_file(nome_file, contenuto):
+    """CSV/XLSX -> DataFrame di stringhe senza intestazione (la si riconosce dopo)"""
+    nome = (nome_file or "").lower()
+    if nome.endswith((".xlsx", ".xlsm", ".xls")):
+        try:
+            return pd.read_excel(io.BytesIO(contenuto), header=None, dtype=str)
+        except ImportError:
+            raise ErroreImport("Per leggere file Excel serve il pacchetto 'openpyxl': salva il file come CSV oppure installalo.")
+        except ValueError as e:
+            raise ErroreImport(f"File Excel non leggibile: {e}")
+    for codifica in ("utf-8-sig", "latin-1"):
+        try:
+            testo = contenuto.decode(codifica)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ErroreImport("Codifica del file non riconosciuta")
+    if not testo.strip():
+        raise ErroreImport("Il file è vuoto")
+    try:
+        return pd.read_csv(io.StringIO(testo), header=None, dtype=str, sep=_separatore(testo), engine="python",
+                           skip_blank_lines=True)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, csv.Error) as e:
+        raise ErroreImport(f"File non leggibile: {e}")
+
+def _separatore(testo):
+    """; , o tab (come esportano Excel italiano e gestionali): quello presente in tutte le prime righe,
+    a parità nell'ordine indicato; senza nessuno dei tre il file è una sola colonna di codici"""
+    righe = [r for r in testo.splitlines() if r.strip()][:20]
+    presenze = {sep: min(r.count(sep) for r in righe) for sep in SEPARATORI}
+    migliore = max(SEPARATORI, key=lambda sep: (presenze[sep], -SEPARATORI.index(sep)))
+    # Una sola colonna: il separatore di unità ASCII non compare nei file reali, quindi non divide nulla
+    return migliore if presenze[migliore] > 0 else "\x1f"
+
+def estrai_codici_qta(df_file):
+    """DataFrame grezzo -> DataFrame (riga_file, CODICE, QTA_TESTO) riconoscendo l'eventuale intestazione"""
+    if df_file.empty:
+        raise ErroreImport("Il file è vuoto")
+    df_file = df_file.dropna(how="all")
+    intestazione = [str(v).strip().lower() for v in df_file.iloc[0].tolist()]
+    col_codice, col_qta, inizio = 0, 1 if df_file.shape[1] > 1 else None, 0
+    if any(v in NOMI_CODICE or v in NOMI_QTA for v in intestazione):
+        col_codice = next((i for i, v in enumerate(intestazione) if v in NOMI_CODICE), None)
+        col_qta = next((i for i, v in enumerate(intestazione) if v in NOMI_QTA), None)
+        if col_codice is None:
+            raise ErroreImport("Nessuna colonna codice riconosciuta nell'intestazione (es. 'Codice', 'Articolo')")
+        inizio = 1
+
+    dati = df_file.iloc[inizio:]
+    return pd.DataFrame({
+        "riga_file": dati.index + 1,
+        "CODICE": dati.iloc[:, col_codice].fillna("").astype(str).str.strip(),
+        "QTA_TESTO": dati.iloc[:, col_qta].fillna("").astype(str).str.strip() if col_qta is not None else "",
+    })
+
+def prepara_import(nome_file, contenuto, profilo=None):
+    """Legge il file e risolve tutti i codici sul listino netto del profilo (vedi prezzi.profilo_sconti).
+
+    Restituisce un dict con:
+      righe       -> righe pronte per st.session_state.righe_preventivo (stesso formato della scheda articolo)
+      sconosciuti -> codici non presenti in listino_import
+      scartate   -> righe del file con codice vuoto o quantità non valida (riga_file, CODICE, motivo)
+    """
+    df = estrai_codici_qta(leggi_file(nome_file, contenuto))
+
+    # Quantità: vuota -> 1; accetta la virgola decimale ma solo valori interi positivi
+    qta = pd.to_numeric(df["QTA_TESTO"].str.replace(",", ".", regex=False).replace("", "1"), errors="coerce")
+    valida = qta.notna() & (qta >= 1) & (qta == qta.round())
+    df["QTA"] = qta.where(valida)
+    motivo = pd.Series("", index=df.index)
+    motivo[~valida] = "quantità non valida"
+    motivo[df["CODICE"] == ""] = "codice vuoto"
+    scartate = df[motivo != ""].assign(motivo=motivo[motivo != ""])
+    df = df[motivo == ""].copy()
+
+    # Una lookup per tutti i codici: lordo, sconti e netto sono già calcolati nel listino in cache
+    prezzi_righe = prezzi.prezzi_per_codici(df["CODICE"], profilo)
+    trovato = prezzi_righe["CODICE"].notna().to_numpy()
+    sconosciuti = df.loc[~trovato, "CODICE"].drop_duplicates().tolist()
+    trovate, prezzi_trovati = df[trovato], prezzi_righe[trovato]
+
+    righe = pd.DataFrame({
+        "CODICE": prezzi_trovati["CODICE"].to_numpy(),
+        "DESCRIZIONE": prezzi_trovati["DESCRIZIONE"].to_numpy(),
+        "PREZZO_LORDO": prezzi_trovati["PREZZO"].to_numpy(), "PREZZO_NETTO": prezzi_trovati["NETTO"].to_numpy(),
+        "QTA": trovate["QTA"].astype(int).to_numpy(), "SCONTO_MERCE": False,
+        "S1": prezzi_trovati["S1"].to_numpy(), "S2": prezzi_trovati["S2"].to_numpy(), "S3": prezzi_trovati["S3"].to_numpy(),
+        "NOTA": "", "PREZZOLISTINO": prezzi_trovati["PREZZOLISTINO"].to_numpy(),
+    }).to_dict("records")
+
+    return {
+        "righe": righe,
+        "sconosciuti": sconosciuti,
+        "scartate": scartate[["riga_file", "CODICE", "motivo"]].to_dict("records"),
+    }
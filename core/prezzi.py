@@ -0,0 +1,95 @@
+"""Motore prezzi: netti dell'intero listino calcolati in blocco per profilo sconti.
+
+Il listino netto (una passata NumPy su tutto listino_import) viene tenuto in cache per
+(versione della replica del listino, profilo): il prezzo di una riga diventa una lookup per codice.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from core import anagrafiche
+from core.cache_condivisa import VoloUnico
+
+# Colonne di rubrica_clienti che, se presenti e valorizzate, sostituiscono gli sconti di listino
+COLONNE_SCONTO_CLIENTE = ("sconto_1", "sconto_2", "sconto_3")
+# Listini netti tenuti in memoria (uno per profilo sconti)
+MAX_LISTINI = 32
+
+# --- CALCOLO ---
+def calcola_netto(listino, s1, s2, s3):
+    return float(listino) * (1 - float(s1 or 0)/100) * (1 - float(s2 or 0)/100) * (1 - float(s3 or 0)/100)
+
+def calcola_netti(lordo, s1, s2, s3):
+    """calcola_netto applicato a intere colonne: lordo * (1 - s1%) * (1 - s2%) * (1 - s3%)"""
+    def num(x):
+        return pd.to_numeric(pd.Series(x), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    return num(lordo) * (1 - num(s1) / 100) * (1 - num(s2) / 100) * (1 - num(s3) / 100)
+
+# --- PROFILI SCONTO ---
+def profilo_sconti(cliente=None):
+    """None = sconti di listino; (s1, s2, s3) = condizioni del cliente, applicate a tutto il catalogo"""
+    if not cliente:
+        return None
+    valori = [cliente.get(c) for c in COLONNE_SCONTO_CLIENTE]
+    if all(v in (None, "", 0) for v in valori):
+        return None
+    try:
+        return tuple(float(v or 0) for v in valori)
+    except (TypeError, ValueError):
+        return None
+
+# --- LISTINO NETTO IN CACHE ---
+_cache = OrderedDict()
+_lock = threading.Lock()
+_voli = VoloUnico()
+
+def listino_netto(profilo=None):
+    """DataFrame del catalogo con lordo, sconti e netto per il profilo, indicizzato per codice minuscolo"""
+    chiave = (anagrafiche.versione("listino_import"), profilo)
+    with _lock:
+        if chiave in _cache:
+            _cache.move_to_end(chiave)
+            return _cache[chiave]
+    # Sessioni che chiedono insieme lo stesso listino non ancora calcolato attendono un unico calcolo
+    return _voli.esegui(chiave, lambda _: _calcola_listino(chiave, profilo))
+
+def _calcola_listino(chiave, profilo):
+    with _lock:
+        if chiave in _cache:
+            return _cache[chiave]
+    df = anagrafiche.dataframe("listino_import")
+    def colonna(nome, default=0.0):
+        return pd.to_numeric(df[nome], errors="coerce").fillna(default).to_numpy(dtype=float) if nome in df else np.full(len(df), default)
+
+    lordo = colonna("PREZZO")
+    if profilo is None:
+        s1, s2, s3 = colonna("SCONTO1"), colonna("SCONTO2"), colonna("SCONTO3")
+    else:
+        s1, s2, s3 = (np.full(len(df), s) for s in profilo)
+    codici = df["CODICE"].astype(str).str.strip() if "CODICE" in df else pd.Series([], dtype=str)
+    listino = pd.DataFrame({
+        "CODICE": codici.to_numpy(),
+        "DESCRIZIONE": df["DESCRIZIONE"].fillna("").astype(str).to_numpy() if "DESCRIZIONE" in df else "",
+        "PREZZO": lordo, "S1": s1, "S2": s2, "S3": s3,
+        "NETTO": calcola_netti(lordo, s1, s2, s3),
+        "PREZZOLISTINO": colonna("PREZZOLISTINO"),
+    }, index=codici.str.lower().to_numpy())
+    listino = listino[~listino.index.duplicated()]
+
+    with _lock:
+        _cache[chiave] = listino
+        while len(_cache) > MAX_LISTINI:
+            _cache.popitem(last=False)
+    return listino
+
+def prezzi_per_codici(codici, profilo=None):
+    """Lookup in blocco: una riga per codice richiesto (stesso ordine), NaN per i codici non a listino"""
+    chiavi = pd.Series(list(codici), dtype=object).astype(str).str.strip().str.lower()
+    return listino_netto(profilo).reindex(chiavi.to_numpy())
+
+def prezzo_articolo(codice, profilo=None):
+    """Riga di listino netto per un codice (dict) oppure None"""
+    trovati = prezzi_per_codici([codice], profilo)
+    if trovati["CODICE"].isna().iloc[0]:
+        return None
+    return trovati.iloc[0].to_dict()
@@ -0,0 +1,125 @@
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from core.db import get_supabase_client, leggi_paginato
+from core import agenti as directory_agenti
+
+# Solo le colonne necessarie ai totali (niente note / URL scontrini)
+COLONNE_REPORT = "id, id_agente, mese, anno, causale, importo, verificato"
+TRIMESTRI = ["Q1", "Q2", "Q3", "Q4"]
+PERIODI_REPORT = ["ANNO"] + TRIMESTRI
+
+# --- 1. DATI ---
+@st.cache_data(ttl=600, show_spinner=False)
+def get_spese_anno(anno):
+    """Tutte le note spese dell'anno (tutti gli agenti) con una lettura proiettata e paginata"""
+    righe = leggi_paginato(
+        lambda: get_supabase_client().table("nota_spese").select(COLONNE_REPORT).eq("anno", int(anno)).order("id")
+    )
+    df = pd.DataFrame(righe, columns=[c.strip() for c in COLONNE_REPORT.split(",")])
+    df["importo"] = pd.to_numeric(df["importo"], errors='coerce').fillna(0.0)
+    df["mese"] = pd.to_numeric(df["mese"], errors='coerce').fillna(1).astype(int)
+    df["trimestre"] = "Q" + ((df["mese"] - 1) // 3 + 1).astype(str)
+    df["id_agente"] = df["id_agente"].astype(str).str.strip()
+    df["causale"] = df["causale"].fillna("N/D").astype(str)
+    return df
+
+@st.cache_data(ttl=600, show_spinner=False)
+def calcola_report_spese(anno, periodo="ANNO"):
+    """Pivot dei totali per agente e per causale; periodo = 'ANNO' oppure 'Q1'..'Q4'"""
+    df = get_spese_anno(anno)
+    if periodo != "ANNO":
+        df = df[df["trimestre"] == periodo]
+    if df.empty:
+        return None
+
+    mappa_agenti = directory_agenti.mappa_agenti()
+    df = df.assign(Agente=df["id_agente"].map(mappa_agenti).fillna("ID: " + df["id_agente"]))
+    colonne_trimestri = [q for q in TRIMESTRI if q in set(df["trimestre"])] + ["Totale"]
+
+    def pivot(indice, colonne):
+        tab = pd.pivot_table(df, index=indice, columns=colonne, values="importo",
+                             aggfunc="sum", fill_value=0.0, margins=True, margins_name="Totale")
+        # Righe ordinate per importo, con la riga dei totali in fondo
+        righe = tab.drop(index="Totale").sort_values("Totale", ascending=False)
+        return pd.concat([righe, tab.loc[["Totale"]]])
+
+    return {
+        "totale": float(df["importo"].sum()),
+        "per_agente": pivot("Agente", "trimestre")[colonne_trimestri],
+        "per_causale": pivot("causale", "trimestre")[colonne_trimestri],
+        "agente_causale": pivot("Agente", "causale"),
+    }
+
+def invalida_report_spese():
+    get_spese_anno.clear()
+    calcola_report_spese.clear()
+    pdf_report_spese.clear()
+
+# --- 2. EXPORT ---
+def report_to_csv(tabella):
+    """CSV compatibile con Excel in italiano (separatore ';' e virgola decimale)"""
+    return tabella.to_csv(sep=";", decimal=",", float_format="%.2f").encode("utf-8-sig")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def pdf_report_spese(anno, periodo="ANNO"):
+    """PDF del report per (anno, periodo), generato una volta per versione dei dati e non a ogni rerun della pagina"""
+    report = calcola_report_spese(anno, periodo)
+    return None if report is None else genera_pdf_report_spese(anno, periodo, report)
+
+def genera_pdf_report_spese(anno, periodo, report):
+    from fpdf import FPDF
+
+    def pulisci_testo(testo):
+        temp = str(testo).encode('latin-1', 'replace').decode('latin-1')
+        return temp.replace('?', ' ')
+
+    pdf = FPDF(orientation='L', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    pdf.set_font("Arial", 'B', 15)
+    titolo_periodo = f"ANNO {anno}" if periodo == "ANNO" else f"{periodo} {anno}"
+    pdf.cell(0, 10, f"REPORT NOTE SPESE - {titolo_periodo}", ln=True, align='C')
+    pdf.set_font("Arial", '', 9)
+    pdf.cell(0, 6, f"Generato il {datetime.now().strftime('%d/%m/%Y %H:%M')}", ln=True, align='C')
+    pdf.ln(4)
+
+    sezioni = [
+        ("TOTALI PER AGENTE", report["per_agente"]),
+        ("TOTALI PER CAUSALE", report["per_causale"]),
+        ("AGENTE x CAUSALE", report["agente_causale"]),
+    ]
+    for titolo, tabella in sezioni:
+        w_prima = 70
+        w_col = min(35, (277 - w_prima) / max(len(tabella.columns), 1))
+
+        def intestazione():
+            pdf.set_font("Arial", 'B', 8)
+            pdf.set_fill_color(230, 230, 230)
+            pdf.cell(w_prima, 7, "", 1, 0, 'C', True)
+            for col in tabella.columns:
+                pdf.cell(w_col, 7, pulisci_testo(col)[:22], 1, 0, 'C', True)
+            pdf.ln()
+            pdf.set_font("Arial", '', 8)
+
+        if pdf.get_y() > 170:
+            pdf.add_page()
+        pdf.set_font("Arial", 'B', 11)
+        pdf.cell(0, 9, titolo, ln=True)
+        intestazione()
+        for indice, riga in tabella.iterrows():
+            if pdf.get_y() > 190:
+                pdf.add_page()
+                intestazione()
+            is_totale = indice == "Totale"
+            pdf.set_font("Arial", 'B' if is_totale else '', 8)
+            pdf.cell(w_prima, 6, pulisci_testo(indice)[:45], 1, 0, 'L')
+            for valore in riga.values:
+                pdf.cell(w_col, 6, f"{valore:,.2f}", 1, 0, 'R')
+            pdf.ln()
+        pdf.ln(6)
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, f"TOTALE COMPLESSIVO: EUR {report['totale']:,.2f}", ln=True, align='R')
+    return pdf.output(dest='S').encode('latin-1', errors='replace')
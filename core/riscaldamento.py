@@ -0,0 +1,118 @@
+"""Riscaldamento delle cache all'avvio del server: un thread per processo, avviato dal primo rerun di app.py.
+
+Riempie in background, nell'ordine:
+  1. anagrafiche: replica di rubrica_clienti/agenti/listino_import, directory agenti e listino netto
+     (le ricerche di clienti e articoli e i prezzi delle righe);
+  2. vendite: dataset completo di fatturati (motore pandas) o copia Parquet locale (motore DuckDB).
+Le pagine non attendono il thread: finché una fase è in corso mostrano uno stato "in preparazione"
+(mostra_attesa) che si aggiorna da solo. Si disattiva con riscaldamento = false in [perf].
+"""
+import threading
+import time
+import streamlit as st
+
+FASI = ("anagrafiche", "vendite")
+# Secondi tra due aggiornamenti dello stato "in preparazione" nelle pagine
+INTERVALLO_ATTESA = 2
+
+
+def _config():
+    try:
+        return st.secrets.get("perf", {})
+    except Exception:
+        return {}
+
+
+class _Stato:
+    def __init__(self):
+        self.thread = None
+        self.fasi = {fase: "in attesa" for fase in FASI}
+        self.righe_vendite = 0
+        self.errori = {}
+        self.inizio = None
+        self.fine = None
+        self.lock = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def _stato():
+    return _Stato()
+
+# --- FASI ---
+def _anagrafiche():
+    from core import anagrafiche, prezzi
+    from core import agenti as directory_agenti
+    for tabella in anagrafiche.TABELLE_REPLICA:
+        anagrafiche.versione(tabella)
+    directory_agenti.get_directory_agenti()
+    prezzi.listino_netto()
+
+def _vendite(stato):
+    from core import analitica, dataset_vendite
+
+    def avanzamento(righe):
+        stato.righe_vendite = righe
+
+    motore = analitica.motore()
+    if motore == "duckdb":
+        analitica.versione_dati(avanzamento)
+    elif motore == "pandas" and dataset_vendite.progressivo():
+        # Solo il dataset completo: le fette degli agenti si ricavano da questo senza altri download.
+        # A blocchi, così la dashboard mostra i dati parziali invece di attendere la fine del riscaldamento
+        if not dataset_vendite.in_memoria(None):
+            dataset_vendite.carica_progressivo(None, avanzamento)
+    elif motore == "pandas":
+        dataset_vendite.fatturati(None, avanzamento)
+
+def _esegui(stato):
+    stato.inizio = time.time()
+    for fase, funzione in (("anagrafiche", _anagrafiche), ("vendite", lambda: _vendite(stato))):
+        stato.fasi[fase] = "in corso"
+        try:
+            funzione()
+            stato.fasi[fase] = "completata"
+        except Exception as e:
+            # Un errore non blocca l'app: le pagine caricheranno i dati da sole al primo accesso
+            stato.fasi[fase] = "errore"
+            stato.errori[fase] = str(e)[:200]
+    stato.fine = time.time()
+
+# --- API ---
+def avvia():
+    """Da chiamare a ogni rerun di app.py: solo la prima chiamata del processo avvia il thread"""
+    stato = _stato()
+    if stato.thread is not None or not _config().get("riscaldamento", True):
+        return
+    with stato.lock:
+        if stato.thread is None:
+            stato.thread = threading.Thread(target=_esegui, args=(stato,), name="riscaldamento-cache", daemon=True)
+            stato.thread.start()
+
+def in_corso(fase=None):
+    """True se il riscaldamento sta ancora preparando la fase indicata (o una qualsiasi)"""
+    stato = _stato()
+    if stato.thread is None or not stato.thread.is_alive():
+        return False
+    fasi = [fase] if fase else FASI
+    return any(stato.fasi[f] in ("in attesa", "in corso") for f in fasi)
+
+def riepilogo():
+    """Testo breve per il pannello performance; None se il riscaldamento non è stato avviato"""
+    stato = _stato()
+    if stato.thread is None:
+        return None
+    if stato.fine is None:
+        return "Riscaldamento cache: " + ", ".join(f"{f} {s}" for f, s in stato.fasi.items())
+    testo = f"Riscaldamento cache: completato in {stato.fine - stato.inizio:,.1f} s"
+    if stato.errori:
+        testo += " | errori: " + "; ".join(f"{f}: {e}" for f, e in stato.errori.items())
+    return testo
+
+@st.fragment(run_every=INTERVALLO_ATTESA)
+def mostra_attesa(fase, messaggio):
+    """Stato "in preparazione" non bloccante: quando la fase finisce riesegue la pagina"""
+    if not in_corso(fase):
+        st.rerun()
+    stato = _stato()
+    dettaglio = f" ({stato.righe_vendite:,} record finora)" if fase == "vendite" and stato.righe_vendite else ""
+    st.info(f"⏳ {messaggio}{dettaglio}. La pagina si aggiornerà da sola.")
@@ -0,0 +1,277 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+import streamlit as st
+
+# Stesso "tipo" di query ripetuto almeno tante volte nello stesso rerun = sospetto N+1
+SOGLIA_N_PIU_1 = 5
+# Reruns conservati nello storico della sessione
+STORICO_RERUN = 20
+# Metodi dello storage che fanno traffico di rete (get_public_url è solo un calcolo locale)
+METODI_STORAGE_RETE = {"upload", "download", "remove", "list", "update", "move", "copy"}
+# Filtri di cui nella "firma" della query si tiene la colonna ma non il valore
+_OPERAZIONI_CON_COLONNA = {"eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "in_", "is_",
+                           "contains", "order", "filter"}
+_OPERAZIONI_SENZA_VALORI = {"insert", "update", "upsert", "delete", "range", "limit", "or_", "rpc"}
+
+# Chiamate fatte fuori da uno script Streamlit (thread di background, warm-up...)
+_TRACCE_BACKGROUND = deque(maxlen=200)
+
+# --- 1. CONFIGURAZIONE ([perf] nei secrets) ---
+def _config():
+    try:
+        return st.secrets.get("perf", {})
+    except Exception:
+        return {}
+
+def tracing_abilitato():
+    # Disattivato di default: si accende con [perf] tracing = true quando serve il pannello admin
+    return bool(_config().get("tracing", False))
+
+def soglia_lenta_ms():
+    return float(_config().get("soglia_lenta_ms", 500))
+
+# --- 2. RACCOLTA PER RERUN E PER PAGINA ---
+def _trace_corrente():
+    """Trace del rerun in corso per la sessione; None se non siamo nel thread di uno script"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get("_perf_trace_corrente")
+
+def inizia_rerun():
+    """Da chiamare all'inizio di ogni esecuzione di app.py: archivia il rerun precedente e ne apre uno nuovo"""
+    if "_perf_storico" not in st.session_state:
+        st.session_state["_perf_storico"] = deque(maxlen=STORICO_RERUN)
+    precedente = st.session_state.get("_perf_trace_corrente")
+    if precedente and precedente["chiamate"]:
+        st.session_state["_perf_storico"].append(precedente)
+    st.session_state["_perf_trace_corrente"] = {"inizio": time.time(), "pagina": None, "durata_ms": None, "chiamate": []}
+
+@contextmanager
+def pagina(nome):
+    """Attribuisce alla pagina (show_*) le chiamate fatte nel blocco e ne misura la durata"""
+    trace = _trace_corrente()
+    if trace is not None:
+        trace["pagina"] = nome
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace["durata_ms"] = (time.perf_counter() - t0) * 1000
+
+def _registra(chiamata):
+    trace = _trace_corrente()
+    if trace is None:
+        _TRACCE_BACKGROUND.append(chiamata)
+    else:
+        chiamata["pagina"] = trace["pagina"]
+        trace["chiamate"].append(chiamata)
+
+def _stima_bytes(data):
+    """Dimensione approssimata della risposta: la prima riga serializzata per il numero di righe
+    (serializzare l'intera risposta costerebbe quanto riceverla)"""
+    if not data:
+        return 0
+    campione = data[0] if isinstance(data, list) else data
+    try:
+        return len(json.dumps(campione, default=str)) * (len(data) if isinstance(data, list) else 1)
+    except Exception:
+        return 0
+
+def _descrivi_valore(valore):
+    testo = repr(valore)
+    return testo if len(testo) <= 60 else testo[:57] + "..."
+
+def _descrivi(operazioni):
+    """Restituisce (testo leggibile con i valori, firma senza valori per il raggruppamento)"""
+    testo, firma = [], []
+    for nome, args, kwargs in operazioni:
+        parti = [_descrivi_valore(a) for a in args] + [f"{k}={_descrivi_valore(v)}" for k, v in kwargs.items()]
+        testo.append(f"{nome}({', '.join(parti)})")
+        if nome in _OPERAZIONI_SENZA_VALORI:
+            firma.append(nome)
+        elif nome in _OPERAZIONI_CON_COLONNA and args:
+            firma.append(f"{nome}({args[0]})")
+        else:
+            firma.append(f"{nome}({', '.join(parti)})")
+    return " · ".join(testo), " · ".join(firma)
+
+# --- 3. WRAPPER DEL CLIENT ---
+class _BuilderTracciato:
+    """Avvolge un builder postgrest: registra le operazioni della catena e misura execute()"""
+
+    def __init__(self, builder, tabella, operazioni):
+        self._builder = builder
+        self._tabella = tabella
+        self._operazioni = operazioni
+
+    def _avvolgi(self, risultato, operazione):
+        if hasattr(risultato, "execute") or hasattr(risultato, "select"):
+            return _BuilderTracciato(risultato, self._tabella, self._operazioni + [operazione])
+        return risultato
+
+    def __getattr__(self, nome):
+        attr = getattr(self._builder, nome)
+        if not callable(attr):
+            return self._avvolgi(attr, (nome, (), {}))
+
+        def metodo(*args, **kwargs):
+            return self._avvolgi(attr(*args, **kwargs), (nome, args, kwargs))
+        return metodo
+
+    def execute(self):
+        testo, firma = _descrivi(self._operazioni)
+        chiamata = {"tipo": "postgrest", "tabella": self._tabella, "operazioni": testo,
+                    "firma": f"{self._tabella} · {firma}", "paginata": any(op[0] == "range" for op in self._operazioni),
+                    "righe": 0, "bytes": 0, "ms": 0.0, "errore": None}
+        t0 = time.perf_counter()
+        try:
+            res = self._builder.execute()
+        except Exception as e:
+            chiamata["errore"] = str(e)[:200]
+            raise
+        finally:
+            chiamata["ms"] = (time.perf_counter() - t0) * 1000
+            _registra(chiamata)
+        data = getattr(res, "data", None)
+        chiamata["righe"] = len(data) if isinstance(data, list) else (1 if data else 0)
+        chiamata["bytes"] = _stima_bytes(data)
+        return res
+
+class _BucketTracciato:
+    def __init__(self, bucket, nome_bucket):
+        self._bucket = bucket
+        self._nome_bucket = nome_bucket
+
+    def __getattr__(self, nome):
+        attr = getattr(self._bucket, nome)
+        if nome not in METODI_STORAGE_RETE or not callable(attr):
+            return attr
+
+        def metodo(*args, **kwargs):
+            file = kwargs.get("file", args[1] if len(args) > 1 else None)
+            path = kwargs.get("path", args[0] if args else "")
+            chiamata = {"tipo": "storage", "tabella": f"storage:{self._nome_bucket}",
+                        "operazioni": f"{nome}({_descrivi_valore(path)})", "firma": f"storage:{self._nome_bucket} · {nome}",
+                        "paginata": False, "righe": 0, "bytes": len(file) if isinstance(file, (bytes, bytearray)) else 0,
+                        "ms": 0.0, "errore": None}
+            t0 = time.perf_counter()
+            try:
+                risultato = attr(*args, **kwargs)
+            except Exception as e:
+                chiamata["errore"] = str(e)[:200]
+                raise
+            finally:
+                chiamata["ms"] = (time.perf_counter() - t0) * 1000
+                _registra(chiamata)
+            if isinstance(risultato, (bytes, bytearray)):
+                chiamata["bytes"] = len(risultato)
+            return risultato
+        return metodo
+
+class _StorageTracciato:
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, nome_bucket):
+        return _BucketTracciato(self._storage.from_(nome_bucket), nome_bucket)
+
+    def __getattr__(self, nome):
+        return getattr(self._storage, nome)
+
+class ClientTracciato:
+    """Stessa interfaccia del client Supabase, con tracciamento di tutte le chiamate PostgREST e Storage"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, nome):
+        return _BuilderTracciato(self._client.table(nome), nome, [])
+
+    def from_(self, nome):
+        return self.table(nome)
+
+    def rpc(self, fn, *args, **kwargs):
+        return _BuilderTracciato(self._client.rpc(fn, *args, **kwargs), f"rpc:{fn}", [("rpc", args, kwargs)])
+
+    @property
+    def storage(self):
+        return _StorageTracciato(self._client.storage)
+
+    def __getattr__(self, nome):
+        return getattr(self._client, nome)
+
+# --- 4. ANALISI E PANNELLO ---
+def analizza(chiamate):
+    """Restituisce (gruppi N+1, chiamate lente) per una lista di chiamate dello stesso rerun"""
+    gruppi = {}
+    for c in chiamate:
+        # Le letture paginate ripetono per costruzione la stessa query: non sono N+1
+        if not c["paginata"]:
+            gruppi.setdefault((c["pagina"], c["firma"]), []).append(c)
+    n_piu_1 = [
+        {"pagina": pagina, "firma": firma, "volte": len(cs), "ms": sum(c["ms"] for c in cs)}
+        for (pagina, firma), cs in gruppi.items() if len(cs) >= SOGLIA_N_PIU_1
+    ]
+    soglia = soglia_lenta_ms()
+    lente = [c for c in chiamate if c["ms"] >= soglia]
+    return sorted(n_piu_1, key=lambda g: -g["volte"]), lente
+
+def mostra_pannello(contenitore):
+    """Pannello (solo admin) con le chiamate del rerun corrente, i sospetti N+1 e le query lente"""
+    import pandas as pd
+
+    trace = st.session_state.get("_perf_trace_corrente")
+    if not trace:
+        return
+    chiamate = trace["chiamate"]
+    storico = list(st.session_state.get("_perf_storico", []))
+
+    with contenitore:
+        with st.expander("⏱️ Performance Query", expanded=False):
+            tot_ms = sum(c["ms"] for c in chiamate)
+            tot_kb = sum(c["bytes"] for c in chiamate) / 1024
+            durata = f"{trace['durata_ms']:,.0f} ms" if trace["durata_ms"] is not None else "-"
+            st.caption(f"Pagina: **{trace['pagina'] or '-'}** | Rerun: {durata}")
+            st.caption(f"{len(chiamate)} chiamate | {tot_ms:,.0f} ms in rete | {tot_kb:,.1f} KB (stima)")
+            from core import grafici
+            cache_grafici = grafici.statistiche()
+            st.caption(f"Cache grafici: {cache_grafici['voci']} voci | {cache_grafici['hit']} hit / {cache_grafici['miss']} miss")
+            from core import analitica, riscaldamento
+            if riscaldamento.riepilogo():
+                st.caption(riscaldamento.riepilogo())
+            if analitica.motore() == "rpc":
+                st.caption("Motore analitico: funzione vendite_aggregati nel database (RPC)")
+            elif analitica.attivo():
+                copia = analitica.statistiche()
+                st.caption(f"Motore analitico: DuckDB su Parquet locale ({copia['righe']:,} righe scaricate, versione {copia['versione']})")
+
+            n_piu_1, lente = analizza(chiamate)
+            for g in n_piu_1:
+                st.warning(f"N+1: {g['volte']}× `{g['firma']}` ({g['ms']:,.0f} ms)")
+            for c in lente:
+                st.warning(f"Lenta: `{c['operazioni']}` su {c['tabella']} ({c['ms']:,.0f} ms)")
+
+            if chiamate:
+                df = pd.DataFrame(chiamate)
+                df["KB"] = df["bytes"] / 1024
+                st.dataframe(df[["tabella", "operazioni", "righe", "KB", "ms", "errore"]],
+                             hide_index=True, use_container_width=True,
+                             column_config={"KB": st.column_config.NumberColumn(format="%.1f"),
+                                            "ms": st.column_config.NumberColumn(format="%.0f")})
+
+            if storico:
+                st.markdown("**Reruns precedenti**")
+                st.dataframe(pd.DataFrame([{
+                    "pagina": t["pagina"], "chiamate": len(t["chiamate"]),
+                    "ms rete": round(sum(c["ms"] for c in t["chiamate"])),
+                    "KB": round(sum(c["bytes"] for c in t["chiamate"]) / 1024, 1),
+                    "N+1": len(analizza(t["chiamate"])[0]),
+                } for t in reversed(storico)]), hide_index=True, use_container_width=True)
+
+            if _TRACCE_BACKGROUND:
+                st.caption(f"Chiamate in background (ultime {len(_TRACCE_BACKGROUND)}): "
+                           f"{sum(c['ms'] for c in _TRACCE_BACKGROUND):,.0f} ms totali")
@@ -0,0 +1,135 @@
+import pandas as pd
+
+# Funzioni pure (niente Streamlit) dietro i grafici di Dashboard e Analisi Clienti:
+# sono le stesse usate da bench/bench_vendite.py per misurare tempi e memoria.
+
+# Colonne lette da load_all_data (dashboard)
+COLONNE_FATTURATI = "AnnoRif,MeseRif,AgenteDoc,Cliente,ImportoNettoRiga,Merceologica,CodArt,IdAgenteDoc,Famiglia"
+NOMI_MESI = {"01":"Gen","02":"Feb","03":"Mar","04":"Apr","05":"Mag","06":"Giu","07":"Lug","08":"Ago","09":"Set","10":"Ott","11":"Nov","12":"Dic"}
+
+# --- 1. NORMALIZZAZIONE ---
+def rimuovi_raee(df):
+    """Esclude le righe del contributo RAEE (non sono fatturato merce)"""
+    if "CodArt" not in df.columns:
+        return df
+    return df[~df["CodArt"].astype(str).str.upper().str.contains('RAEE', na=False)].copy()
+
+def normalizza_fatturati(df_raw):
+    """Pulizia integrale dei dati grezzi di fatturati per la dashboard"""
+    df_base = rimuovi_raee(df_raw.copy())
+
+    df_base["ImportoNettoRiga"] = pd.to_numeric(df_base["ImportoNettoRiga"], errors='coerce').fillna(0)
+    df_base["AnnoRif"] = pd.to_numeric(df_base["AnnoRif"], errors='coerce')
+    df_base["MeseRif"] = df_base["MeseRif"].astype(str).str.zfill(2)
+    df_base["IdAgenteDoc"] = df_base["IdAgenteDoc"].astype(str)
+    df_base["AgenteDoc"] = df_base["AgenteDoc"].astype(str).str.upper().str.strip()
+
+    if "Famiglia" in df_base.columns:
+        # fillna prima di astype: con pandas 3 i null restano NaN anche dopo astype(str)
+        df_base["Famiglia"] = df_base["Famiglia"].fillna("").astype(str).str.upper().str.strip()
+        df_base["Famiglia"] = df_base["Famiglia"].replace(["0", "NAN", "NONE", ""], "NON SPECIFICATO")
+    else:
+        df_base["Famiglia"] = "NON SPECIFICATO"
+    return df_base
+
+def normalizza_fatturati_cliente(df, anno):
+    """Pulizia dei dati di un singolo cliente/anno (pagina Analisi Clienti)"""
+    if df.empty:
+        return df
+    df = rimuovi_raee(df)
+    df["ImportoNettoRiga"] = pd.to_numeric(df["ImportoNettoRiga"], errors='coerce').fillna(0)
+    df["MeseRif"] = df["MeseRif"].astype(int)
+    df["AnnoRif"] = str(anno)
+    return df
+
+# --- 2. FILTRI ---
+def opzioni_filtri(df_base):
+    """(anni disponibili dal più recente, mesi, nome agente per IdAgenteDoc) per i filtri della dashboard"""
+    anni = sorted(df_base["AnnoRif"].dropna().unique().astype(int).tolist(), reverse=True)
+    mesi = sorted(df_base["MeseRif"].unique().tolist())
+    nomi = df_base.groupby("IdAgenteDoc")["AgenteDoc"].first().to_dict()
+    return anni, mesi, nomi
+
+def filtra_fatturati(df_base, anni_sel, mesi_sel=None, agente_id_sel="Tutti"):
+    df_final = df_base[df_base["AnnoRif"].isin(anni_sel)]
+    if mesi_sel:
+        df_final = df_final[df_final["MeseRif"].isin(mesi_sel)]
+    if agente_id_sel != "Tutti":
+        df_final = df_final[df_final["IdAgenteDoc"] == agente_id_sel]
+    return df_final
+
+# --- 3. AGGREGAZIONI DASHBOARD ---
+def conta_righe(df_final):
+    return len(df_final)
+
+def totali_per_anno(df_final, anni_sel):
+    """Lista di (anno, totale, delta testuale rispetto all'anno precedente selezionato)"""
+    anni_ordinati = sorted(anni_sel)
+    totali = df_final.groupby("AnnoRif")["ImportoNettoRiga"].sum()
+    risultato = []
+    for i, anno in enumerate(anni_ordinati):
+        val_attuale = totali.get(anno, 0.0)
+        delta_val = None
+        if i > 0:
+            val_prec = totali.get(anni_ordinati[i-1], 0.0)
+            if val_prec > 0:
+                variazione = ((val_attuale - val_prec) / val_prec) * 100
+                delta_val = f"{variazione:+.1f}% vs {anni_ordinati[i-1]}"
+            else:
+                delta_val = "N/A"
+        risultato.append((anno, val_attuale, delta_val))
+    return risultato
+
+def andamento_mensile(df_final):
+    res_mensile = df_final.groupby(["AnnoRif", "MeseRif"])["ImportoNettoRiga"].sum().reset_index()
+    res_mensile["AnnoRif"] = res_mensile["AnnoRif"].astype(str)
+    res_mensile["Mese"] = res_mensile["MeseRif"].map(NOMI_MESI)
+    return res_mensile.sort_values("MeseRif")
+
+def performance_agenti(df_final):
+    """Totali per agente e anno, più l'ordine degli agenti per fatturato complessivo"""
+    res_agenti = df_final.groupby(["AgenteDoc", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
+    res_agenti["AnnoRif"] = res_agenti["AnnoRif"].astype(str)
+    ordine_agenti = res_agenti.groupby("AgenteDoc")["ImportoNettoRiga"].sum().sort_values(ascending=False).index
+    return res_agenti, ordine_agenti
+
+def totali_per_colonna(df_final, colonna):
+    """Totali per colonna (Famiglia, Merceologica...) e anno, con l'anno come testo per la legenda"""
+    res = df_final.groupby([colonna, "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
+    res["AnnoRif"] = res["AnnoRif"].astype(str)
+    return res
+
+def marchi(df_final):
+    return sorted(df_final["Famiglia"].unique().tolist())
+
+def focus_marchio(df_final, marchio):
+    """Ripartizione per categoria merceologica di un marchio, con il totale del marchio"""
+    df_focus = df_final[df_final["Famiglia"] == marchio]
+    res_focus = df_focus.groupby("Merceologica")["ImportoNettoRiga"].sum().reset_index()
+    return res_focus, res_focus["ImportoNettoRiga"].sum()
+
+def top_clienti(df_final, n=30):
+    return df_final.groupby("Cliente")["ImportoNettoRiga"].sum().sort_values(ascending=False).head(n).reset_index()
+
+# --- 4. AGGREGAZIONI ANALISI CLIENTI ---
+def ordini_per_anno(df, anno):
+    """(fatturato, ordini univoci) di un anno nei dati di un cliente"""
+    df_a = df[df["AnnoRif"] == str(anno)]
+    # Ordini univoci per IdTestata (o, se manca, per la prima colonna disponibile)
+    campo_ordine = "IdTestata" if "IdTestata" in df_a.columns else df_a.columns[0]
+    return df_a['ImportoNettoRiga'].sum(), df_a[campo_ordine].nunique()
+
+def mensile_cliente(df):
+    return df.groupby(["AnnoRif", "MeseRif"])["ImportoNettoRiga"].sum().reset_index()
+
+def top_famiglie_cliente(df, n=15):
+    res_fam = df.groupby(["Famiglia", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
+    top_fam_list = res_fam.groupby("Famiglia")["ImportoNettoRiga"].sum().nlargest(n).index
+    return res_fam[res_fam["Famiglia"].isin(top_fam_list)]
+
+def merceologica_cliente(df):
+    return df.groupby(["Merceologica", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
+
+def mix_merceologico(df):
+    res = df.groupby("Merceologica")["ImportoNettoRiga"].sum().reset_index()
+    return res, res["ImportoNettoRiga"].sum()
@@ -0,0 +1,32 @@
+-- Colonna updated_at sulle anagrafiche replicate da core/anagrafiche.py.
+-- Con la colonna presente il refresh delta scarica anche le righe modificate (non solo le nuove);
+-- senza, le modifiche arrivano con la ricarica completa periodica (INTERVALLO_COMPLETO).
+create or replace function public.imposta_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+alter table public.rubrica_clienti add column if not exists updated_at timestamptz not null default now();
+alter table public.agenti add column if not exists updated_at timestamptz not null default now();
+alter table public.listino_import add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists rubrica_clienti_updated_at_idx on public.rubrica_clienti (updated_at);
+create index if not exists agenti_updated_at_idx on public.agenti (updated_at);
+create index if not exists listino_import_updated_at_idx on public.listino_import (updated_at);
+
+drop trigger if exists rubrica_clienti_updated_at on public.rubrica_clienti;
+create trigger rubrica_clienti_updated_at before update on public.rubrica_clienti
+    for each row execute function public.imposta_updated_at();
+
+drop trigger if exists agenti_updated_at on public.agenti;
+create trigger agenti_updated_at before update on public.agenti
+    for each row execute function public.imposta_updated_at();
+
+drop trigger if exists listino_import_updated_at on public.listino_import;
+create trigger listino_import_updated_at before update on public.listino_import
+    for each row execute function public.imposta_updated_at();
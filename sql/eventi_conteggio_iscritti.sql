@@ -0,0 +1,10 @@
+-- Vista con il numero di iscritti per evento, letta da views/eventi.py
+-- con un'unica query al posto di un conteggio per ogni evento.
+create or replace view public.eventi_conteggio_iscritti as
+select
+    id_evento,
+    count(*)::int as iscritti
+from public.eventi_iscrizioni
+group by id_evento;
+
+grant select on public.eventi_conteggio_iscritti to anon, authenticated;
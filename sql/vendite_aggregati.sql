@@ -0,0 +1,81 @@
+-- Aggregazioni di Dashboard e Analisi Clienti calcolate nel database (motore_analitico = "rpc" in [perf]):
+-- la pagina riceve solo le righe raggruppate invece di scaricare le righe di fatturati.
+-- Stessa pulizia di core/vendite.py (normalizza_fatturati): RAEE esclusi, Famiglia e AgenteDoc in
+-- maiuscolo, mese a due cifre. L'implementazione SQLite per il database locale è in core/db_locale.py.
+
+-- security_invoker: la vista rispetta le policy RLS di fatturati di chi la interroga
+create or replace view public.fatturati_normalizzati with (security_invoker = true) as
+select
+    f."AnnoRif"::int as "AnnoRif",
+    lpad(f."MeseRif"::text, 2, '0') as "MeseRif",
+    upper(trim(f."AgenteDoc"::text)) as "AgenteDoc",
+    f."IdAgenteDoc"::text as "IdAgenteDoc",
+    f."Cliente"::text as "Cliente",
+    f."IdAnagrafica"::text as "IdAnagrafica",
+    -- IdTestata letto dal JSON della riga: la vista funziona anche se la colonna non esiste
+    to_jsonb(f) ->> 'IdTestata' as "IdTestata",
+    case
+        when upper(trim(coalesce(f."Famiglia"::text, ''))) in ('', '0', 'NAN', 'NONE') then 'NON SPECIFICATO'
+        else upper(trim(f."Famiglia"::text))
+    end as "Famiglia",
+    f."Merceologica"::text as "Merceologica",
+    coalesce(f."ImportoNettoRiga"::numeric, 0) as "ImportoNettoRiga"
+from public.fatturati f
+where upper(coalesce(f."CodArt"::text, '')) not like '%RAEE%';
+
+-- gruppi: colonne di raggruppamento (anche vuoto = un'unica riga di totali).
+-- Ogni riga restituita è un oggetto JSON con le colonne di gruppo, "ImportoNettoRiga" (somma),
+-- "righe" (conteggio) e "ordini" (IdTestata distinti, o righe se manca; null se con_ordini = false).
+-- Con limite: solo le prime righe per importo decrescente (es. top clienti).
+create or replace function public.vendite_aggregati(
+    gruppi text[] default '{}',
+    anni int[] default null,
+    mesi text[] default null,
+    id_agente text default null,
+    id_cliente text default null,
+    marchio text default null,
+    limite int default null,
+    con_ordini boolean default false
+)
+returns setof jsonb
+language plpgsql
+stable
+as $$
+declare
+    colonne text;
+begin
+    if exists (
+        select 1 from unnest(gruppi) g
+        where g <> all (array['AnnoRif', 'MeseRif', 'AgenteDoc', 'IdAgenteDoc', 'Cliente', 'IdAnagrafica', 'Famiglia', 'Merceologica'])
+    ) then
+        raise exception 'Colonna di raggruppamento non ammessa in %', gruppi;
+    end if;
+    select string_agg(format('%I', g), ', ') into colonne from unnest(gruppi) g;
+
+    return query execute format(
+        'select to_jsonb(r) from (
+            select %s sum("ImportoNettoRiga") as "ImportoNettoRiga", count(*)::int as righe, %s as ordini
+            from public.fatturati_normalizzati
+            where ($1 is null or "AnnoRif" = any($1))
+              and ($2 is null or "MeseRif" = any($2))
+              and ($3 is null or "IdAgenteDoc" = $3)
+              and ($4 is null or "IdAnagrafica" = $4)
+              and ($5 is null or "Famiglia" = $5)
+            %s %s
+        ) r',
+        coalesce(colonne || ',', ''),
+        case when con_ordini
+            then 'case when count("IdTestata") > 0 then count(distinct "IdTestata") else count(*) end'
+            else 'null::int' end,
+        coalesce('group by ' || colonne, ''),
+        case when limite is null then '' else format('order by "ImportoNettoRiga" desc limit %s', limite) end
+    ) using anni, mesi, id_agente, id_cliente, marchio;
+end;
+$$;
+
+-- Filtri più frequenti: anno (+ agente) per la dashboard, cliente (+ anno) per Analisi Clienti
+create index if not exists fatturati_anno_agente on public.fatturati ("AnnoRif", "IdAgenteDoc");
+create index if not exists fatturati_cliente_anno on public.fatturati ("IdAnagrafica", "AnnoRif");
+
+grant select on public.fatturati_normalizzati to anon, authenticated;
+grant execute on function public.vendite_aggregati(text[], int[], text[], text, text, text, int, boolean) to anon, authenticated;
@@ -1,61 +1,47 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client
 from datetime import datetime
-from fpdf import FPDF
 from streamlit_searchbox import st_searchbox
 import io
 import os
 import time
 import base64
+from core.db import get_supabase_client, leggi_paginato
+from core import anagrafiche, griglia_righe, prezzi
+from core.prezzi import calcola_netto
 
-# --- CONFIGURAZIONE PAGINA ---
-st.markdown("""
+# --- CONFIGURAZIONE PAGINA (applicata da show_archivio) ---
+STILE_PAGINA = """
     <style>
     .main h1 { font-size: 1.8rem !important; margin-bottom: 0.5rem !important; }
     .stMetric { background-color: #f8f9fa; padding: 10px; border-radius: 10px; border: 1px solid #ddd; }
     .config-card { background-color: #f1f3f6; padding: 20px; border-radius: 12px; border-left: 6px solid #ff4b4b; margin: 15px 0; }
     .stButton button { border-radius: 8px; font-weight: bold; }
     </style>
-    """, unsafe_allow_html=True)
+    """
 
-# --- 1. CONNESSIONE ---
-def get_supabase_client():
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    return create_client(url, key)
-
-supabase = get_supabase_client()
-
-# --- 2. FUNZIONI DI RICERCA SERVER-SIDE ---
+# --- 2. FUNZIONI DI RICERCA (REPLICA LOCALE DELLE ANAGRAFICHE) ---
 def search_clients_arc(search_term: str):
     if not search_term or len(search_term) < 2:
         return []
     user_data = st.session_state.get('user_info', {})
-    query = supabase.table("rubrica_clienti").select("id, ragione_sociale, citta")
+    filtri = {}
     if user_data.get("ruolo") == "agente":
-        ag_id = str(user_data.get("agente_corrispondente", "")).strip()
-        query = query.eq("id_agente", ag_id)
-    res = query.ilike("ragione_sociale", f"%{search_term}%").limit(15).execute()
-    if not res.data: return []
-    return [(f"{row['ragione_sociale']} ({row.get('citta', '')})", row['id']) for row in res.data]
+        filtri["id_agente"] = str(user_data.get("agente_corrispondente", "")).strip()
+    trovati = anagrafiche.cerca("rubrica_clienti", search_term, ["ragione_sociale"], uguali=filtri, limite=15)
+    return [(f"{row['ragione_sociale']} ({row.get('citta', '')})", row['id']) for row in trovati]
 
 def search_articles_arc(search_term: str):
     if not search_term or len(search_term) < 3:
         return []
-    res = supabase.table("listino_import")\
-        .select("CODICE, DESCRIZIONE, PREZZO, SCONTO1, SCONTO2, SCONTO3")\
-        .or_(f"CODICE.ilike.%{search_term}%,DESCRIZIONE.ilike.%{search_term}%")\
-        .limit(20).execute()
-    if not res.data: return []
-    return [(f"{row['CODICE']} | {row['DESCRIZIONE'][:70]}...", row) for row in res.data]
+    trovati = anagrafiche.cerca("listino_import", search_term, ["CODICE", "DESCRIZIONE"], limite=20)
+    return [(f"{row['CODICE']} | {row['DESCRIZIONE'][:70]}...", row) for row in trovati]
 
 # --- 3. GESTIONE DATI ---
-def carica_preventivo(id_preventivo):
-    testata = supabase.table("preventivi_testata").select("*").eq("id", id_preventivo).single().execute()
-    righe = supabase.table("preventivi_righe").select("*").eq("id_preventivo", id_preventivo).order("id").execute()
+def righe_db_to_sessione(righe_db):
+    """Converte le righe lette da 'preventivi_righe' nel formato usato in session_state"""
     session_righe = []
-    for r in righe.data:
+    for r in righe_db:
         if r['nota_riga'] == 'NOTA_TESTO':
             session_righe.append({"tipo": "NOTA_TESTO", "DESCRIZIONE": r['descrizione']})
         else:
@@ -68,9 +54,32 @@ def carica_preventivo(id_preventivo):
                 "S1": float(r['sconto_1'] or 0), "S2": float(r['sconto_2'] or 0), "S3": float(r['sconto_3'] or 0),
                 "NOTA": r['nota_riga'] if r['nota_riga'] != 'NOTA_TESTO' else ""
             })
-    return testata.data, session_righe
+    return session_righe
+
+@st.cache_data(ttl=120, show_spinner=False)
+def prefetch_righe_preventivi(ids_preventivi):
+    """Scarica con un'unica query 'in_' le righe di tutti i preventivi visibili nella pagina"""
+    supabase = get_supabase_client()
+    righe_per_doc = {id_p: [] for id_p in ids_preventivi}
+    if not ids_preventivi:
+        return righe_per_doc
+    righe = leggi_paginato(lambda: supabase.table("preventivi_righe").select("*")
+                           .in_("id_preventivo", list(ids_preventivi)).order("id"))
+    for r in righe:
+        righe_per_doc.setdefault(r['id_preventivo'], []).append(r)
+    return righe_per_doc
+
+def carica_preventivo(id_preventivo, testata=None, righe_db=None):
+    """Restituisce testata e righe; se già disponibili (riga della lista e prefetch) evita le query"""
+    supabase = get_supabase_client()
+    if testata is None:
+        testata = supabase.table("preventivi_testata").select("*").eq("id", id_preventivo).single().execute().data
+    if righe_db is None:
+        righe_db = supabase.table("preventivi_righe").select("*").eq("id_preventivo", id_preventivo).order("id").execute().data
+    return testata, righe_db_to_sessione(righe_db)
 
 def trasforma_in_ordine(id_preventivo):
+    supabase = get_supabase_client()
     try:
         ora_attuale = datetime.now().isoformat()
         supabase.table("preventivi_testata").update({
@@ -81,10 +90,11 @@ def trasforma_in_ordine(id_preventivo):
     except Exception as e: 
         return str(e)
 
-def duplica_preventivo(id_preventivo_originale):
+def duplica_preventivo(id_preventivo_originale, testata=None, righe_db=None):
+    supabase = get_supabase_client()
     try:
-        # Recupera dati esistenti
-        testata, righe = carica_preventivo(id_preventivo_originale)
+        # Recupera dati esistenti (dalla pagina se già prefetchati)
+        testata, righe = carica_preventivo(id_preventivo_originale, testata, righe_db)
         
         # Genera nuovo numero (suffisso temporale per evitare duplicati ID)
         nuovo_numero = f"{testata['numero_preventivo']}_CLONE_{datetime.now().strftime('%H%M%S')}"
@@ -123,6 +133,7 @@ def duplica_preventivo(id_preventivo_originale):
         return str(e)
 
 def aggiorna_preventivo_db(id_preventivo, info_testata, righe):
+    supabase = get_supabase_client()
     try:
         supabase.table("preventivi_testata").update(info_testata).eq("id", id_preventivo).execute()
         supabase.table("preventivi_righe").delete().eq("id_preventivo", id_preventivo).execute()
@@ -136,6 +147,10 @@ def aggiorna_preventivo_db(id_preventivo, info_testata, righe):
             "nota_riga": r.get('tipo', r.get('NOTA', ''))
         } for r in righe]
         supabase.table("preventivi_righe").insert(righe_db).execute()
+        prefetch_righe_preventivi.clear()
+        # Un ordine ripristinato a preventivo e modificato torna poi nell'Archivio Ordini
+        from views.ordinato import prefetch_righe_ordini
+        prefetch_righe_ordini.clear()
         return True
     except Exception as e: return str(e)
 
@@ -149,15 +164,59 @@ def format_sconti_string(s1, s2, s3):
         except: continue
     return "+".join(parts) if parts else "-"
 
-def calcola_netto(listino, s1, s2, s3):
-    return float(listino) * (1 - float(s1 or 0)/100) * (1 - float(s2 or 0)/100) * (1 - float(s3 or 0)/100)
+def conta_righe_pdf(pdf, w, h, testo):
+    """Righe occupate da una multi_cell di larghezza w, senza stamparla.
+
+    Con fpdf2 usa la misura nativa (dry_run); con PyFPDF 1.7 (pacchetto 'fpdf', che non ha split_only)
+    replica l'a-capo di multi_cell sulle larghezze dei caratteri del font corrente.
+    """
+    try:
+        return len(pdf.multi_cell(w, h, testo, dry_run=True, output="LINES"))
+    except TypeError:
+        pass
+
+    # Stesso algoritmo di FPDF.multi_cell 1.7: larghezze in millesimi della dimensione del font
+    larghezze = pdf.current_font['cw']
+    l_max = (w - 2 * pdf.c_margin) * 1000 / pdf.font_size
+    s = str(testo).replace("\r", "")
+    fine = len(s) - 1 if s.endswith("\n") else len(s)
+    sep, i, inizio, occupata, righe = -1, 0, 0, 0, 1
+    while i < fine:
+        c = s[i]
+        if c == "\n":
+            i += 1; sep = -1; inizio = i; occupata = 0; righe += 1
+            continue
+        if c == " ": sep = i
+        occupata += larghezze.get(c, 0)
+        if occupata > l_max:
+            # A capo all'ultimo spazio; se la parola è più lunga della cella, a capo sul carattere
+            if sep == -1:
+                if i == inizio: i += 1
+            else:
+                i = sep + 1
+            sep = -1; inizio = i; occupata = 0; righe += 1
+        else:
+            i += 1
+    return righe
 
 def genera_pdf_ordine(cliente_ragione_sociale, testata, righe):
+    from fpdf import FPDF
+
     def pulisci_testo(testo):
         if not testo: return ""
         temp = str(testo).encode('latin-1', 'replace').decode('latin-1')
         return temp.replace('?', ' ')
 
+    # Righe senza prezzo di listino (documenti vecchi): una sola lookup sul listino in cache per tutte
+    listino_mancante = {}
+    codici_senza_listino = [r.get('CODICE') for r in righe if r.get('tipo') != 'NOTA_TESTO' and not r.get('PREZZO_LISTINO')]
+    if codici_senza_listino:
+        try:
+            trovati = prezzi.prezzi_per_codici(codici_senza_listino)
+            listino_mancante = dict(zip(codici_senza_listino, trovati["PREZZOLISTINO"].fillna(0.0)))
+        except Exception:
+            pass
+
     pdf = FPDF(orientation='P', unit='mm', format='A4')
     pdf.set_auto_page_break(auto=False)
     pdf.add_page()
@@ -213,7 +272,7 @@ def genera_pdf_ordine(cliente_ragione_sociale, testata, righe):
     for r in righe:
         if r.get('tipo') == 'NOTA_TESTO':
             testo_nota = pulisci_testo(r['DESCRIZIONE']).upper()
-            line_count = len(pdf.multi_cell(180, 6, testo_nota, split_only=True))
+            line_count = conta_righe_pdf(pdf, 180, 6, testo_nota)
             h_nota = max(line_count * 6, 8)
             
             if pdf.get_y() + h_nota > 270:
@@ -225,14 +284,14 @@ def genera_pdf_ordine(cliente_ragione_sociale, testata, righe):
             pdf.set_font("Arial", '', 8)
             
         else:
-            p_listino = float(r.get('PREZZO_LISTINO') or 0)
+            p_listino = float(r.get('PREZZO_LISTINO') or listino_mancante.get(r.get('CODICE')) or 0)
             p_l, p_u = float(r['PREZZO_LORDO']), (0.0 if r['SCONTO_MERCE'] else float(r['PREZZO_NETTO']))
             s_str = "OMAGGIO" if r['SCONTO_MERCE'] else format_sconti_string(r['S1'], r['S2'], r['S3'])
             
             desc_testo = pulisci_testo(r['DESCRIZIONE'])
             if r.get('NOTA'): desc_testo += pulisci_testo(f"\nNote: {r['NOTA']}")
             
-            line_count = len(pdf.multi_cell(45, 4.5, desc_testo, split_only=True))
+            line_count = conta_righe_pdf(pdf, 45, 4.5, desc_testo)
             h_riga = max(line_count * 4.5 + 2, 8)
             
             if pdf.get_y() + h_riga > 270:
@@ -289,6 +348,8 @@ def genera_pdf_ordine(cliente_ragione_sociale, testata, righe):
 
 # --- 5. INTERFACCIA PRINCIPALE ---
 def show_archivio():
+    supabase = get_supabase_client()
+    st.markdown(STILE_PAGINA, unsafe_allow_html=True)
     st.subheader("📁 Archivio Preventivi")
     
     if 'edit_id' not in st.session_state: st.session_state.edit_id = None
@@ -315,7 +376,11 @@ def show_archivio():
         if not prev_data.data:
             st.info("Nessun preventivo in bozza trovato.")
         else:
+            # Prefetch delle righe di tutta la pagina: EDIT/PDF/COPIA non interrogano più il DB
+            righe_pagina = prefetch_righe_preventivi(tuple(row['id'] for row in prev_data.data))
+
             for row in prev_data.data:
+                righe_row = righe_pagina.get(row['id'])
                 data_f = datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')).strftime('%d/%m/%Y')
                 label = f"📄 {row['numero_preventivo']} | {row['ragione_sociale_cliente']} | € {row['totale_netto']:,.2f} | {data_f}"
                 
@@ -327,15 +392,16 @@ def show_archivio():
                     c1.markdown(f"**Rif:** {row['riferimento'] or '-'}")
                     
                     if c_edit.button("✏️ EDIT", key=f"ed_{row['id']}", use_container_width=True):
-                        testata, righe = carica_preventivo(row['id'])
+                        testata, righe = carica_preventivo(row['id'], testata=row, righe_db=righe_row)
                         st.session_state.edit_id = row['id']
                         st.session_state.edit_testata = testata
                         st.session_state.righe_archivio = righe
+                        griglia_righe.azzera_selezione("righe_archivio")
                         st.rerun()
 
                     if c_copy.button("👯 COPIA", key=f"cp_{row['id']}", use_container_width=True):
                         with st.spinner("..."):
-                            res_copy = duplica_preventivo(row['id'])
+                            res_copy = duplica_preventivo(row['id'], testata=row, righe_db=righe_row)
                             if res_copy is True:
                                 st.success("OK")
                                 time.sleep(1)
@@ -349,7 +415,7 @@ def show_archivio():
                     if c_pdf.button("📄 PDF", key=f"btn_gen_{row['id']}", use_container_width=True):
                         with st.spinner("..."):
                             st.session_state.opened_expander_id = row['id'] 
-                            _, r_pdf = carica_preventivo(row['id'])
+                            _, r_pdf = carica_preventivo(row['id'], testata=row, righe_db=righe_row)
                             pdf_bytes = genera_pdf_ordine(row['ragione_sociale_cliente'], row, r_pdf)
                             st.session_state[pdf_key] = base64.b64encode(pdf_bytes).decode()
                             st.rerun()
@@ -431,21 +497,13 @@ def show_archivio():
                 if st.button("Annulla"): st.session_state.temp_item_arc = None; r.rerun()
                 st.markdown('</div>', unsafe_allow_html=True)
 
-        tot_n = 0.0
-        for idx, r in enumerate(st.session_state.righe_archivio):
-            with st.container(border=True):
-                c1, c2, c3 = st.columns([3, 1, 0.8])
-                if r.get('tipo') == 'NOTA_TESTO': c1.markdown(f"**🗒️ NOTA:** {r['DESCRIZIONE']}")
-                else:
-                    val = r['PREZZO_NETTO'] * r['QTA']; tot_n += val
-                    c1.markdown(f"**{r['CODICE']}** - {r['DESCRIZIONE']}"); c1.caption(f"Sconti: {format_sconti_string(r['S1'], r['S2'], r['S3'])}")
-                    c2.markdown(f"**€ {val:,.2f}**")
-                b1, b2 = c3.columns(2)
-                if b1.button("✏️", key=f"e_{idx}"): st.session_state.temp_item_arc = st.session_state.righe_archivio.pop(idx); st.rerun()
-                if b2.button("🗑️", key=f"d_{idx}"): st.session_state.righe_archivio.pop(idx); st.rerun()
-
-        st.divider(); st.metric("TOTALE", f"€ {tot_n:,.2f}")
+        # Griglia modificabile delle righe (fragment): quando cambia il totale riesegue tutta la pagina
+        if st.session_state.righe_archivio:
+            griglia_righe.editor_righe("righe_archivio")
+
+        st.divider(); st.metric("TOTALE", f"€ {griglia_righe.totale_righe(st.session_state.righe_archivio):,.2f}")
         if st.button("💾 SALVA MODIFICHE", type="primary", use_container_width=True):
+            tot_n = griglia_righe.totale_righe(st.session_state.righe_archivio)
             upd = {"totale_netto": tot_n, "data_consegna": str(data_cons) if data_cons else None, "riferimento": rif_ordine}
             if aggiorna_preventivo_db(st.session_state.edit_id, upd, st.session_state.righe_archivio) is True:
                 st.success("Documento updated!"); time.sleep(1); st.session_state.edit_id = None; st.rerun()
@@ -1,12 +1,65 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import time
 from streamlit_searchbox import st_searchbox
-from st_supabase_connection import SupabaseConnection
 from datetime import date
+from core.db import get_supabase_client, in_parallelo
+from core import vendite, anagrafiche, grafici, analitica, riscaldamento, cache_condivisa
+from core.cache_condivisa import CacheCondivisa
+
+# --- CACHE DEI DATI CLIENTE ---
+# Condivise tra le sessioni: scaduto il TTL si servono i dati precedenti mentre i nuovi arrivano in background
+TTL_CLIENTE = 600
+
+def _carica_anni(codice_cliente, avanzamento=None):
+    creato = time.time()
+    conn = get_supabase_client()
+    res = conn.table("fatturati").select("AnnoRif").eq("IdAnagrafica", codice_cliente).execute()
+    res_2026 = conn.table("fatturati").select("AnnoRif").eq("IdAnagrafica", codice_cliente).eq("AnnoRif", 2026).limit(1).execute()
+    anni = [d['AnnoRif'] for d in res.data] if res.data else []
+    if res_2026.data: anni.append(2026)
+    return sorted(list(set([int(a) for a in anni])), reverse=True), creato
+
+def _carica_anno(chiave, avanzamento=None):
+    codice_cliente, anno = chiave
+    creato = time.time()
+    res = get_supabase_client().table("fatturati").select("*").eq("IdAnagrafica", codice_cliente).eq("AnnoRif", int(anno)).limit(3000).execute()
+    return vendite.normalizza_fatturati_cliente(pd.DataFrame(res.data), anno), creato
+
+@st.cache_resource(show_spinner=False)
+def _cache_clienti():
+    return {"anni": CacheCondivisa("anni-cliente", _carica_anni, TTL_CLIENTE, max_voci=500),
+            "dati": CacheCondivisa("dati-cliente", _carica_anno, TTL_CLIENTE, max_voci=500)}
+
+def get_cliente_years(codice_cliente):
+    return _cache_clienti()["anni"].leggi(codice_cliente)
+
+def get_data_for_single_year(codice_cliente, anno):
+    """(DataFrame dell'anno, creato)"""
+    return _cache_clienti()["dati"].leggi_voce((codice_cliente, int(anno)))
+
+def stato_dati_cliente(codice_cliente, anni, motore_sql, admin):
+    """Età dei dati del cliente (la voce più vecchia tra anni e dati per anno) e aggiornamento manuale per l'admin"""
+    if motore_sql:
+        creato, in_rinnovo = analitica.aggiornamento()
+        rinnova = analitica.rinnova
+    else:
+        cache = _cache_clienti()
+        voci = [(cache["anni"], codice_cliente)] + [(cache["dati"], (codice_cliente, int(a))) for a in anni]
+        presenti = [(c, k, c.voce(k)) for c, k in voci]
+        istanti = [v[1] for _, _, v in presenti if v is not None]
+        creato = min(istanti) if istanti else None
+        in_rinnovo = any(c.rinnovo_in_corso(k) for c, k in voci)
+        def rinnova():
+            for c, k, v in presenti:
+                if v is not None:
+                    c.rinnova(k)
+    cache_condivisa.mostra_stato(creato, in_rinnovo, rinnova if admin and creato else None, key="aggiorna_dati_cliente")
 
 def show_clienti():
+    # plotly viene caricato solo quando la pagina viene aperta
+    import plotly.express as px
+
     # --- 1. ACCESSO E CONNESSIONE ---
     if 'user_info' not in st.session_state:
         st.error("Effettua il login per accedere.")
@@ -16,40 +69,16 @@ def show_clienti():
     my_agente_id = str(user_data.get("agente_corrispondente", "")).strip()
     ruolo = user_data.get("ruolo")
 
-    conn = st.connection(
-        "supabase",
-        type=SupabaseConnection,
-        url=st.secrets["connections"]["supabase"]["url"],
-        key=st.secrets["connections"]["supabase"]["key"]
-    )
+    conn = get_supabase_client()
+    # Motore SQL (DuckDB sulla copia Parquet locale o RPC nel database): anni e aggregazioni del cliente in SQL
+    motore_sql = analitica.attivo()
 
     # --- 2. FUNZIONI DI RECUPERO DATI ---
     def search_clienti(search_term: str):
         if not search_term or len(search_term) < 2: return []
-        query = conn.table("rubrica_clienti").select("ragione_sociale, id_cliente")
-        if ruolo == "agente": 
-            query = query.eq("id_agente", my_agente_id)
-        res = query.ilike("ragione_sociale", f"%{search_term}%").limit(15).execute()
-        return [(d["ragione_sociale"], d["id_cliente"]) for d in res.data] if res.data else []
-
-    @st.cache_data(ttl=600)
-    def get_cliente_years(codice_cliente):
-        res = conn.table("fatturati").select("AnnoRif").eq("IdAnagrafica", codice_cliente).execute()
-        res_2026 = conn.table("fatturati").select("AnnoRif").eq("IdAnagrafica", codice_cliente).eq("AnnoRif", 2026).limit(1).execute()
-        anni = [d['AnnoRif'] for d in res.data] if res.data else []
-        if res_2026.data: anni.append(2026)
-        return sorted(list(set([int(a) for a in anni])), reverse=True)
-
-    @st.cache_data(ttl=600)
-    def get_data_for_single_year(codice_cliente, anno):
-        res = conn.table("fatturati").select("*").eq("IdAnagrafica", codice_cliente).eq("AnnoRif", int(anno)).limit(3000).execute()
-        df = pd.DataFrame(res.data)
-        if not df.empty:
-            df = df[~df["CodArt"].astype(str).str.upper().str.contains('RAEE', na=False)].copy()
-            df["ImportoNettoRiga"] = pd.to_numeric(df["ImportoNettoRiga"], errors='coerce').fillna(0)
-            df["MeseRif"] = df["MeseRif"].astype(int)
-            df["AnnoRif"] = str(anno)
-        return df
+        filtri = {"id_agente": my_agente_id} if ruolo == "agente" else None
+        trovati = anagrafiche.cerca("rubrica_clienti", search_term, ["ragione_sociale"], uguali=filtri, limite=15)
+        return [(d["ragione_sociale"], d["id_cliente"]) for d in trovati]
 
     # --- 3. FILTRI DI INTERFACCIA ---
     st.subheader("👥 Analisi Clienti")
@@ -60,13 +89,23 @@ def show_clienti():
         if not cliente_id_sel:
             st.info("💡 Digita il nome di un cliente per iniziare."); return
 
-        anni_disp = get_cliente_years(cliente_id_sel)
-        if cliente_id_sel:
-            st.sidebar.write(f"🔍 DEBUG Cliente Selezionato ID: `{cliente_id_sel}`")
-            
+        if analitica.motore() == "duckdb" and riscaldamento.in_corso("vendite"):
+            # La copia locale di fatturati è in preparazione all'avvio del server
+            riscaldamento.mostra_attesa("vendite", "Preparazione dell'archivio vendite in corso (avvio del server)")
+            return
+        # Anni e conteggio sono indipendenti: partono insieme
+        query = {}
+        if motore_sql:
+            query["anni"] = lambda: analitica.anni_disponibili(analitica.FiltroVendite(cliente=cliente_id_sel))
+        else:
+            query["anni"] = lambda: get_cliente_years(cliente_id_sel)
             # Test rapido: conta quanti record ci sono in fatturati per questo ID senza filtri di anno
-            test_res = conn.table("fatturati").select("count", count="exact").eq("IdAnagrafica", cliente_id_sel).execute()
-            st.sidebar.write(f"📊 Record totali in fatturati: {test_res.count}")
+            query["conteggio"] = lambda: conn.table("fatturati").select("count", count="exact").eq("IdAnagrafica", cliente_id_sel).execute()
+        risultati = in_parallelo(query)
+        anni_disp = risultati["anni"]
+        if cliente_id_sel and not motore_sql:
+            st.sidebar.write(f"🔍 DEBUG Cliente Selezionato ID: `{cliente_id_sel}`")
+            st.sidebar.write(f"📊 Record totali in fatturati: {risultati['conteggio'].count}")
         c1, c2 = st.columns(2)
         with c1:
             anni_scelti = st.multiselect("📅 Confronta Anni", anni_disp, default=[anni_disp[0]] if anni_disp else [])
@@ -75,30 +114,39 @@ def show_clienti():
             mesi_scelti = st.multiselect("🗓️ Filtra Mesi", options=list(mesi_nomi.keys()), format_func=lambda x: mesi_nomi[x], default=list(range(1, 13)))
 
     # --- 4. RAGIONE SOCIALE ---
-    res_info = conn.table("rubrica_clienti").select("ragione_sociale").eq("id_cliente", cliente_id_sel).single().execute()
-    #st.header(f"🏢 {res_info.data['ragione_sociale'] if res_info.data else 'Scheda Cliente'}")
+    #info_cliente = anagrafiche.trova("rubrica_clienti", "id_cliente", cliente_id_sel)
+    #st.header(f"🏢 {info_cliente['ragione_sociale'] if info_cliente else 'Scheda Cliente'}")
 
     # --- 5. CARICAMENTO DATI ---
-    df_list = []
-    for anno in anni_scelti:
-        df_anno = get_data_for_single_year(cliente_id_sel, anno)
-        if not df_anno.empty:
-            df_list.append(df_anno)
-    
-    if df_list:
-        df_totale = pd.concat(df_list)
-        df = df_totale[df_totale["MeseRif"].isin(mesi_scelti)].copy()
+    # calcola(nome, *args): stessa aggregazione in vendite.py (DataFrame del cliente) o analitica.py (SQL)
+    filtri = grafici.chiave_filtri(anni_scelti, mesi_scelti)
+    if motore_sql:
+        filtro_sql = analitica.FiltroVendite(anni=tuple(anni_scelti), mesi=tuple(mesi_scelti), cliente=cliente_id_sel)
+        versione = ("cliente", cliente_id_sel, analitica.motore(), analitica.versione_dati())
+        def calcola(nome, *args):
+            return getattr(analitica, nome)(filtro_sql, *args)
+        ci_sono_dati = bool(anni_scelti) and analitica.conta_righe(filtro_sql._replace(mesi=())) > 0
+    else:
+        # Un anno per query, tutte insieme
+        dati_anni = in_parallelo({anno: (lambda anno=anno: get_data_for_single_year(cliente_id_sel, anno)) for anno in anni_scelti})
+        df_list = [dati_anni[anno][0] for anno in anni_scelti if not dati_anni[anno][0].empty]
+        ci_sono_dati = bool(df_list)
+        if ci_sono_dati:
+            df_totale = pd.concat(df_list)
+            df = df_totale[df_totale["MeseRif"].isin(mesi_scelti)].copy()
+            # Chiave della cache grafici: cliente + istante di caricamento di ogni anno (i filtri sono a parte)
+            versione = grafici.firma_dataset(("cliente", cliente_id_sel), tuple(dati_anni[anno][1] for anno in anni_scelti))
+        def calcola(nome, *args):
+            return getattr(vendite, nome)(df, *args)
+
+    if ci_sono_dati:
+        stato_dati_cliente(cliente_id_sel, anni_scelti, motore_sql, ruolo == "admin")
         
         # --- METRICHE (CON CONTEGGIO ORDINI UNIVOCI) ---
         cols = st.columns(len(anni_scelti))
         for i, anno in enumerate(sorted(anni_scelti, reverse=True)):
-            df_a = df[df["AnnoRif"] == str(anno)]
-            somma_fatturato = df_a['ImportoNettoRiga'].sum()
-            
-            # Contiamo gli ordini univoci usando IdTestata (o NumeroDocumento)
-            # Se la colonna ha un nome diverso nel tuo DB, cambiala qui sotto
-            campo_ordine = "IdTestata" if "IdTestata" in df_a.columns else df_a.columns[0]
-            num_ordini_univoci = df_a[campo_ordine].nunique()
+            # Ordini univoci contati su IdTestata
+            somma_fatturato, num_ordini_univoci = calcola("ordini_per_anno", anno)
             
             with cols[i]:
                 st.metric(
@@ -112,25 +160,28 @@ def show_clienti():
 
         # --- 6. GRAFICI ---
         st.subheader("📈 Andamento Mensile")
-        mensile_res = df.groupby(["AnnoRif", "MeseRif"])["ImportoNettoRiga"].sum().reset_index()
-        fig_evol = px.line(mensile_res, x="MeseRif", y="ImportoNettoRiga", color="AnnoRif", markers=True, template="plotly_white")
-        fig_evol.update_layout(xaxis=dict(tickmode='array', tickvals=list(mesi_nomi.keys()), ticktext=list(mesi_nomi.values())), height=400)
-        st.plotly_chart(fig_evol, use_container_width=True)
+        def crea_evol():
+            mensile_res = calcola("mensile_cliente")
+            fig_evol = px.line(mensile_res, x="MeseRif", y="ImportoNettoRiga", color="AnnoRif", markers=True, template="plotly_white")
+            fig_evol.update_layout(xaxis=dict(tickmode='array', tickvals=list(mesi_nomi.keys()), ticktext=list(mesi_nomi.values())), height=400)
+            return fig_evol
+        st.plotly_chart(grafici.figura("cliente_mensile", versione, filtri, crea_evol), use_container_width=True)
 
         st.subheader("🏆 Marchi")
-        res_fam = df.groupby(["Famiglia", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
-        top_fam_list = res_fam.groupby("Famiglia")["ImportoNettoRiga"].sum().nlargest(15).index
-        df_fam_plot = res_fam[res_fam["Famiglia"].isin(top_fam_list)]
-
-        fig_fam = px.bar(df_fam_plot, x="ImportoNettoRiga", y="Famiglia", color="AnnoRif", barmode="group", orientation='h', template="plotly_white")
-        fig_fam.update_layout(yaxis={'categoryorder':'total ascending'}, height=600)
-        st.plotly_chart(fig_fam, use_container_width=True)
+        def crea_fam():
+            df_fam_plot = calcola("top_famiglie_cliente", 15)
+            fig_fam = px.bar(df_fam_plot, x="ImportoNettoRiga", y="Famiglia", color="AnnoRif", barmode="group", orientation='h', template="plotly_white")
+            fig_fam.update_layout(yaxis={'categoryorder':'total ascending'}, height=600)
+            return fig_fam
+        st.plotly_chart(grafici.figura("cliente_marchi", versione, filtri, crea_fam), use_container_width=True)
 
         st.subheader("📊 Cat Merceologica")
-        res_mer = df.groupby(["Merceologica", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
-        fig_mer = px.bar(res_mer, x="ImportoNettoRiga", y="Merceologica", color="AnnoRif", barmode="group", orientation='h', template="plotly_white")
-        fig_mer.update_layout(yaxis={'categoryorder':'total ascending'}, height=600)
-        st.plotly_chart(fig_mer, use_container_width=True)
+        def crea_mer():
+            res_mer = calcola("merceologica_cliente")
+            fig_mer = px.bar(res_mer, x="ImportoNettoRiga", y="Merceologica", color="AnnoRif", barmode="group", orientation='h', template="plotly_white")
+            fig_mer.update_layout(yaxis={'categoryorder':'total ascending'}, height=600)
+            return fig_mer
+        st.plotly_chart(grafici.figura("cliente_merceologica", versione, filtri, crea_mer), use_container_width=True)
 
     else:
         st.warning("Nessun dato di fatturato trovato.")
@@ -142,36 +193,37 @@ def show_clienti():
     st.subheader(f"🎯 Mix Merceologico Cliente")
 
     # Raggruppamento dati per il grafico a torta
-    res_focus_client = df.groupby("Merceologica")["ImportoNettoRiga"].sum().reset_index()
-    totale_periodo_cliente = res_focus_client["ImportoNettoRiga"].sum()
+    res_focus_client, totale_periodo_cliente = grafici.valore("cliente_mix", versione, filtri, lambda: calcola("mix_merceologico"))
 
     # Metrica del totale per il periodo selezionato
     st.metric(label="Fatturato Totale nel Periodo", value=f"€ {totale_periodo_cliente:,.2f}")
 
     # Creazione del grafico a ciambella
-    fig_pie_client = px.pie(
-        res_focus_client, 
-        values='ImportoNettoRiga', 
-        names='Merceologica',
-        hole=0.5,
-        template="plotly_white",
-        color_discrete_sequence=px.colors.qualitative.Safe
-    )
-        
-    # Pulizia etichette (solo hover) per coerenza con la dashboard
-    fig_pie_client.update_traces(
-        textinfo='none', 
-        hovertemplate="<b>%{label}</b><br>Fatturato: € %{value:,.2f}<br>Incidenza: %{percent}"
-    )
-        
-    fig_pie_client.update_layout(
-        height=500,
-        showlegend=True,
-        legend=dict(orientation="v", y=0.5, x=1, title="Categorie"),
-        margin=dict(t=20, b=20, l=20, r=20)
-    )
-
-    st.plotly_chart(fig_pie_client, use_container_width=True)
+    def crea_pie_client():
+        fig_pie_client = px.pie(
+            res_focus_client, 
+            values='ImportoNettoRiga', 
+            names='Merceologica',
+            hole=0.5,
+            template="plotly_white",
+            color_discrete_sequence=px.colors.qualitative.Safe
+        )
+            
+        # Pulizia etichette (solo hover) per coerenza con la dashboard
+        fig_pie_client.update_traces(
+            textinfo='none', 
+            hovertemplate="<b>%{label}</b><br>Fatturato: € %{value:,.2f}<br>Incidenza: %{percent}"
+        )
+            
+        fig_pie_client.update_layout(
+            height=500,
+            showlegend=True,
+            legend=dict(orientation="v", y=0.5, x=1, title="Categorie"),
+            margin=dict(t=20, b=20, l=20, r=20)
+        )
+        return fig_pie_client
+
+    st.plotly_chart(grafici.figura("cliente_mix", versione, filtri, crea_pie_client), use_container_width=True)
 
     # --- 7. DIARIO VISITE (DEMO IN FONDO) ---
     with st.container(border=True):
@@ -1,49 +1,39 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+from core import agenti as directory_agenti
+from core import vendite, grafici, analitica, dataset_vendite, riscaldamento, cache_condivisa
 
 # --- 1. FUNZIONE CARICAMENTO DATI CON FILTRO LATO SERVER ---
-@st.cache_data(persist="disk", ttl=3600)
-def load_all_data(url, key, agente_id=None):
-    from supabase import create_client
-    supabase = create_client(url, key)
-    
+# Il dataset è condiviso da tutte le sessioni (core/dataset_vendite.py: memoria, disco Arrow, Supabase);
+# qui c'è solo la barra di avanzamento quando va davvero scaricato. Restituisce (DataFrame, creato).
+def load_all_data(agente_id=None):
+    if dataset_vendite.in_memoria(agente_id):
+        return dataset_vendite.fatturati_voce(agente_id)
+
     placeholder = st.empty()
     with placeholder.container():
         testo_caricamento = f"Sincronizzazione Agente: {agente_id}" if agente_id else "Sincronizzazione Database Completo (Admin)"
         st.markdown(f"### 🔄 {testo_caricamento}...")
         progress_bar = st.progress(0)
         status_text = st.empty()
-    
-    all_data = []
-    chunk_size = 1000
-    start = 0
-    total_estimated = 80000 
-
-    while True:
-        # Query con selezione esplicita di tutte le colonne necessarie
-        query = supabase.table("fatturati").select(
-            "AnnoRif,MeseRif,AgenteDoc,Cliente,ImportoNettoRiga,Merceologica,CodArt,IdAgenteDoc,Famiglia"
-        )
-        
-        # Filtro lato Database (Supabase) per efficienza
-        if agente_id:
-            query = query.eq("IdAgenteDoc", agente_id)
-        
-        response = query.range(start, start + chunk_size - 1).execute()
-        
-        data = response.data
-        if not data: break
-        
-        all_data.extend(data)
-        if len(data) < chunk_size: break
-        
-        start += chunk_size
-        progress_bar.progress(min(start / total_estimated, 1.0))
-        status_text.markdown(f"Record recuperati: **{len(all_data):,}**")
+    total_estimated = 80000
+
+    def avanzamento(righe):
+        progress_bar.progress(min(righe / total_estimated, 1.0))
+        status_text.markdown(f"Record recuperati: **{righe:,}**")
 
+    voce = dataset_vendite.fatturati_voce(agente_id, avanzamento)
     placeholder.empty()
-    return pd.DataFrame(all_data)
+    return voce
+
+def versione_dati_sql():
+    """Motore DuckDB: copia Parquet di fatturati condivisa da tutte le sessioni (scaricata al primo accesso).
+    Motore RPC: nessun download, solo la versione per la cache dei grafici."""
+    placeholder = st.empty()
+    def avanzamento(righe):
+        placeholder.markdown(f"### 🔄 Sincronizzazione archivio vendite locale...\nRecord recuperati: **{righe:,}**")
+    versione = analitica.versione_dati(avanzamento)
+    placeholder.empty()
+    return versione
 
 def show_dashboard():
     if 'user_info' not in st.session_state:
@@ -64,41 +54,104 @@ def show_dashboard():
             del st.session_state['df_vendite']
         st.session_state['last_loaded_key'] = current_cache_key
 
-    # Caricamento effettivo
-    if 'df_vendite' not in st.session_state:
-        df_raw = load_all_data(
-            st.secrets["connections"]["supabase"]["url"], 
-            st.secrets["connections"]["supabase"]["key"],
-            agente_id=id_per_download
-        )
-        st.session_state['df_vendite'] = df_raw
-    else:
-        df_raw = st.session_state['df_vendite']
+    # Avvio del server: se il riscaldamento sta ancora scaricando le vendite si mostra lo stato di attesa
+    # invece di far partire un secondo download da questa sessione
+    motore = analitica.motore()
+    # Caricamento progressivo: invece della sola barra di avanzamento, la pagina lavora sugli anni già arrivati
+    if motore == "pandas" and dataset_vendite.progressivo() and dataset_vendite.avvia_progressivo(id_per_download):
+        sezione_parziale(ruolo, id_per_download, current_cache_key)
+        return
+    if motore == "duckdb" or (motore == "pandas" and not dataset_vendite.in_memoria(id_per_download)
+                              and 'df_vendite' not in st.session_state):
+        if riscaldamento.in_corso("vendite"):
+            st.subheader("📊 Performance & Analisi")
+            riscaldamento.mostra_attesa("vendite", "Preparazione dei dati di vendita in corso (avvio del server)")
+            return
+
+    # Motore SQL: niente download per sessione, le aggregazioni girano in DuckDB (copia locale) o nel database (RPC)
+    if analitica.attivo():
+        versione = (current_cache_key, motore, versione_dati_sql())
+        filtro_dati = analitica.FiltroVendite(agente=id_per_download)
+        if grafici.valore("righe_totali", versione, (), lambda: analitica.conta_righe(filtro_dati)) == 0:
+            st.warning("⚠️ Nessun dato trovato per l'utente corrente.")
+            return
+        sezione_analisi(None, versione, ruolo, id_per_download)
+        return
+
+    # Caricamento effettivo: dalla memoria condivisa è immediato, e dopo un rinnovo in background arriva
+    # un DataFrame nuovo che sostituisce quello della sessione
+    df_raw, creato = load_all_data(agente_id=id_per_download)
+    st.session_state['df_vendite'] = df_raw
+    # Versione del dataset per la cache dei grafici: l'istante del caricamento, letto insieme al DataFrame
+    versione = grafici.firma_dataset(current_cache_key, creato)
 
     if df_raw.empty:
         st.warning("⚠️ Nessun dato trovato per l'utente corrente.")
         return
 
-    # --- 2. PULIZIA E NORMALIZZAZIONE INTEGRALE ---
-    df_base = df_raw.copy()
-    
-    # Rimozione articoli RAEE
-    if "CodArt" in df_base.columns:
-        df_base = df_base[~df_base["CodArt"].astype(str).str.upper().str.contains('RAEE', na=False)].copy()
-    
-    df_base["ImportoNettoRiga"] = pd.to_numeric(df_base["ImportoNettoRiga"], errors='coerce').fillna(0)
-    df_base["AnnoRif"] = pd.to_numeric(df_base["AnnoRif"], errors='coerce')
-    df_base["MeseRif"] = df_base["MeseRif"].astype(str).str.zfill(2)
-    df_base["IdAgenteDoc"] = df_base["IdAgenteDoc"].astype(str)
-    df_base["AgenteDoc"] = df_base["AgenteDoc"].astype(str).str.upper().str.strip()
-    
-    if "Famiglia" in df_base.columns:
-        df_base["Famiglia"] = df_base["Famiglia"].astype(str).str.upper().str.strip()
-        df_base["Famiglia"] = df_base["Famiglia"].replace(["0", "NAN", "NONE", ""], "NON SPECIFICATO")
+    sezione_analisi(df_raw, versione, ruolo, id_per_download)
+
+def stato_dati(motore_sql, ruolo, agente_dati):
+    """Età dei dati mostrati (scaduti restano visibili durante il rinnovo in background); l'admin può forzarlo"""
+    if motore_sql:
+        creato, in_rinnovo = analitica.aggiornamento()
+        rinnova = analitica.rinnova
     else:
-        df_base["Famiglia"] = "NON SPECIFICATO"
+        creato, in_rinnovo = dataset_vendite.aggiornamento(agente_dati)
+        rinnova = lambda: dataset_vendite.rinnova(agente_dati)
+    cache_condivisa.mostra_stato(creato, in_rinnovo, rinnova if ruolo == "admin" and creato else None,
+                                 key="aggiorna_dati_dashboard")
 
-    st.subheader(f"📊 Performance & Analisi")
+@st.fragment(run_every=riscaldamento.INTERVALLO_ATTESA)
+def sezione_parziale(ruolo, agente_dati, chiave):
+    """Dashboard sui dati scaricati finora (anni più recenti prima), ridisegnata a ogni nuovo blocco;
+    a download finito riesegue la pagina, che passa al dataset completo"""
+    stato = dataset_vendite.parziale(agente_dati)
+    if stato is None:
+        st.rerun()
+    df_parziale, anni = stato
+    if df_parziale.empty:
+        st.subheader("📊 Performance & Analisi")
+        st.info("⏳ Caricamento dei primi dati in corso...")
+        return
+    etichetta = f"Anni caricati: {', '.join(str(a) for a in anni)} · {len(df_parziale):,} record finora, caricamento in corso"
+    sezione_analisi(df_parziale, grafici.VersioneParziale(chiave, len(df_parziale)), ruolo, agente_dati,
+                    parziale=etichetta)
+
+# --- 2. SEZIONE ANALISI (FRAGMENT) ---
+# Ogni sezione della pagina è un st.fragment o una funzione con dipendenze esplicite:
+#   filtri globali (anni, mesi, agente) -> df_final -> metriche, andamento, agenti, distribuzioni, top clienti
+#   filtri globali + marchio            -> focus marchio (fragment annidato: il selectbox riesegue solo lui)
+# Un cambio dei filtri globali riesegue questo fragment, non app.py né il caricamento dei dati.
+# df_raw è None con un motore SQL (analitica.py): le aggregazioni non passano da un DataFrame locale.
+# Con parziale (testo del badge) df_raw contiene solo i blocchi scaricati finora (sezione_parziale),
+# già normalizzati man mano che arrivano: qui non si ripete la pulizia sull'intero parziale.
+@st.fragment
+def sezione_analisi(df_raw, versione, ruolo, agente_dati, parziale=None):
+    # Pulizia e filtri vengono calcolati solo se almeno un elemento della pagina non è già in cache
+    calcolati = {}
+    def df_base():
+        # PULIZIA E NORMALIZZAZIONE INTEGRALE (RAEE esclusi)
+        if "base" not in calcolati:
+            calcolati["base"] = df_raw if parziale else vendite.normalizza_fatturati(df_raw)
+        return calcolati["base"]
+
+    def calcola(nome, *args, base=False):
+        """Aggregazione 'nome' (stessa funzione in vendite.py e analitica.py) sui dati filtrati, o su tutti con base=True"""
+        if df_raw is None:
+            filtro = analitica.FiltroVendite(agente=agente_dati) if base else calcolati["filtro_sql"]
+            return getattr(analitica, nome)(filtro, *args)
+        return getattr(vendite, nome)(df_base() if base else df_final(), *args)
+
+    anni_disp, mesi_disp, nomi_da_dati = grafici.valore("opzioni_filtri", versione, (),
+                                                        lambda: calcola("opzioni_filtri", base=True))
+
+    st.subheader("📊 Performance & Analisi")
+    if parziale:
+        st.badge("Dati parziali", icon="⏳", color="orange")
+        st.caption(parziale)
+    else:
+        stato_dati(df_raw is None, ruolo, agente_dati)
     
     # --- 3. SEZIONE FILTRI ---
     with st.container(border=True):
@@ -109,60 +162,70 @@ def show_dashboard():
             f3 = None
 
         with f1:
-            anni_disp = sorted(df_base["AnnoRif"].dropna().unique().astype(int).tolist(), reverse=True)
             default_anno = [2026] if 2026 in anni_disp else [anni_disp[0]]
             anni_sel = st.multiselect("📅 Anni da confrontare", options=anni_disp, default=default_anno)
         
         with f2:
-            mesi_disp = sorted(df_base["MeseRif"].unique().tolist())
             mesi_default = [m for m in ['01', '02', '03', '04', '05', '06', '07'] if m in mesi_disp]
             mesi_sel = st.multiselect("📅 Mesi da includere", options=mesi_disp, default=mesi_default if mesi_default else mesi_disp)
         
-        agente_nome_sel = "Tutti"
+        agente_id_sel = "Tutti"
         if f3 is not None:
             with f3:
-                mappa_agenti = df_base.groupby("AgenteDoc")["IdAgenteDoc"].first().reset_index()
-                opzioni_agenti = ["Tutti"] + mappa_agenti["AgenteDoc"].tolist()
-                agente_nome_sel = st.selectbox("👤 Filtra per Agente", opzioni_agenti)
+                # Nomi dalla directory agenti condivisa; se l'ID non è censito si usa il nome del documento
+                mappa_agenti = directory_agenti.mappa_agenti()
+                etichette = {id_ag: mappa_agenti.get(id_ag, nome_doc) for id_ag, nome_doc in nomi_da_dati.items()}
+                opzioni_agenti = ["Tutti"] + sorted(etichette, key=lambda id_ag: etichette[id_ag])
+                agente_id_sel = st.selectbox("👤 Filtra per Agente", opzioni_agenti, format_func=lambda x: etichette.get(x, x))
 
     # --- 4. LOGICA DI FILTRAGGIO FINALE ---
-    df_final = df_base[df_base["AnnoRif"].isin(anni_sel)]
-    if mesi_sel:
-        df_final = df_final[df_final["MeseRif"].isin(mesi_sel)]
-    
-    if ruolo != "agente" and agente_nome_sel != "Tutti":
-        id_scelto = mappa_agenti[mappa_agenti["AgenteDoc"] == agente_nome_sel]["IdAgenteDoc"].values[0]
-        df_final = df_final[df_final["IdAgenteDoc"] == id_scelto]
+    agente_filtro = agente_id_sel if ruolo != "agente" else "Tutti"
+    filtri = grafici.chiave_filtri(anni_sel, mesi_sel, agente_filtro)
+    calcolati["filtro_sql"] = analitica.FiltroVendite(
+        anni=tuple(anni_sel), mesi=tuple(mesi_sel), agente=agente_dati if agente_filtro == "Tutti" else agente_filtro)
+
+    def df_final():
+        if "final" not in calcolati:
+            calcolati["final"] = vendite.filtra_fatturati(df_base(), anni_sel, mesi_sel, agente_filtro)
+        return calcolati["final"]
+
+    vuoto, totali_anni = grafici.valore(
+        "totali_anni", versione, filtri,
+        lambda: (True, []) if calcola("conta_righe") == 0 else (False, calcola("totali_per_anno", anni_sel))
+    )
 
     # --- 5. VISUALIZZAZIONE DATI ---
-    if not df_final.empty:
-        # Metriche Totali con calcolo variazione percentuale (Delta)
-        st.divider()
-        anni_ordinati = sorted(anni_sel)
-        cols_metric = st.columns(len(anni_ordinati))
-
-        for i, anno in enumerate(anni_ordinati):
-            val_attuale = df_final[df_final["AnnoRif"] == anno]["ImportoNettoRiga"].sum()
-            delta_val = None
-            if i > 0:
-                val_prec = df_final[df_final["AnnoRif"] == anni_ordinati[i-1]]["ImportoNettoRiga"].sum()
-                if val_prec > 0:
-                    variazione = ((val_attuale - val_prec) / val_prec) * 100
-                    delta_val = f"{variazione:+.1f}% vs {anni_ordinati[i-1]}"
-                else:
-                    delta_val = "N/A"
-            
-            cols_metric[i].metric(label=f"Totale {anno}", value=f"€ {val_attuale:,.2f}", delta=delta_val)
-
-        # GRAFICO 1: ANDAMENTO MENSILE YoY (Linee)
-        st.divider()
-        st.subheader("📈 Andamento Mensile Year-over-Year")
-        res_mensile = df_final.groupby(["AnnoRif", "MeseRif"])["ImportoNettoRiga"].sum().reset_index()
-        res_mensile["AnnoRif"] = res_mensile["AnnoRif"].astype(str)
-        nomi_mesi = {"01":"Gen","02":"Feb","03":"Mar","04":"Apr","05":"Mag","06":"Giu","07":"Lug","08":"Ago","09":"Set","10":"Ott","11":"Nov","12":"Dic"}
-        res_mensile["Mese"] = res_mensile["MeseRif"].map(nomi_mesi)
-        res_mensile = res_mensile.sort_values("MeseRif")
+    if vuoto:
+        st.info("Nessun dato trovato per i filtri selezionati.")
+        return
+
+    sezione_metriche(totali_anni)
+    sezione_andamento(versione, filtri, calcola)
+    if ruolo != "agente":
+        sezione_agenti(versione, filtri, calcola)
+    sezione_distribuzioni(versione, filtri, calcola)
+    sezione_focus_marchio(versione, anni_sel, mesi_sel, agente_filtro, calcola)
+    sezione_top_clienti(versione, filtri, calcola)
+
+# --- 6. SEZIONI GRAFICI ---
+# calcola(nome, *args) esegue l'aggregazione solo al primo grafico che non è in cache
+def sezione_metriche(totali_anni):
+    # Metriche Totali con calcolo variazione percentuale (Delta)
+    st.divider()
+    cols_metric = st.columns(len(totali_anni))
+
+    for i, (anno, val_attuale, delta_val) in enumerate(totali_anni):
+        cols_metric[i].metric(label=f"Totale {anno}", value=f"€ {val_attuale:,.2f}", delta=delta_val)
+
+def sezione_andamento(versione, filtri, calcola):
+    # GRAFICO 1: ANDAMENTO MENSILE YoY (Linee)
+    import plotly.express as px
 
+    st.divider()
+    st.subheader("📈 Andamento Mensile Year-over-Year")
+
+    def crea_linea():
+        res_mensile = calcola("andamento_mensile")
         fig_linea = px.line(
             res_mensile, x="Mese", y="ImportoNettoRiga", color="AnnoRif",
             markers=True, template="plotly_white",
@@ -170,32 +233,40 @@ def show_dashboard():
             labels={"ImportoNettoRiga": "Fatturato (€)", "AnnoRif": "Anno"}
         )
         fig_linea.update_layout(height=400, xaxis_title=None, legend=dict(orientation="h", y=1.1, x=1, title=None))
-        st.plotly_chart(fig_linea, use_container_width=True)
+        return fig_linea
 
-        # GRAFICO 2: PERFORMANCE AGENTI (Solo Admin)
-        if ruolo != "agente":
-            st.divider()
-            st.subheader("👤 Performance Agenti")
-            res_agenti = df_final.groupby(["AgenteDoc", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
-            res_agenti["AnnoRif"] = res_agenti["AnnoRif"].astype(str)
-            ordine_agenti = res_agenti.groupby("AgenteDoc")["ImportoNettoRiga"].sum().sort_values(ascending=False).index
-            
-            fig_agenti = px.bar(
-                res_agenti, x="AgenteDoc", y="ImportoNettoRiga", color="AnnoRif",
-                barmode="group", text_auto='.2s',
-                category_orders={"AgenteDoc": ordine_agenti},
-                template="plotly_white",
-                color_discrete_sequence=px.colors.qualitative.Bold
-            )
-            fig_agenti.update_layout(height=500, xaxis_tickangle=-45, legend=dict(orientation="h", y=1.1, x=1, title=None))
-            st.plotly_chart(fig_agenti, use_container_width=True)
-
-        # GRAFICO 3: DISTRIBUZIONE PER MARCHIO (FAMIGLIA) - ORDINATO CON IL PIÙ GRANDE IN ALTO
-        st.divider()
-        st.subheader("🏆 Distribuzione per Marchio")
-        res_famiglia = df_final.groupby(["Famiglia", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
-        res_famiglia["AnnoRif"] = res_famiglia["AnnoRif"].astype(str)
-        
+    st.plotly_chart(grafici.figura("linea_mensile", versione, filtri, crea_linea), use_container_width=True)
+
+def sezione_agenti(versione, filtri, calcola):
+    # GRAFICO 2: PERFORMANCE AGENTI (Solo Admin)
+    import plotly.express as px
+
+    st.divider()
+    st.subheader("👤 Performance Agenti")
+
+    def crea_agenti():
+        res_agenti, ordine_agenti = calcola("performance_agenti")
+        fig_agenti = px.bar(
+            res_agenti, x="AgenteDoc", y="ImportoNettoRiga", color="AnnoRif",
+            barmode="group", text_auto='.2s',
+            category_orders={"AgenteDoc": ordine_agenti},
+            template="plotly_white",
+            color_discrete_sequence=px.colors.qualitative.Bold
+        )
+        fig_agenti.update_layout(height=500, xaxis_tickangle=-45, legend=dict(orientation="h", y=1.1, x=1, title=None))
+        return fig_agenti
+
+    st.plotly_chart(grafici.figura("performance_agenti", versione, filtri, crea_agenti), use_container_width=True)
+
+def sezione_distribuzioni(versione, filtri, calcola):
+    import plotly.express as px
+
+    # GRAFICO 3: DISTRIBUZIONE PER MARCHIO (FAMIGLIA) - ORDINATO CON IL PIÙ GRANDE IN ALTO
+    st.divider()
+    st.subheader("🏆 Distribuzione per Marchio")
+
+    def crea_famiglia():
+        res_famiglia = calcola("totali_per_colonna", "Famiglia")
         fig_famiglia = px.bar(
             res_famiglia, x="ImportoNettoRiga", y="Famiglia", color="AnnoRif",
             barmode="group", orientation='h', text_auto='.2s',
@@ -208,14 +279,16 @@ def show_dashboard():
             yaxis={'categoryorder':'total ascending', 'title': None},
             legend=dict(orientation="h", y=1.02, x=1, title=None)
         )
-        st.plotly_chart(fig_famiglia, use_container_width=True)
+        return fig_famiglia
+
+    st.plotly_chart(grafici.figura("distribuzione_marchio", versione, filtri, crea_famiglia), use_container_width=True)
 
-        # GRAFICO 4: CATEGORIE MERCEOLOGICHE - ORDINATO CON IL PIÙ GRANDE IN ALTO
-        st.divider()
-        st.subheader("📦 Distribuzione per Categoria")
-        res_merce = df_final.groupby(["Merceologica", "AnnoRif"])["ImportoNettoRiga"].sum().reset_index()
-        res_merce["AnnoRif"] = res_merce["AnnoRif"].astype(str)
+    # GRAFICO 4: CATEGORIE MERCEOLOGICHE - ORDINATO CON IL PIÙ GRANDE IN ALTO
+    st.divider()
+    st.subheader("📦 Distribuzione per Categoria")
 
+    def crea_merce():
+        res_merce = calcola("totali_per_colonna", "Merceologica")
         fig_merce = px.bar(
             res_merce, x="ImportoNettoRiga", y="Merceologica", color="AnnoRif",
             barmode="group", orientation='h', text_auto='.2s',
@@ -227,24 +300,33 @@ def show_dashboard():
             yaxis={'categoryorder':'total ascending', 'title': None},
             legend=dict(orientation="h", y=1.02, x=1, title=None)
         )
-        st.plotly_chart(fig_merce, use_container_width=True)
+        return fig_merce
 
-        # --- ANALISI DETTAGLIATA SINGOLO MARCHIO (VERSIONE CLEAN) ---
-        st.divider()
-        st.subheader("🔍 Focus Dettagliato sul Marchio")
+    st.plotly_chart(grafici.figura("distribuzione_categoria", versione, filtri, crea_merce), use_container_width=True)
 
-        # 1. Selettore marchio
-        marchi_disp = sorted(df_final["Famiglia"].unique().tolist())
-        marchio_focus = st.selectbox("Seleziona un Marchio per l'analisi merceologica", marchi_disp)
+@st.fragment
+def sezione_focus_marchio(versione, anni_sel, mesi_sel, agente_filtro, calcola):
+    # --- ANALISI DETTAGLIATA SINGOLO MARCHIO (VERSIONE CLEAN) ---
+    # Fragment: cambiare marchio riesegue solo questa sezione
+    import plotly.express as px
 
-        # 2. Filtraggio dati
-        df_focus = df_final[df_final["Famiglia"] == marchio_focus]
-        res_focus = df_focus.groupby("Merceologica")["ImportoNettoRiga"].sum().reset_index()
-        totale_marchio = res_focus["ImportoNettoRiga"].sum()
+    st.divider()
+    st.subheader("🔍 Focus Dettagliato sul Marchio")
+    filtri = grafici.chiave_filtri(anni_sel, mesi_sel, agente_filtro)
 
-        # 3. Layout: Totale in alto e Grafico sotto
-        st.metric(label=f"Fatturato Totale {marchio_focus}", value=f"€ {totale_marchio:,.2f}")
+    # 1. Selettore marchio
+    marchi_disp = grafici.valore("marchi", versione, filtri, lambda: calcola("marchi"))
+    marchio_focus = st.selectbox("Seleziona un Marchio per l'analisi merceologica", marchi_disp)
 
+    # 2. Filtraggio dati
+    filtri_marchio = grafici.chiave_filtri(anni_sel, mesi_sel, agente_filtro, marchio_focus)
+    res_focus, totale_marchio = grafici.valore("focus_marchio", versione, filtri_marchio,
+                                               lambda: calcola("focus_marchio", marchio_focus))
+
+    # 3. Layout: Totale in alto e Grafico sotto
+    st.metric(label=f"Fatturato Totale {marchio_focus}", value=f"€ {totale_marchio:,.2f}")
+
+    def crea_torta():
         fig_pie = px.pie(
             res_focus, 
             values='ImportoNettoRiga', 
@@ -266,14 +348,19 @@ def show_dashboard():
             legend=dict(orientation="v", y=0.5, x=1, title="Categorie"),
             margin=dict(t=20, b=20, l=20, r=20)
         )
+        return fig_pie
 
-        st.plotly_chart(fig_pie, use_container_width=True)
+    st.plotly_chart(grafici.figura("focus_marchio", versione, filtri_marchio, crea_torta), use_container_width=True)
 
-        # GRAFICO 5: TOP 30 CLIENTI - ORDINATO CON IL PIÙ GRANDE IN ALTO
-        st.divider()
-        st.subheader("🏙️ Top 30 Clienti per Fatturato")
-        res_clienti = df_final.groupby("Cliente")["ImportoNettoRiga"].sum().sort_values(ascending=False).head(30).reset_index()
+def sezione_top_clienti(versione, filtri, calcola):
+    # GRAFICO 5: TOP 30 CLIENTI - ORDINATO CON IL PIÙ GRANDE IN ALTO
+    import plotly.express as px
 
+    st.divider()
+    st.subheader("🏙️ Top 30 Clienti per Fatturato")
+
+    def crea_clienti():
+        res_clienti = calcola("top_clienti", 30)
         fig_clienti = px.bar(
             res_clienti, x="ImportoNettoRiga", y="Cliente", orientation='h',
             text_auto='.3s', color="ImportoNettoRiga", color_continuous_scale="Viridis",
@@ -283,10 +370,9 @@ def show_dashboard():
             height=800, showlegend=False, coloraxis_showscale=False, 
             yaxis={'categoryorder':'total ascending', 'title': None}
         )
-        st.plotly_chart(fig_clienti, use_container_width=True)
-    
-    else:
-        st.info("Nessun dato trovato per i filtri selezionati.")
+        return fig_clienti
+
+    st.plotly_chart(grafici.figura("top_clienti", versione, filtri, crea_clienti), use_container_width=True)
 
 if __name__ == "__main__":
-    show_dashboard()
\ No newline at end of file
+    show_dashboard()
@@ -1,13 +1,13 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client
 from datetime import datetime
 import time
+from core import agenti as directory_agenti
+from core.immagini import carica_allegato, url_miniatura
+from core.db import get_supabase_client, leggi_paginato, in_parallelo
 
-# --- CONFIGURAZIONE PAGINA ---
-st.set_page_config(page_title="Vivetti - Gestione Eventi", layout="wide")
-
-st.markdown("""
+# --- CONFIGURAZIONE PAGINA (applicata da show_eventi) ---
+STILE_PAGINA = """
     <style>
     .main h1 { font-size: 1.8rem !important; margin-bottom: 0.5rem !important; }
     .config-card {
@@ -16,27 +16,42 @@ st.markdown("""
     }
     .stButton button { font-weight: bold; border-radius: 8px; }
     </style>
-    """, unsafe_allow_html=True)
-
-# --- CONNESSIONE ---
-def get_supabase_client():
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    return create_client(url, key)
-
-supabase = get_supabase_client()
+    """
 
 # --- FUNZIONI CARICAMENTO DATI ---
+# I conteggi in cache servono solo alle etichette del catalogo: i posti dell'evento scelto e il controllo
+# prima dell'iscrizione usano sempre un conteggio fresco (iscrizioni fatte da altri processi/sessioni)
+TTL_CONTEGGI = 60
+
 def get_eventi_disponibili():
+    supabase = get_supabase_client()
     res = supabase.table("eventi").select("*").order("data_evento").execute()
     return res.data or []
 
-def get_conteggio_iscritti(id_evento):
-    res = supabase.table("eventi_iscrizioni").select("id", count="exact").eq("id_evento", id_evento).execute()
-    return res.count if res.count is not None else 0
+@st.cache_data(ttl=TTL_CONTEGGI, show_spinner=False)
+def get_conteggi_iscritti():
+    """Numero di iscritti per tutti gli eventi con un'unica query raggruppata (id_evento -> iscritti)"""
+    supabase = get_supabase_client()
+    try:
+        res = supabase.table("eventi_conteggio_iscritti").select("id_evento, iscritti").execute()
+        return {row['id_evento']: int(row['iscritti'] or 0) for row in res.data or []}
+    except Exception:
+        # Stand-in locale se la vista non è presente sul DB (vedi sql/eventi_conteggio_iscritti.sql):
+        # si scarica solo la colonna id_evento e si raggruppa qui
+        conteggi = {}
+        for row in leggi_paginato(lambda: supabase.table("eventi_iscrizioni").select("id_evento").order("id")):
+            conteggi[row['id_evento']] = conteggi.get(row['id_evento'], 0) + 1
+        return conteggi
+
+def conta_iscritti_evento(id_evento):
+    """Iscritti attuali dell'evento letti dal database (per il controllo dei posti prima di iscrivere)"""
+    supabase = get_supabase_client()
+    res = supabase.table("eventi_iscrizioni").select("id", count="exact").eq("id_evento", id_evento).limit(1).execute()
+    return int(res.count or 0)
 
 def get_iscritti_evento(id_evento):
     """Recupera tutti i partecipanti iscritti a un determinato evento"""
+    supabase = get_supabase_client()
     res = supabase.table("eventi_iscrizioni")\
         .select("id, id_agente, ragione_sociale_cliente, nominativo_partecipante, note, created_at")\
         .eq("id_evento", id_evento)\
@@ -44,48 +59,24 @@ def get_iscritti_evento(id_evento):
         .execute()
     return res.data or []
 
-def get_mappa_agenti():
-    """Recupera la corrispondenza ID -> Nome dalla tabella 'agenti'"""
-    try:
-        res = supabase.table("agenti").select("id_agente, nome_agente").execute()
-        if res.data:
-            return {str(row['id_agente']).strip(): str(row['nome_agente']).upper() for row in res.data}
-    except Exception as e:
-        st.sidebar.error(f"Errore caricamento mappa agenti: {e}")
-    return {}
-
 def upload_locandina(file):
-    """Carica il file nello storage di Supabase e restituisce l'URL pubblico"""
+    """Comprime la locandina (con miniatura) e la carica nello storage di Supabase; restituisce l'URL pubblico"""
     try:
-        clean_name = file.name.replace(' ', '_').replace('(', '').replace(')', '')
-        file_name = f"flyer_{int(time.time())}_{clean_name}"
-        
-        supabase.storage.from_("eventi_locandine").upload(
-            path=file_name,
-            file=file.getvalue(),
-            file_options={"content-type": file.type}
-        )
-        
-        url_data = supabase.storage.from_("eventi_locandine").get_public_url(file_name)
-        
-        if isinstance(url_data, str):
-            return url_data
-        elif hasattr(url_data, "public_url"):
-            return url_data.public_url
-        elif isinstance(url_data, dict) and "publicUrl" in url_data:
-            return url_data["publicUrl"]
-        return str(url_data)
-        
+        return carica_allegato("eventi_locandine", file, "flyer")
     except Exception as e:
         st.error(f"❌ Errore durante l'upload del file sullo Storage Supabase. Dettaglio: {e}")
         return None
 
-def elimina_iscrizione(id_iscrizione):
-    """Elimina un record di iscrizione specifico e verifica l'effetto reale"""
+def elimina_iscrizioni(ids_iscrizioni):
+    """Elimina in un'unica query le iscrizioni indicate e verifica l'effetto reale"""
+    supabase = get_supabase_client()
     try:
-        res = supabase.table("eventi_iscrizioni").delete().eq("id", id_iscrizione).execute()
-        if not res.data:
-            st.error(f"⚠️ Il database non ha rimosso la riga. Verifica le policy RLS di Supabase per l'ID: {id_iscrizione}")
+        res = supabase.table("eventi_iscrizioni").delete().in_("id", list(ids_iscrizioni)).execute()
+        get_conteggi_iscritti.clear()
+        rimossi = {row['id'] for row in res.data or []}
+        non_rimossi = [i for i in ids_iscrizioni if i not in rimossi]
+        if non_rimossi:
+            st.error(f"⚠️ Il database non ha rimosso alcune righe. Verifica le policy RLS di Supabase per gli ID: {non_rimossi}")
             return False
         return True
     except Exception as e:
@@ -94,6 +85,8 @@ def elimina_iscrizione(id_iscrizione):
 
 
 def show_eventi():
+    supabase = get_supabase_client()
+    st.markdown(STILE_PAGINA, unsafe_allow_html=True)
     st.subheader("📅 Gestione Eventi e Formazione")
     
     user_data = st.session_state.get('user_info', {})
@@ -104,8 +97,13 @@ def show_eventi():
     if "id_evento_corrente" not in st.session_state:
         st.session_state.id_evento_corrente = None
 
-    # Recuperiamo la mappa agenti utile in più punti della pagina
-    mappa_agenti = get_mappa_agenti()
+    # Mappa agenti (utile in più punti della pagina), catalogo eventi e conteggi iscritti: query indipendenti, partono insieme
+    dati = in_parallelo({
+        "agenti": directory_agenti.mappa_agenti,
+        "eventi": get_eventi_disponibili,
+        "conteggi": get_conteggi_iscritti,
+    })
+    mappa_agenti = dati["agenti"]
 
     # ==========================================
     # VISTA ADMIN: CREAZIONE NUOVO EVENTO
@@ -158,7 +156,7 @@ def show_eventi():
     # ==========================================
     # SELEZIONE EVENTO
     # ==========================================
-    eventi = get_eventi_disponibili()
+    eventi = dati["eventi"]
     
     if not eventi:
         st.info("Al momento non ci sono eventi disponibili in catalogo.")
@@ -166,9 +164,10 @@ def show_eventi():
         
     opzioni_eventi = {}
     indice_default = None
+    conteggi_iscritti = dati["conteggi"]
     
     for i, ev in enumerate(eventi):
-        iscritti = get_conteggio_iscritti(ev['id'])
+        iscritti = conteggi_iscritti.get(ev['id'], 0)
         data_f = datetime.strptime(ev['data_evento'], "%Y-%m-%d").strftime("%d/%m/%Y")
         testo_mostrato = f"{ev['titolo']} ({data_f}) - Posti occupati: {iscritti}/{ev['max_partecipanti']}"
         opzioni_eventi[testo_mostrato] = (ev, iscritti)
@@ -189,8 +188,10 @@ def show_eventi():
         st.info("💡 Seleziona un evento dal menu a tendina per visualizzare i dettagli e gli iscritti.")
         return
         
-    evento_selezionato, posti_occupati = opzioni_eventi[evento_selezionato_testo]
-    posti_rimanenti = evento_selezionato['max_partecipanti'] - posti_occupati
+    evento_selezionato, _ = opzioni_eventi[evento_selezionato_testo]
+    # Partecipanti letti ora: i posti rimanenti non dipendono dai conteggi in cache del catalogo
+    iscritti_totali = get_iscritti_evento(evento_selezionato['id'])
+    posti_rimanenti = evento_selezionato['max_partecipanti'] - len(iscritti_totali)
     
     # Aggiorna l'ID dell'evento corrente ad ogni cambio di selezione manuale
     st.session_state.id_evento_corrente = evento_selezionato['id']
@@ -212,11 +213,12 @@ def show_eventi():
                 st.markdown("##### 📄 Invito PDF")
                 st.link_button("📥 Apri / Scarica PDF", url_file, use_container_width=True)
             else:
-                st.image(url_file, caption="Locandina Invito", use_container_width=True)
+                # Nella pagina si mostra la miniatura; l'originale resta disponibile a piena risoluzione
+                st.image(url_miniatura(url_file) or url_file, caption="Locandina Invito", use_container_width=True)
+                st.link_button("🔍 Apri Originale", url_file, use_container_width=True)
     
     # --- SEZIONE: ELENCO PARTECIPANTI (CON CANCELLAZIONE INTEGRATA) ---
     st.subheader("👥 Partecipanti Iscritti")
-    iscritti_totali = get_iscritti_evento(evento_selezionato['id'])
     
     if iscritti_totali:
         df_iscritti = pd.DataFrame(iscritti_totali)
@@ -255,7 +257,9 @@ def show_eventi():
             "Note": st.column_config.TextColumn("Note", disabled=True),
         }
 
-        editor_key = f"editor_eventi_{evento_selezionato['id']}"
+        # La versione nella chiave azzera l'editor dopo che le eliminazioni sono state salvate
+        if "versione_editor_eventi" not in st.session_state: st.session_state.versione_editor_eventi = 0
+        editor_key = f"editor_eventi_{evento_selezionato['id']}_{st.session_state.versione_editor_eventi}"
 
         edited_df = st.data_editor(
             df_iscritti,
@@ -270,26 +274,29 @@ def show_eventi():
         stato_modifiche = st.session_state.get(editor_key, {})
         righe_modificate = stato_modifiche.get("edited_rows", {})
         
-        if righe_modificate:
-            for string_index, variazioni in righe_modificate.items():
-                index = int(string_index)
-                
-                if variazioni.get("Elimina") is True and df_iscritti.at[index, "_is_editable"]:
-                    id_da_rimuovere = df_iscritti.at[index, "id_database_sicuro"]
-                    nome_p = df_iscritti.at[index, "Nominativo Partecipante"]
-                    
-                    st.session_state[editor_key]["edited_rows"] = {}
+        # Tutte le righe spuntate vengono eliminate insieme con un'unica query
+        ids_db = df_iscritti["id_database_sicuro"].tolist()
+        ids_da_rimuovere = []
+        nomi_da_rimuovere = []
+        for string_index, variazioni in righe_modificate.items():
+            index = int(string_index)
+            if variazioni.get("Elimina") is True and df_iscritti.at[index, "_is_editable"]:
+                ids_da_rimuovere.append(ids_db[index])
+                nomi_da_rimuovere.append(df_iscritti.at[index, "Nominativo Partecipante"])
+        
+        if ids_da_rimuovere:
+            if st.button(f"🗑️ CONFERMA ELIMINAZIONE DI {len(ids_da_rimuovere)} ISCRIZIONI", type="primary", use_container_width=True):
+                with st.spinner(f"Rimozione di {len(ids_da_rimuovere)} iscrizioni..."):
+                    st.session_state.id_evento_corrente = evento_selezionato['id']
                     
-                    with st.spinner(f"Rimozione iscrizione per {nome_p}..."):
-                        st.session_state.id_evento_corrente = evento_selezionato['id']
-                        
-                        if elimina_iscrizione(id_da_rimuovere):
-                            st.toast(f"❌ Iscrizione di {nome_p} rimossa con successo!", icon="🗑️")
-                            time.sleep(0.8)
-                            st.rerun()
-                        else:
-                            time.sleep(2.5)
-                            st.rerun()
+                    if elimina_iscrizioni(ids_da_rimuovere):
+                        st.session_state.versione_editor_eventi += 1
+                        st.toast(f"❌ Iscrizioni rimosse: {', '.join(nomi_da_rimuovere)}", icon="🗑️")
+                        time.sleep(0.8)
+                        st.rerun()
+                    else:
+                        time.sleep(2.5)
+                        st.rerun()
                         
     else:
         st.info("Nessun partecipante ancora iscritto a questo evento.")
@@ -314,12 +321,13 @@ def show_eventi():
                 # Se l'utente è Admin, mostriamo la selectbox per scegliere l'agente
                 id_agente_scelto = agente_id
                 if ruolo == "admin":
-                    opzioni_agenti = ["ADMIN"] + sorted(list(mappa_agenti.keys()), key=lambda k: mappa_agenti[k])
+                    agenti_tabella = directory_agenti.mappa_agenti(solo_tabella=True)
+                    opzioni_agenti = ["ADMIN"] + sorted(list(agenti_tabella.keys()), key=lambda k: agenti_tabella[k])
                     
                     agente_selezionato_form = st.selectbox(
                         "Assegna questa iscrizione a un Agente:",
                         options=opzioni_agenti,
-                        format_func=lambda x: f"{mappa_agenti[x]} ({x})" if x != "ADMIN" else "NESSUN AGENTE (ADMIN)"
+                        format_func=lambda x: f"{agenti_tabella[x]} ({x})" if x != "ADMIN" else "NESSUN AGENTE (ADMIN)"
                     )
                     id_agente_scelto = agente_selezionato_form
 
@@ -332,6 +340,10 @@ def show_eventi():
                         st.error("Per favore, inserisci la ragione sociale del cliente.")
                     elif not nominativo.strip():
                         st.error("Il nominativo del partecipante è obbligatorio.")
+                    elif conta_iscritti_evento(evento_selezionato['id']) >= evento_selezionato['max_partecipanti']:
+                        # Nel frattempo altri hanno occupato gli ultimi posti
+                        get_conteggi_iscritti.clear()
+                        st.error("❌ Questo evento ha raggiunto il limite massimo di partecipanti.")
                     else:
                         nuova_prenotazione = {
                             "id_evento": evento_selezionato['id'],
@@ -342,6 +354,7 @@ def show_eventi():
                         }
                         try:
                             supabase.table("eventi_iscrizioni").insert(nuova_prenotazione).execute()
+                            get_conteggi_iscritti.clear()
                             st.success(f"🎉 Iscrizione di **{nominativo.strip().upper()}** per **{ragione_sociale_input.strip().upper()}** confermata!")
                             
                             st.session_state.id_evento_corrente = evento_selezionato['id']
@@ -1,19 +1,16 @@
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
-from folium.plugins import MarkerCluster
-from supabase import create_client
+from core import anagrafiche
 
 def show_mappa():
-    st.subheader("🗺️ Mappa Clienti")
+    # folium viene caricato solo quando la pagina Mappa viene effettivamente aperta
+    import folium
+    from streamlit_folium import st_folium
+    from folium.plugins import MarkerCluster
 
-    # 1. Connessione a Supabase tramite secrets
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    supabase = create_client(url, key)
+    st.subheader("🗺️ Mappa Clienti")
 
-    # 2. Recupero info agente loggato dalla session_state di app.py
+    # 1. Recupero info agente loggato dalla session_state di app.py
     user_data = st.session_state.get('user_info')
     if not user_data:
         st.error("Errore: Utente non autenticato. Effettua il login.")
@@ -22,34 +19,29 @@ def show_mappa():
     # Recuperiamo l'ID (es. 605456)
     id_agente_loggato = user_data['agente_corrispondente']
 
-    # 3. Caricamento dati filtrati per ID_AGENTE
+    # 2. Caricamento dati filtrati per ID_AGENTE
     with st.spinner("Accesso al database in corso..."):
         try:
-            # Interroghiamo la tabella filtrando per l'ID numerico dell'agente
-            # e prendendo solo i record che hanno le coordinate (non null)
-            response = supabase.table("rubrica_clienti") \
-                .select("ragione_sociale, indirizzo, citta, prov, lat, lon, email, id_agente") \
-                .eq("id_agente", id_agente_loggato) \
-                .not_.is_("lat", "null") \
-                .execute()
-            
-            df = pd.DataFrame(response.data)
+            # Clienti dell'agente con coordinate (non null), letti dalla replica locale della rubrica
+            clienti = anagrafiche.righe("rubrica_clienti", uguali={"id_agente": id_agente_loggato}, non_nulli=["lat"])
+            colonne = ["ragione_sociale", "indirizzo", "citta", "prov", "lat", "lon", "email", "id_agente"]
+            df = pd.DataFrame([{c: r.get(c) for c in colonne} for r in clienti])
         except Exception as e:
             st.error(f"Errore durante la query al database: {e}")
             return
 
-    # 4. Verifica se il DataFrame è vuoto
+    # 3. Verifica se il DataFrame è vuoto
     if df.empty:
         st.warning(f"Nessun cliente trovato per l'ID Agente: {id_agente_loggato}")
         st.info("Verifica che i clienti abbiano le coordinate Lat/Lon popolate su Supabase.")
         return
 
-    # 5. Opzione di ricerca testuale sopra la mappa
+    # 4. Opzione di ricerca testuale sopra la mappa
     search = st.text_input("🔍 Cerca un cliente per Ragione Sociale", placeholder="Inizia a scrivere...")
     if search:
         df = df[df['ragione_sociale'].str.contains(search, case=False)]
 
-    # 6. Configurazione della Mappa Folium
+    # 5. Configurazione della Mappa Folium
     # Calcoliamo il centro basandoci sui clienti trovati
     centro_lat = df['lat'].astype(float).mean()
     centro_lon = df['lon'].astype(float).mean()
@@ -84,6 +76,6 @@ def show_mappa():
             tooltip=row['ragione_sociale']
         ).add_to(marker_cluster)
 
-    # 7. Rendering della mappa
+    # 6. Rendering della mappa
     # returned_objects=[] evita ricariche inutili della pagina Streamlit
     st_folium(m, width="100%", height=600, returned_objects=[])
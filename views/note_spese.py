@@ -1,91 +1,70 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from supabase import create_client
-import time
-
-# --- CONNESSIONE ---
-def get_supabase_client():
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    return create_client(url, key)
-
-try:
-    supabase = get_supabase_client()
-except Exception:
-    pass
+from core import agenti as directory_agenti
+from core.immagini import carica_allegato
+from core.db import get_supabase_client, leggi_paginato
+from core import report_spese
 
 # --- FUNZIONI CARICAMENTO DATI & STORAGE (SUPABASE) ---
 
-def get_mappa_agenti():
-    """Recupera la corrispondenza ID -> Nome dalla tabella 'agenti'"""
-    try:
-        res = supabase.table("agenti").select("id_agente, nome_agente").execute()
-        if res.data:
-            return {str(row['id_agente']).strip(): str(row['nome_agente']).upper() for row in res.data}
-    except Exception as e:
-        st.error(f"Errore caricamento mappa agenti: {e}")
-    return {}
-
 def get_note_spese(mese, anno, id_agente=None):
     """Recupera le note spese in base a mese, anno ed eventuale agente specifico"""
+    supabase = get_supabase_client()
     try:
-        query = supabase.table("nota_spese").select("*").eq("mese", mese).eq("anno", anno)
-        if id_agente:
-            query = query.eq("id_agente", str(id_agente).strip())
+        def crea_query():
+            query = supabase.table("nota_spese").select("*").eq("mese", mese).eq("anno", anno)
+            if id_agente:
+                query = query.eq("id_agente", str(id_agente).strip())
+            return query.order("data_scontrino").order("id")
         
-        res = query.order("data_scontrino").execute()
-        return res.data or []
+        # Paginata: con "TUTTI" le righe del mese possono superare il limite di PostgREST
+        return leggi_paginato(crea_query)
     except Exception as e:
         st.error(f"Errore nel caricamento delle note spese: {e}")
         return []
 
 def upload_scontrino(file, id_agente):
-    """Carica la foto dello scontrino nello storage di Supabase e restituisce l'URL pubblico"""
+    """Comprime la foto dello scontrino (con miniatura) e la carica nello storage; restituisce l'URL pubblico"""
     try:
-        clean_name = file.name.replace(' ', '_').replace('(', '').replace(')', '')
-        file_name = f"spesa_{id_agente}_{int(time.time())}_{clean_name}"
-        
-        supabase.storage.from_("ricevute_spese").upload(
-            path=file_name,
-            file=file.getvalue(),
-            file_options={"content-type": file.type}
-        )
-        
-        url_data = supabase.storage.from_("ricevute_spese").get_public_url(file_name)
-        
-        if isinstance(url_data, str): return url_data
-        if hasattr(url_data, "public_url"): return url_data.public_url
-        if isinstance(url_data, dict) and "publicUrl" in url_data: return url_data["publicUrl"]
-        return str(url_data)
-        
+        return carica_allegato("ricevute_spese", file, f"spesa_{id_agente}")
     except Exception as e:
         st.error(f"❌ Errore durante l'upload dello scontrino nello Storage: {e}")
         return None
 
 def inserisci_nota_spesa(nuova_nota):
     """Inserisce una nuova riga nota spese sul database"""
+    supabase = get_supabase_client()
     try:
         res = supabase.table("nota_spese").insert(nuova_nota).execute()
+        report_spese.invalida_report_spese()
         return bool(res.data)
     except Exception as e:
         st.error(f"Errore durante l'inserimento: {e}")
         return False
 
-def elimina_nota_spesa(id_nota):
-    """Elimina una riga specifica di nota spesa"""
+def elimina_note_spese(ids_note):
+    """Elimina in un'unica query tutte le righe di nota spesa indicate e verifica l'effetto reale"""
+    supabase = get_supabase_client()
     try:
-        res = supabase.table("nota_spese").delete().eq("id", id_nota).execute()
-        return bool(res.data)
+        res = supabase.table("nota_spese").delete().in_("id", list(ids_note)).execute()
+        report_spese.invalida_report_spese()
+        rimossi = {row['id'] for row in res.data or []}
+        non_rimossi = [i for i in ids_note if i not in rimossi]
+        if non_rimossi:
+            st.error(f"⚠️ Il database non ha rimosso alcune righe. Verifica le policy RLS di Supabase per gli ID: {non_rimossi}")
+            return False
+        return True
     except Exception as e:
         st.error(f"Errore durante l'eliminazione: {e}")
         return False
 
-# NUOVA FUNZIONE AGGIUNTA
-def aggiorna_stato_verifica(id_nota, stato):
-    """Aggiorna lo stato verificato nel database"""
+def aggiorna_stato_verifica(ids_note, stato):
+    """Aggiorna con un'unica query lo stato verificato di tutte le note indicate"""
+    supabase = get_supabase_client()
     try:
-        supabase.table("nota_spese").update({"verificato": stato}).eq("id", id_nota).execute()
+        supabase.table("nota_spese").update({"verificato": stato}).in_("id", list(ids_note)).execute()
+        report_spese.invalida_report_spese()
         return True
     except Exception as e:
         st.error(f"Errore aggiornamento verifica: {e}")
@@ -117,7 +96,8 @@ def show_note_spese():
             anni_disponibili = list(range(oggi.year - 2, oggi.year + 3))
             anno_sel = st.selectbox("Anno di riferimento", options=anni_disponibili, index=anni_disponibili.index(oggi.year))
             
-        mappa_agenti = get_mappa_agenti()
+        # Directory condivisa: tabella 'agenti' + utenti dei secrets, lookup O(1)
+        mappa_agenti = directory_agenti.mappa_agenti()
         agente_filtro_id = None
         
         with col_ag:
@@ -126,21 +106,10 @@ def show_note_spese():
                 for id_ag, nome_ag in mappa_agenti.items():
                     opzioni_agenti[f"{nome_ag} ({id_ag})"] = id_ag
                 
-                for user_secret, id_secret in st.secrets.get("agenti", {}).items():
-                    if id_secret not in opzioni_agenti.values():
-                        opzioni_agenti[f"{user_secret.upper()} ({id_secret})"] = str(id_secret).strip()
-                
                 agente_scelto_testo = st.selectbox("Seleziona Utente/Agente", options=list(opzioni_agenti.keys()))
                 agente_filtro_id = opzioni_agenti[agente_scelto_testo]
             else:
-                nome_loggato_visibile = mappa_agenti.get(agente_id_loggato, None)
-                if not nome_loggato_visibile:
-                    for u_sec, id_sec in st.secrets.get("agenti", {}).items():
-                        if str(id_sec).strip() == agente_id_loggato:
-                            nome_loggato_visibile = u_sec.upper()
-                            break
-                if not nome_loggato_visibile:
-                    nome_loggato_visibile = agente_id_loggato
+                nome_loggato_visibile = mappa_agenti.get(agente_id_loggato, agente_id_loggato)
                     
                 st.text_input("Utente Connesso", value=str(nome_loggato_visibile).upper(), disabled=True)
                 agente_filtro_id = agente_id_loggato
@@ -189,15 +158,8 @@ def show_note_spese():
         # NUOVO CAMPO VERIFICATO
         df_spese["Verificato"] = df_spese.get("verificato", False)
 
-        def mappa_nome_tabella(x):
-            nome = mappa_agenti.get(x, None)
-            if not nome:
-                for u_sec, id_sec in st.secrets.get("agenti", {}).items():
-                    if str(id_sec).strip() == x: return u_sec.upper()
-                return f"ID: {x}"
-            return nome
-
-        df_spese["Utente/Agente"] = df_spese["id_agente_raw"].apply(mappa_nome_tabella)
+        df_spese["Utente/Agente"] = df_spese["id_agente_raw"].map(mappa_agenti)
+        df_spese["Utente/Agente"] = df_spese["Utente/Agente"].fillna("ID: " + df_spese["id_agente_raw"])
         df_spese["Data"] = pd.to_datetime(df_spese["data_scontrino"]).dt.strftime('%d/%m/%Y')
         df_spese["Allegato"] = df_spese["url_scontrino"]
         
@@ -225,23 +187,80 @@ def show_note_spese():
             "Allegato": st.column_config.LinkColumn("📄 Vedi Ricevuta", display_text="Apri Scontrino")
         }
         
-        editor_key = f"editor_spese_{mese_sel_num}_{anno_sel}_{agente_filtro_id}"
+        # La versione nella chiave azzera l'editor dopo che le modifiche sono state salvate
+        if "versione_editor_spese" not in st.session_state: st.session_state.versione_editor_spese = 0
+        editor_key = f"editor_spese_{mese_sel_num}_{anno_sel}_{agente_filtro_id}_{st.session_state.versione_editor_spese}"
         edited_df = st.data_editor(df_spese, column_config=col_config, column_order=colonne_vista, use_container_width=True, hide_index=True, key=editor_key)
         
         stato_modifiche = st.session_state.get(editor_key, {})
         righe_modificate = stato_modifiche.get("edited_rows", {})
         
-        if righe_modificate:
-            for string_index, variazioni in righe_modificate.items():
-                index = int(string_index)
-                id_da_processare = df_spese.at[index, "id_sicuro"]
-                
-                if variazioni.get("Elimina") is True and df_spese.at[index, "_is_editable"]:
-                    if elimina_nota_spesa(id_da_processare): st.rerun()
-                elif "Verificato" in variazioni:
-                    if aggiorna_stato_verifica(id_da_processare, variazioni["Verificato"]): st.rerun()
+        # Si raccolgono tutte le modifiche in sospeso e si applicano insieme (una query per tipo)
+        ids_db = df_spese["id_sicuro"].tolist()
+        ids_da_eliminare = []
+        ids_per_verifica = {True: [], False: []}
+        for string_index, variazioni in righe_modificate.items():
+            index = int(string_index)
+            id_da_processare = ids_db[index]
+            
+            if variazioni.get("Elimina") is True and df_spese.at[index, "_is_editable"]:
+                ids_da_eliminare.append(id_da_processare)
+            elif "Verificato" in variazioni:
+                ids_per_verifica[bool(variazioni["Verificato"])].append(id_da_processare)
+        
+        n_modifiche = len(ids_da_eliminare) + len(ids_per_verifica[True]) + len(ids_per_verifica[False])
+        if n_modifiche:
+            c_info, c_btn = st.columns([2, 1], vertical_alignment="center")
+            c_info.caption(f"✏️ {len(ids_da_eliminare)} da eliminare | {len(ids_per_verifica[True])} da verificare | {len(ids_per_verifica[False])} da togliere dalla verifica")
+            if c_btn.button(f"💾 APPLICA {n_modifiche} MODIFICHE", type="primary", use_container_width=True):
+                with st.spinner("Salvataggio modifiche..."):
+                    esito = True
+                    if ids_da_eliminare:
+                        esito = elimina_note_spese(ids_da_eliminare) and esito
+                    for stato, ids in ids_per_verifica.items():
+                        if ids:
+                            esito = aggiorna_stato_verifica(ids, stato) and esito
+                if esito:
+                    st.session_state.versione_editor_spese += 1
+                    st.rerun()
     else:
         st.info("ℹ️ Nessuna nota spesa presente.")
 
+    if ruolo in ["amministrazione", "admin"]:
+        st.divider()
+        if st.toggle("📊 Report Spese per Agente e Causale (annuale / trimestrale)"):
+            show_report_spese(anni_disponibili, anno_sel)
+
+def show_report_spese(anni_disponibili, anno_default):
+    """Totali annuali/trimestrali per agente e per causale, esportabili in CSV e PDF"""
+    c_anno, c_periodo = st.columns(2)
+    anno_rep = c_anno.selectbox("Anno Report", options=anni_disponibili, index=anni_disponibili.index(anno_default), key="anno_report_spese")
+    periodo_rep = c_periodo.selectbox("Periodo", options=report_spese.PERIODI_REPORT,
+                                      format_func=lambda p: "Anno intero" if p == "ANNO" else f"Trimestre {p}", key="periodo_report_spese")
+
+    with st.spinner("Calcolo report..."):
+        report = report_spese.calcola_report_spese(anno_rep, periodo_rep)
+    if report is None:
+        st.info("ℹ️ Nessuna nota spesa nel periodo selezionato.")
+        return
+
+    st.metric("Totale Spese del Periodo", f"€ {report['totale']:,.2f}")
+    formato_euro = "€ {:,.2f}"
+    tabelle = [
+        ("👤 Totali per Agente", "per_agente"),
+        ("🧾 Totali per Causale", "per_causale"),
+        ("🔀 Agente x Causale", "agente_causale"),
+    ]
+    for titolo, chiave in tabelle:
+        st.markdown(f"##### {titolo}")
+        st.dataframe(report[chiave].style.format(formato_euro), use_container_width=True)
+        st.download_button("⬇️ CSV", data=report_spese.report_to_csv(report[chiave]),
+                           file_name=f"spese_{chiave}_{periodo_rep}_{anno_rep}.csv", mime="text/csv",
+                           key=f"csv_{chiave}")
+
+    pdf_bytes = report_spese.pdf_report_spese(anno_rep, periodo_rep)
+    st.download_button("📄 SCARICA REPORT PDF", data=pdf_bytes, file_name=f"Report_Spese_{periodo_rep}_{anno_rep}.pdf",
+                       mime="application/pdf", use_container_width=True, type="primary")
+
 if __name__ == "__main__":
     show_note_spese()
\ No newline at end of file
@@ -1,35 +1,50 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client
 from datetime import datetime
-from fpdf import FPDF
 from streamlit_searchbox import st_searchbox
 import io
 import os
 import time
 import base64
+from core.db import get_supabase_client, leggi_paginato, in_parallelo
+from core import anagrafiche, cache_condivisa
 
-# --- 1. CONNESSIONE E CARICAMENTO DATI ---
-def get_supabase_client():
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    return create_client(url, key)
+# --- 1. CARICAMENTO DATI ---
+# Ordini mostrati per pagina nella lista (e quindi id per il filtro 'in_' del prefetch delle righe)
+ORDINI_PER_PAGINA = 50
 
-@st.cache_data(ttl=600)
 def get_base_data():
-    supabase = get_supabase_client()
+    # Rubrica completa dalla replica locale (scaricata a pagine, quindi senza il troncamento di PostgREST);
+    # i rinnovi della replica girano in background e qui si legge sempre la copia già pronta
     try:
-        clienti_res = supabase.table("rubrica_clienti").select("*").execute()
-        return pd.DataFrame(clienti_res.data)
+        return anagrafiche.dataframe("rubrica_clienti")
     except Exception as e:
         return pd.DataFrame()
 
-def carica_dettagli_ordine(id_ordine):
-    """Carica testata e righe solo al momento del bisogno"""
+@st.cache_data(ttl=120, show_spinner=False)
+def prefetch_righe_ordini(ids_ordini):
+    """Scarica con un'unica query 'in_' le righe degli ordini della pagina visibile.
+
+    Va svuotata (prefetch_righe_ordini.clear()) dopo ogni modifica alle righe di un ordine esistente.
+    """
+    supabase = get_supabase_client()
+    righe_per_ordine = {id_o: [] for id_o in ids_ordini}
+    if not ids_ordini:
+        return righe_per_ordine
+    righe = leggi_paginato(lambda: supabase.table("preventivi_righe").select("*")
+                           .in_("id_preventivo", list(ids_ordini)).order("id"))
+    for r in righe:
+        righe_per_ordine.setdefault(r['id_preventivo'], []).append(r)
+    return righe_per_ordine
+
+def carica_dettagli_ordine(id_ordine, testata=None, righe=None):
+    """Carica testata e righe solo al momento del bisogno (se non già presenti nella pagina)"""
     supabase = get_supabase_client()
-    testata = supabase.table("preventivi_testata").select("*").eq("id", id_ordine).single().execute()
-    righe = supabase.table("preventivi_righe").select("*").eq("id_preventivo", id_ordine).order("id").execute()
-    return testata.data, righe.data
+    if testata is None:
+        testata = supabase.table("preventivi_testata").select("*").eq("id", id_ordine).single().execute().data
+    if righe is None:
+        righe = supabase.table("preventivi_righe").select("*").eq("id_preventivo", id_ordine).order("id").execute().data
+    return testata, righe
 
 def duplica_ordine(id_originale, supabase):
     """Copia testata e righe di un ordine esistente creandone uno nuovo come Preventivo"""
@@ -61,6 +76,7 @@ def duplica_ordine(id_originale, supabase):
                 del new_r['id']
             new_r['id_preventivo'] = new_id
             supabase.table("preventivi_righe").insert(new_r).execute()
+        prefetch_righe_ordini.clear()
             
     return new_id
 
@@ -77,6 +93,8 @@ def format_sconti_string(s1, s2, s3):
     return "+".join(parts) if parts else "-"
 
 def genera_pdf_conferma(cliente_ragione_sociale, testata, righe, priorita=""):
+    from fpdf import FPDF
+
     # Funzione interna per sostituire i caratteri speciali con uno spazio
     def pulisci_testo(testo):
         if not testo:
@@ -191,6 +209,8 @@ def genera_pdf_conferma(cliente_ragione_sociale, testata, righe, priorita=""):
     return pdf.output(dest='S').encode('latin-1', errors='replace')
 
 def genera_pdf_riepilogo_giornaliero(anno, df_stats):
+    from fpdf import FPDF
+
     pdf = FPDF(orientation='P', unit='mm', format='A4')
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
@@ -275,7 +295,6 @@ def show_ordinato():
     if 'opened_expander_id' not in st.session_state:
         st.session_state.opened_expander_id = None
     
-    df_clienti = get_base_data()
     user_data = st.session_state.get('user_info', {})
     supabase = get_supabase_client()
 
@@ -291,9 +310,25 @@ def show_ordinato():
     
     if user_data.get("ruolo") == "agente":
         query_stats = query_stats.eq("id_agente", str(user_data.get("agente_corrispondente")))
-    
-    stats_res = query_stats.execute()
+
+    # Lista ordini dell'anno senza filtro cliente: il filtro (scelto più sotto) si applica in memoria,
+    # così statistiche, rubrica e lista sono indipendenti e partono insieme.
+    # Letta a blocchi: senza filtro cliente supera facilmente il limite di 1000 righe di PostgREST
+    def query_list():
+        query = supabase.table("preventivi_testata").select("*").eq("stato", "Ordine")\
+            .gte("created_at", start_y).lte("created_at", end_y).order("created_at", desc=True).order("id", desc=True)
+        if user_data.get("ruolo") == "agente": 
+            query = query.eq("id_agente", str(user_data.get("agente_corrispondente")))
+        return query
+
+    dati = in_parallelo({"stats": query_stats.execute, "clienti": get_base_data,
+                         "ordini": lambda: leggi_paginato(query_list)})
+    stats_res, df_clienti, ordini = dati["stats"], dati["clienti"], dati["ordini"]
     df_stats = pd.DataFrame(stats_res.data) if stats_res.data else pd.DataFrame()
+    # Rubrica: replica aggiornata in background, qui solo età e aggiornamento manuale per l'admin
+    creato, in_rinnovo = anagrafiche.aggiornamento("rubrica_clienti")
+    rinnova = (lambda: anagrafiche.rinnova("rubrica_clienti")) if user_data.get("ruolo") == "admin" and creato else None
+    cache_condivisa.mostra_stato(creato, in_rinnovo, rinnova, key="aggiorna_rubrica_ordinato")
 
     if not df_stats.empty:
         ordine_mesi = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic', 'Senza Data']
@@ -353,21 +388,24 @@ def show_ordinato():
 
     filtro_cliente_id = st_searchbox(search_clienti_ord, key="search_ord_final", placeholder="🔍 Filtra per cliente...")
 
-    query_list = supabase.table("preventivi_testata").select("*").eq("stato", "Ordine")\
-        .gte("created_at", start_y).lte("created_at", end_y).order("created_at", desc=True)
-        
     if filtro_cliente_id: 
-        query_list = query_list.eq("id_cliente", filtro_cliente_id)
-    if user_data.get("ruolo") == "agente": 
-        query_list = query_list.eq("id_agente", str(user_data.get("agente_corrispondente")))
-    
-    res_list = query_list.execute()
+        ordini = [row for row in ordini if str(row.get('id_cliente')) == str(filtro_cliente_id)]
 
-    if not res_list.data:
+    if not ordini:
         st.warning("Nessun ordine trovato.")
     else:
-        st.write(f"Trovati **{len(res_list.data)}** ordini")
-        for row in res_list.data:
+        st.write(f"Trovati **{len(ordini)}** ordini")
+        # Lista a pagine: si disegnano (e si prefetchano) solo gli ordini della pagina scelta
+        n_pagine = -(-len(ordini) // ORDINI_PER_PAGINA)
+        pagina = 1
+        if n_pagine > 1:
+            c_pag, _ = st.columns([1, 3])
+            pagina = c_pag.number_input(f"Pagina (di {n_pagine})", min_value=1, max_value=n_pagine, value=1, step=1,
+                                        key=f"pagina_ordini_{anno_sel}_{filtro_cliente_id}")
+        ordini_pagina = ordini[(pagina - 1) * ORDINI_PER_PAGINA:pagina * ORDINI_PER_PAGINA]
+        # Prefetch delle righe degli ordini della pagina: il PDF non interroga più il DB
+        righe_pagina = prefetch_righe_ordini(tuple(row['id'] for row in ordini_pagina))
+        for row in ordini_pagina:
             dt_c = row['data_consegna'] if row['data_consegna'] else "NON SETTATA"
             
             # --- STATO INVIATO ---
@@ -404,7 +442,7 @@ def show_ordinato():
                 if c1.button("📄 PDF", key=f"btn_pdf_{row['id']}", use_container_width=True):
                     with st.spinner("Generazione..."):
                         st.session_state.opened_expander_id = row['id']
-                        t_d, r_d = carica_dettagli_ordine(row['id'])
+                        t_d, r_d = carica_dettagli_ordine(row['id'], testata=row, righe=righe_pagina.get(row['id']))
                         pdf_bytes = genera_pdf_conferma(row['ragione_sociale_cliente'], t_d, r_d, priorita=priorita_sel)
                         st.session_state[pdf_key] = base64.b64encode(pdf_bytes).decode()
                         st.rerun()
@@ -434,6 +472,7 @@ def show_ordinato():
                 if c4.button("🗑️ ELIMINA", key=f"del_{row['id']}", use_container_width=True, type="secondary"):
                     st.session_state.opened_expander_id = None
                     supabase.table("preventivi_testata").delete().eq("id", row['id']).execute()
+                    prefetch_righe_ordini.clear()
                     st.rerun()
 
 if __name__ == "__main__":
@@ -1,16 +1,16 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client
 from datetime import datetime
 from streamlit_searchbox import st_searchbox
 import io
 import os
 import time
+from core.db import get_supabase_client
+from core import anagrafiche, griglia_righe, importa_righe, prezzi
+from core.prezzi import calcola_netto
 
-# --- CONFIGURAZIONE PAGINA ---
-st.set_page_config(page_title="Vivetti - Nuovo Preventivo", layout="wide")
-
-st.markdown("""
+# --- CONFIGURAZIONE PAGINA (applicata da show_preventivi) ---
+STILE_PAGINA = """
     <style>
     .main h1 { font-size: 1.8rem !important; margin-bottom: 0.5rem !important; }
     .stMetric { background-color: #f8f9fa; padding: 10px; border-radius: 10px; border: 1px solid #ddd; }
@@ -24,56 +24,39 @@ st.markdown("""
     }
     .stButton button { font-weight: bold; border-radius: 8px; }
     </style>
-    """, unsafe_allow_html=True)
-
-# --- 1. CONNESSIONE ---
-def get_supabase_client():
-    url = st.secrets["connections"]["supabase"]["url"]
-    key = st.secrets["connections"]["supabase"]["key"]
-    return create_client(url, key)
-
-supabase = get_supabase_client()
+    """
 
 # --- 2. FUNZIONI DI RICERCA ---
+# Le ricerche leggono dalla replica locale delle anagrafiche (core/anagrafiche.py), non da Supabase
 def search_clients(search_term: str):
     if not search_term or len(search_term) < 2:
         return []
     user_data = st.session_state.get('user_info', {})
-    query = supabase.table("rubrica_clienti").select("*")
+    filtri = {}
     if user_data.get("ruolo") == "agente":
-        ag_id = str(user_data.get("agente_corrispondente", "")).strip()
-        query = query.eq("id_agente", ag_id)
-    res = query.ilike("ragione_sociale", f"%{search_term}%").limit(15).execute()
-    if not res.data: return []
-    return [(f"{row['ragione_sociale']} ({row.get('citta', '')})", row) for row in res.data]
+        filtri["id_agente"] = str(user_data.get("agente_corrispondente", "")).strip()
+    trovati = anagrafiche.cerca("rubrica_clienti", search_term, ["ragione_sociale"], uguali=filtri, limite=15)
+    return [(f"{row['ragione_sociale']} ({row.get('citta', '')})", row) for row in trovati]
 
 def search_articles(search_term: str):
     if not search_term or len(search_term) < 3:
         return []
-    # MODIFICATO: Aggiunto PREZZOLISTINO nella select
-    res = supabase.table("listino_import")\
-        .select("CODICE, DESCRIZIONE, PREZZO, SCONTO1, SCONTO2, SCONTO3, PREZZOLISTINO")\
-        .or_(f"CODICE.ilike.%{search_term}%,DESCRIZIONE.ilike.%{search_term}%")\
-        .limit(20)\
-        .execute()
-    if not res.data: return []
-    return [(f"{row['CODICE']} | {row['DESCRIZIONE'][:70]}...", row) for row in res.data]
+    trovati = anagrafiche.cerca("listino_import", search_term, ["CODICE", "DESCRIZIONE"], limite=20)
+    # Sconti proposti dal listino netto del cliente selezionato (condizioni proprie o sconti di listino)
+    profilo = prezzi.profilo_sconti(st.session_state.get("cliente_selezionato_obj"))
+    if trovati and profilo is not None:
+        netti = prezzi.prezzi_per_codici([row["CODICE"] for row in trovati], profilo)
+        for row, (_, p) in zip(trovati, netti.iterrows()):
+            if pd.notna(p["CODICE"]):
+                row["SCONTO1"], row["SCONTO2"], row["SCONTO3"] = p["S1"], p["S2"], p["S3"]
+    return [(f"{row['CODICE']} | {row['DESCRIZIONE'][:70]}...", row) for row in trovati]
 
 # --- 3. UTILITY CALCOLI ---
-def format_sconti_string(s1, s2, s3):
-    parts = []
-    for s in [s1, s2, s3]:
-        try:
-            val = float(s)
-            if val > 0: parts.append(f"{val:g}")
-        except: continue
-    return "+".join(parts) if parts else "-"
-
-def calcola_netto(listino, s1, s2, s3):
-    return float(listino) * (1 - float(s1 or 0)/100) * (1 - float(s2 or 0)/100) * (1 - float(s3 or 0)/100)
+# calcola_netto e il listino netto per profilo sconti sono in core/prezzi.py (condivisi con archivio e import)
 
 # --- 4. SALVATAGGIO DB ---
 def salva_preventivo_db(info_testata, righe):
+    supabase = get_supabase_client()
     try:
         res_t = supabase.table("preventivi_testata").insert(info_testata).execute()
         id_prev = res_t.data[0]['id']
@@ -115,6 +98,7 @@ def salva_preventivo_db(info_testata, righe):
 
 # --- 5. INTERFACCIA PRINCIPALE ---
 def show_preventivi():
+    st.markdown(STILE_PAGINA, unsafe_allow_html=True)
     if 'righe_preventivo' not in st.session_state: st.session_state.righe_preventivo = []
     if 'temp_item' not in st.session_state: st.session_state.temp_item = None
     if 'search_key' not in st.session_state: st.session_state.search_key = 0
@@ -146,33 +130,10 @@ def show_preventivi():
     st.divider()
 
     # --- 5.2 RIEPILOGO (SPOSTATO AL CENTRO) ---
-    tot_n = 0.0
+    # Griglia modificabile (qta, sconti, omaggio, note) in un fragment: le modifiche non rieseguono la pagina
     if st.session_state.righe_preventivo:
         st.subheader("📊 Riepilogo")
-        for idx, riga in enumerate(st.session_state.righe_preventivo):
-            if riga.get('tipo') == 'NOTA_TESTO':
-                with st.container():
-                    st.markdown(f'<div class="note-card"><b>🗒️ NOTA:</b> {riga["DESCRIZIONE"]}</div>', unsafe_allow_html=True)
-                    col_b = st.columns([9, 0.5, 0.5])
-                    if col_b[1].button("✏️", key=f"edit_n_{idx}"):
-                        st.session_state.temp_item = st.session_state.righe_preventivo.pop(idx); st.rerun()
-                    if col_b[2].button("🗑️", key=f"del_n_{idx}"):
-                        st.session_state.righe_preventivo.pop(idx); st.rerun()
-            else:
-                with st.container(border=True):
-                    ci, cv, c_btns = st.columns([3, 1, 0.8])
-                    val_r = 0 if riga['SCONTO_MERCE'] else (riga['PREZZO_NETTO'] * riga['QTA'])
-                    tot_n += val_r
-                    ci.markdown(f"**{riga['CODICE']}** - {riga['DESCRIZIONE']}")
-                    if riga.get('NOTA'):
-                        ci.caption(f"Note articolo: {riga['NOTA']}")
-                    ci.caption(f"Qta: {riga['QTA']} | Sconti: {format_sconti_string(riga['S1'], riga['S2'], riga['S3'])}")
-                    cv.markdown(f"**€ {val_r:,.2f}**")
-                    b1, b2 = c_btns.columns(2)
-                    if b1.button("✏️", key=f"edit_{idx}"):
-                        st.session_state.temp_item = st.session_state.righe_preventivo.pop(idx); st.rerun()
-                    if b2.button("🗑️", key=f"del_{idx}"):
-                        st.session_state.righe_preventivo.pop(idx); st.rerun()
+        griglia_righe.editor_righe("righe_preventivo")
         st.divider()
 
     # --- 5.3 RICERCA ARTICOLI (ORA SOTTO AL RIEPILOGO) ---
@@ -192,6 +153,30 @@ def show_preventivi():
     if selected_article: 
         st.session_state.temp_item = selected_article
 
+    # Import in blocco da distinta (CSV/Excel con codice e quantità)
+    with st.expander("📥 Importa righe da CSV / Excel"):
+        st.caption("Una riga per articolo: codice e quantità (colonne 'Codice' e 'Qta', oppure le prime due colonne). Prezzi e sconti dal listino.")
+        file_import = st.file_uploader("File distinta", type=["csv", "txt", "xlsx"], key=f"import_righe_{st.session_state.search_key}")
+        if file_import is not None:
+            try:
+                profilo = prezzi.profilo_sconti(st.session_state.cliente_selezionato_obj)
+                esito = importa_righe.prepara_import(file_import.name, file_import.getvalue(), profilo)
+            except importa_righe.ErroreImport as e:
+                st.error(str(e))
+                esito = None
+            if esito:
+                righe_imp = esito["righe"]
+                st.info(f"Articoli trovati: **{len(righe_imp)}** | Totale netto: **€ {griglia_righe.totale_righe(righe_imp):,.2f}**")
+                if esito["sconosciuti"]:
+                    st.warning(f"Codici non presenti a listino ({len(esito['sconosciuti'])}): " + ", ".join(esito["sconosciuti"][:50])
+                               + (" ..." if len(esito["sconosciuti"]) > 50 else ""))
+                if esito["scartate"]:
+                    st.warning(f"Righe scartate: {len(esito['scartate'])}")
+                    st.dataframe(pd.DataFrame(esito["scartate"]), hide_index=True, use_container_width=True)
+                if righe_imp and st.button(f"➕ Aggiungi {len(righe_imp)} righe al preventivo", type="primary", use_container_width=True):
+                    st.session_state.righe_preventivo = st.session_state.righe_preventivo + righe_imp
+                    st.session_state.search_key += 1; st.rerun()
+
     # --- 5.4 SCHEDA CONFIGURAZIONE RIGA (In fondo) ---
     if st.session_state.temp_item:
         item = st.session_state.temp_item
@@ -255,9 +240,10 @@ def show_preventivi():
     # --- 5.5 BLOCCO FINALE: NOTE E SALVATAGGIO ---
     if st.session_state.righe_preventivo:
         st.divider()
+        # La griglia riesegue tutta la pagina quando cambia il totale: qui è sempre aggiornato
         cn, cm = st.columns([2, 1])
         note_finali = cn.text_area("Note finali (condizioni...)")
-        cm.metric("TOTALE NETTO", f"€ {tot_n:,.2f}")
+        cm.metric("TOTALE NETTO", f"€ {griglia_righe.totale_righe(st.session_state.righe_preventivo):,.2f}")
         
         col_st, _ = st.columns([1.5, 2])
         stato_documento = col_st.selectbox("Salva come:", ["Preventivo", "Ordine"], index=0)
@@ -269,6 +255,7 @@ def show_preventivi():
             if not cli_obj: 
                 st.error("Seleziona un cliente!")
             else:
+                tot_n = griglia_righe.totale_righe(st.session_state.righe_preventivo)
                 testata = {
                     "id_cliente": cli_obj.get('id'), 
                     "ragione_sociale_cliente": cli_obj['ragione_sociale'], 
@@ -287,6 +274,7 @@ def show_preventivi():
                     st.success(f"✅ {stato_documento} Salvato con successo!")
                     time.sleep(1.2)
                     st.session_state.righe_preventivo = []
+                    griglia_righe.azzera_selezione("righe_preventivo")
                     st.session_state.cliente_selezionato_obj = None
                     st.rerun()
                 else: 